@@ -5,5 +5,21 @@ Python module for automated tuning of Range Separated Hybrid DFT functionals.
 Dependencies:
 """
 from .input import QchemInput
-from .calculation import QchemCalculation
-from .tuning import QchemTuning
+from .output import QchemOutput
+from .calculation import QchemCalculation, RETRIES
+from .tuning import QchemTuning, OBJECTIVES
+from .scheduler import QchemScheduler
+from .optimize import QchemOptimizer
+from .optimize2d import QchemOptimizer2D
+from .cache import QchemCache
+from .analysis import QchemAnalysis
+from .interpolate import QchemInterpolation
+from .archive import QchemArchive
+from .journal import QchemJournal
+from .predict import QchemPredictor
+from .backend import LocalBackend, SlurmBackend, PbsBackend, BACKENDS
+from .scratch import QchemScratch
+from .monitor import QchemMonitor
+from .metrics import QchemMetrics
+from .batch import QchemBatch
+from .service import QchemService, QchemClient
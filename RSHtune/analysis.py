@@ -0,0 +1,143 @@
+"""
+RSHtune  - Analysis.
+
+Read-only tabulation of finished tuning calculations in a directory.
+Dependencies: os, re, logging, concurrent.futures
+"""
+import os
+import re
+import logging
+import concurrent.futures as cf
+from .output import QchemOutput, findOutput
+from .tuning import optimalTuningError, stateNames
+
+OUTPUT = re.compile(r"^w(\d+)_((?:neutral|anion|cation)\d*)" +
+                    r"\.out(\.gz|\.zst)?$")
+
+
+class QchemAnalysis():
+    """Object for tabulating tuning results without writing any files."""
+
+    def __init__(self, dir: str = "", nprocs: int = 0, cache=None,
+                 journal=None, multiplicities: list[int] = [],
+                 objective: str = "OT", loggerLevel: str = "INFO") -> None:
+        """Set up the analysis of a directory.
+
+        Only the states objective needs are read, from the files named for
+        multiplicities (neutral, anion, cation). If a QchemJournal is
+        given, outputs of jobs it does not record as done are not parsed.
+        """
+        self.initLogging(loggerLevel)
+
+        self.dir = dir if dir != "" else "."
+        self.numProcs = os.cpu_count() if nprocs == 0 else nprocs
+        self.cache = cache
+        self.journal = journal
+        self.objective = objective
+        self.names = stateNames(objective, multiplicities)
+        self.states = tuple(self.names)
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemAnalysis")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def findTriplets(self) -> list[int]:
+        """Return omega/1000 of all complete sets of output files."""
+        _names = set(self.names.values())
+        _found = {}
+        with os.scandir(self.dir) as _entries:
+            for _entry in _entries:
+                _match = OUTPUT.match(_entry.name)
+                if _match and _match[2] in _names:
+                    _found.setdefault(int(_match[1]), set()).add(_match[2])
+        _omega = sorted(o for o in _found if _found[o] == _names)
+        self.log.info(f"Found {len(_omega)} complete tuning runs in " +
+                      f"<{self.dir}>.")
+        return _omega
+
+    def cachedResults(self, omega: int) -> dict:
+        """Return cached results for the states of one omega."""
+        if self.cache is None:
+            return {}
+        _cached = {}
+        for s in self.states:
+            _input = self.jobPath(omega, s) + ".in"
+            if os.path.isfile(_input):
+                _result = self.cache.get(self.cache.key(_input)[0],
+                                         touch=False)
+                if _result is not None:
+                    _cached[s] = _result
+        return _cached
+
+    def jobPath(self, omega: int, state: str) -> str:
+        """Return the path without extension of a job at omega/1000."""
+        return os.path.join(self.dir, f"w{omega:0>3}_{self.names[state]}")
+
+    def unfinished(self, jname: str) -> bool:
+        """Return whether the journal records a job as not (yet) done.
+
+        jname is the job's path without extension.
+        """
+        if self.journal is None:
+            return False
+        return self.journal.state(jname) not in ("", "done")
+
+    def parse(self) -> dict:
+        """Parse all complete triplets, return data keyed by omega/1000."""
+        _omega = self.findTriplets()
+        self.data = {o: self.cachedResults(o) for o in _omega}
+        _jobs = []
+        for o in _omega:
+            for s in self.states:
+                if s in self.data[o]:
+                    continue
+                if self.unfinished(self.jobPath(o, s)):
+                    self.data[o][s] = None
+                else:
+                    _jobs.append((o, s))
+        _files = [findOutput(self.jobPath(o, s)) for o, s in _jobs]
+        if self.numProcs > 1 and len(_files) > 1:
+            with cf.ProcessPoolExecutor(max_workers=self.numProcs) as pool:
+                _results = pool.map(parseOutputFile, _files,
+                                    chunksize=max(1, len(_files) //
+                                                  (4 * self.numProcs)))
+                _results = list(_results)
+        else:
+            _results = [parseOutputFile(f) for f in _files]
+        for (o, s), _result in zip(_jobs, _results):
+            self.data[o][s] = _result
+        self.log.info(f"Parsed {len(_files)} output files.")
+        return self.data
+
+    def table(self) -> dict:
+        """Return J of the objective by omega/1000, None on failures."""
+        if not hasattr(self, "data"):
+            self.parse()
+        _table = {}
+        for o, _data in self.data.items():
+            if any(_data[s] is None for s in self.states):
+                _table[o] = None
+            else:
+                _table[o] = optimalTuningError(_data, self.objective)["JOT"]
+        return _table
+
+
+def parseOutputFile(fname: str) -> dict:
+    """Return SCF energy, HOMO and LUMO of an output, None if incomplete."""
+    try:
+        return QchemOutput(fname, loggerLevel="WARNING").results()
+    except ValueError:
+        return None
@@ -0,0 +1,259 @@
+"""
+RSHtune  - Archive.
+
+Compact columnar store of parsed tuning results.
+Dependencies: os, re, sys, gzip, json, array, shutil, struct, logging,
+              concurrent.futures, zstandard (optional)
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import array
+import shutil
+import struct
+import logging
+import concurrent.futures as cf
+from .output import zstandard
+from .analysis import parseOutputFile
+from .tuning import optimalTuningError, stateNames, OBJECTIVES
+
+MAGIC = b"RSHtune archive 1\n"
+OUTPUT = re.compile(r"^(?:a(\d+))?w(\d+)_((neutral|anion|cation)\d*)" +
+                    r"\.out$")
+COMPRESSED = re.compile(r"^(?:a(\d+))?w(\d+)_((neutral|anion|cation)\d*)" +
+                        r"\.out(?:\.gz|\.zst)?$")
+CHARGES = {"neutral": 0, "anion": -1, "cation": 1}
+
+# Columns with their array typecodes; molecule indexes the molecule names,
+# alpha is -1 for runs with the HF fraction of the input, mtime and size
+# identify the output file a row was read from
+COLUMNS = (("molecule", "i"), ("alpha", "i"), ("omega", "i"),
+           ("charge", "b"), ("SCFenergy", "d"), ("HOMO", "d"), ("LUMO", "d"),
+           ("SCFcycles", "i"), ("mtime", "d"), ("size", "q"))
+# Values of columns missing from archives written by older versions
+DEFAULTS = {"mtime": 0.0, "size": -1}
+
+
+class QchemArchive():
+    """Object for keeping parsed results of many molecules in one file.
+
+    Every converged (molecule, alpha, omega, charge) calculation is one row.
+    The file holds a JSON header with the molecule names followed by every
+    column as a packed array, so a table of tens of thousands of results
+    is read in one go without touching the output files. Every row records
+    the modification time and size of its output, which is archived again
+    once it changes. Archived outputs can then be compressed, which
+    QchemOutput reads transparently.
+    """
+
+    def __init__(self, fname: str = "RSHtune.rsha",
+                 loggerLevel: str = "INFO") -> None:
+        """Open the archive fname, reading it if it exists."""
+        self.initLogging(loggerLevel)
+
+        self.archiveFile = fname
+        self.molecules = []
+        # (molecule, alpha, omega, charge)
+        #     -> (energy, HOMO, LUMO, cycles, mtime, size)
+        self.rows = {}
+        if os.path.isfile(self.archiveFile):
+            self.read()
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemArchive")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def read(self) -> None:
+        """Read all rows from the archive file."""
+        with open(self.archiveFile, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"<{self.archiveFile}> is not an RSHtune " +
+                                 "archive.")
+            _header = json.loads(f.read(struct.unpack("<I", f.read(4))[0]))
+            _columns = {}
+            for _name, _type, _size in _header["columns"]:
+                _column = array.array(_type)
+                if _column.itemsize != _size:
+                    raise ValueError(f"Column '{_name}' of " +
+                                     f"<{self.archiveFile}> has items of " +
+                                     f"{_size} bytes.")
+                _column.frombytes(f.read(_header["rows"] * _size))
+                if _header["byteorder"] != sys.byteorder:
+                    _column.byteswap()
+                _columns[_name] = _column
+        for _name, _type in COLUMNS:
+            if _name not in _columns:
+                _columns[_name] = array.array(_type, [DEFAULTS[_name]] *
+                                              _header["rows"])
+        self.molecules = _header["molecules"]
+        self.rows = {tuple(r[:4]): tuple(r[4:]) for r in
+                     zip(*(_columns[n] for n, _ in COLUMNS))}
+        self.log.info(f"Read {len(self.rows)} results of " +
+                      f"{len(self.molecules)} molecules from " +
+                      f"<{self.archiveFile}>.")
+
+    def write(self) -> None:
+        """Write all rows to the archive file, replacing it atomically."""
+        _columns = [array.array(t) for _, t in COLUMNS]
+        for _key in sorted(self.rows):
+            for _column, _value in zip(_columns, (*_key, *self.rows[_key])):
+                _column.append(_value)
+        _header = json.dumps({"rows": len(self.rows),
+                              "byteorder": sys.byteorder,
+                              "molecules": self.molecules,
+                              "columns": [(n, t, c.itemsize) for (n, t), c
+                                          in zip(COLUMNS, _columns)]})
+        _tmp = f"{self.archiveFile}.tmp"
+        with open(_tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(_header)) + _header.encode())
+            for _column in _columns:
+                _column.tofile(f)
+        os.replace(_tmp, self.archiveFile)
+        self.log.info(f"Wrote {len(self.rows)} results to " +
+                      f"<{self.archiveFile}>.")
+
+    def add(self, molecule: str, dir: str = "", nprocs: int = 0,
+            multiplicities: list[int] = []) -> int:
+        """Archive the results in a molecule's directory, return how many.
+
+        Only outputs named for multiplicities (neutral, anion, cation) are
+        read, by default those of the default multiplicities. Outputs of
+        calculations already in the archive are not parsed again unless
+        their modification time or size changed, a plain output taking
+        precedence over a compressed one; outputs without a converged
+        result are skipped.
+        """
+        dir = dir if dir != "" else "."
+        if molecule not in self.molecules:
+            self.molecules.append(molecule)
+        _index = self.molecules.index(molecule)
+        _names = set(stateNames("OT", multiplicities).values())
+        _files = {}
+        with os.scandir(dir) as _entries:
+            for _entry in _entries:
+                _match = COMPRESSED.match(_entry.name)
+                if _match is None or _match[3] not in _names:
+                    continue
+                _key = (_index, -1 if _match[1] is None else int(_match[1]),
+                        int(_match[2]), CHARGES[_match[4]])
+                if _key not in _files or _entry.name.endswith(".out"):
+                    _files[_key] = _entry.path
+        _files = {k: f for k, f in _files.items()
+                  if k not in self.rows or self.rows[k][4:] != fileStat(f)}
+        _nprocs = os.cpu_count() if nprocs == 0 else nprocs
+        if _nprocs > 1 and len(_files) > 1:
+            with cf.ProcessPoolExecutor(max_workers=_nprocs) as pool:
+                _results = list(pool.map(parseOutputFile, _files.values(),
+                                         chunksize=max(1, len(_files) //
+                                                       (4 * _nprocs))))
+        else:
+            _results = [parseOutputFile(f) for f in _files.values()]
+        _added = 0
+        for _key, _result in zip(_files, _results):
+            if _result is not None:
+                self.rows[_key] = (_result["SCFenergy"], _result["HOMO"],
+                                   _result["LUMO"], _result["SCFcycles"],
+                                   *fileStat(_files[_key]))
+                _added += 1
+            else:
+                self.rows.pop(_key, None)
+        self.log.info(f"Archived {_added} of {len(_files)} new or changed " +
+                      f"outputs of '{molecule}' from <{dir}>.")
+        return _added
+
+    def compress(self, molecule: str, dir: str = "", method: str = "gzip",
+                 multiplicities: list[int] = []) -> int:
+        """Compress the archived plain outputs in a directory.
+
+        Only outputs named for multiplicities (as for add) that are
+        unchanged since they were archived are compressed, after which
+        their rows record the compressed file. method is gzip or zstd;
+        returns the number of files compressed.
+        """
+        if method == "zstd" and zstandard is None:
+            raise ValueError("Compressing with zstd requires the " +
+                             "zstandard package.")
+        dir = dir if dir != "" else "."
+        _index = self.molecules.index(molecule)
+        _names = set(stateNames("OT", multiplicities).values())
+        _count = 0
+        with os.scandir(dir) as _entries:
+            for _entry in list(_entries):
+                _match = OUTPUT.match(_entry.name)
+                if _match is None or _match[3] not in _names:
+                    continue
+                _key = (_index, -1 if _match[1] is None else int(_match[1]),
+                        int(_match[2]), CHARGES[_match[4]])
+                if _key not in self.rows or \
+                        self.rows[_key][4:] != fileStat(_entry.path):
+                    continue
+                _fname = _entry.path + (".gz" if method == "gzip"
+                                        else ".zst")
+                with open(_entry.path, "rb") as fin, \
+                        openCompressed(f"{_fname}.tmp", method) as fout:
+                    shutil.copyfileobj(fin, fout)
+                os.replace(f"{_fname}.tmp", _fname)
+                os.remove(_entry.path)
+                self.rows[_key] = (*self.rows[_key][:4], *fileStat(_fname))
+                _count += 1
+        self.log.info(f"Compressed {_count} outputs in <{dir}> with " +
+                      f"{method}.")
+        return _count
+
+    def table(self) -> list[dict]:
+        """Return all rows as dictionaries."""
+        return [{"molecule": self.molecules[k[0]],
+                 "alpha": None if k[1] < 0 else k[1] / 1000,
+                 "omega": k[2] / 1000, "charge": k[3],
+                 "SCFenergy": v[0], "HOMO": v[1], "LUMO": v[2],
+                 "SCFcycles": v[3]} for k, v in sorted(self.rows.items())]
+
+    def optimalOmega(self, objective: str = "OT") -> dict:
+        """Return omega* and J* of objective by molecule and alpha.
+
+        Keys are (molecule, alpha), alpha being None for runs with the HF
+        fraction of the input; only omegas with all states of the
+        objective count.
+        """
+        _states = {c: s for s, c in CHARGES.items()}
+        _triplets = {}
+        for (m, a, o, c), v in self.rows.items():
+            _triplets.setdefault((m, a, o), {})[_states[c]] = \
+                {"SCFenergy": v[0], "HOMO": v[1], "LUMO": v[2]}
+        _optimal = {}
+        for (m, a, o), _data in _triplets.items():
+            if any(s not in _data for s in OBJECTIVES[objective]):
+                continue
+            _jot = optimalTuningError(_data, objective)["JOT"]
+            _key = (self.molecules[m], None if a < 0 else a / 1000)
+            if _key not in _optimal or _jot < _optimal[_key][1]:
+                _optimal[_key] = (o / 1000, _jot)
+        return _optimal
+
+
+def fileStat(fname: str) -> tuple[float, int]:
+    """Return modification time and size of a file."""
+    _stat = os.stat(fname)
+    return (_stat.st_mtime, _stat.st_size)
+
+
+def openCompressed(fname: str, method: str):
+    """Open a file for writing compressed with gzip or zstd."""
+    if method == "zstd":
+        return zstandard.open(fname, "wb")
+    return gzip.open(fname, "wb")
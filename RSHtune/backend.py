@@ -0,0 +1,411 @@
+"""
+RSHtune  - Backend.
+
+Execution backends launching Qchem calculations locally or on a cluster.
+Dependencies: os, re, abc, time, shlex, signal, getpass, logging,
+              tempfile, subprocess
+"""
+import os
+import re
+import abc
+import time
+import shlex
+import signal
+import getpass
+import logging
+import tempfile
+import subprocess as sb
+
+
+class LocalJob():
+    """Handle of a Qchem calculation running as a process on this node.
+
+    The process is reaped with wait4, so that its resource usage (CPU time
+    and peak memory, including the Qchem executables it waited for) is
+    available in usage once it has finished.
+    """
+
+    def __init__(self, args: list[str], cwd: str = "",
+                 session: bool = False, env: dict = {}) -> None:
+        """Start the process; with session=True in a new process group.
+
+        env holds environment variables to set in addition to ours.
+        """
+        self.args = args
+        self.session = session
+        self.returncode = None
+        self.usage = None
+        self._stdout = tempfile.TemporaryFile()
+        self._stderr = tempfile.TemporaryFile()
+        self.process = sb.Popen(args, cwd=cwd if cwd else None,
+                                stdout=self._stdout, stderr=self._stderr,
+                                start_new_session=session,
+                                env={**os.environ, **env} if env else None)
+
+    def reap(self, block: bool) -> None:
+        """Collect exit code and resource usage of a finished process."""
+        if self.returncode is not None:
+            return
+        try:
+            _pid, _status, _rusage = os.wait4(self.process.pid,
+                                              0 if block else os.WNOHANG)
+        except ChildProcessError:
+            self.returncode = self.process.wait()
+            return
+        if _pid == 0:
+            return
+        self.returncode = os.waitstatus_to_exitcode(_status)
+        self.process.returncode = self.returncode
+        self.usage = {"cpuTime": _rusage.ru_utime + _rusage.ru_stime,
+                      "maxRSS": _rusage.ru_maxrss}
+
+    def poll(self):
+        """Return the exit code, or None while the process is running."""
+        self.reap(block=False)
+        return self.returncode
+
+    def wait(self) -> int:
+        """Wait for the process to exit and return its exit code."""
+        self.reap(block=True)
+        return self.returncode
+
+    def terminate(self) -> None:
+        """Stop the process (and its process group), killing if needed."""
+        _kill = os.killpg if self.session else os.kill
+        try:
+            _kill(self.process.pid, signal.SIGTERM)
+            _end = time.time() + 10
+            while self.poll() is None and time.time() < _end:
+                time.sleep(0.1)
+            if self.returncode is None:
+                _kill(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.wait()
+
+    def output(self) -> tuple[bytes, bytes]:
+        """Return and discard the captured stdout and stderr."""
+        _output = []
+        for f in (self._stdout, self._stderr):
+            f.seek(0)
+            _output.append(f.read())
+            f.close()
+        return tuple(_output)
+
+
+class LocalBackend():
+    """Backend running every calculation as a process on this node."""
+
+    name = "local"
+
+    def launch(self, calc) -> LocalJob:
+        """Start a QchemCalculation and return its job handle."""
+        return LocalJob(calc.command(), calc.workDir,
+                        session=calc.monitor is not None,
+                        env=calc.environment())
+
+
+class ArrayJob():
+    """Handle of a Qchem calculation run as one task of a job array.
+
+    The task writes the exit code of Qchem to <job>.exit, which marks it
+    as finished. A task that leaves the queue without the marker showing
+    up within the grace period of the backend (e.g. after hitting a time
+    limit) is reported with exit code -1.
+    """
+
+    def __init__(self, backend, calc) -> None:
+        """Queue a calculation for the next array submitted by backend."""
+        self.backend = backend
+        self.args = calc.command()
+        self.env = calc.environment()
+        self.workDir = os.path.abspath(calc.workDir if calc.workDir else ".")
+        self.jobName = calc.jobName
+        self.threads = calc.numThreads
+        self.memory = calc.input.getRem("mem_total")
+        self.marker = os.path.join(self.workDir, f"{self.jobName}.exit")
+        if os.path.isfile(self.marker):
+            os.remove(self.marker)
+        self.arrayId = None
+        self.index = None
+        self.missing = None
+        self.returncode = None
+        self.usage = None
+
+    def command(self) -> str:
+        """Return the shell command run by the array task."""
+        _base = os.path.join(self.workDir, self.jobName)
+        _marker = shlex.quote(self.marker)
+        return (f"cd {shlex.quote(self.workDir)} && " +
+                "".join(f"{k}={shlex.quote(v)} "
+                        for k, v in self.env.items()) +
+                " ".join(shlex.quote(a) for a in self.args) +
+                f" > {shlex.quote(_base + '.stdout')}" +
+                f" 2> {shlex.quote(_base + '.stderr')}; " +
+                f"echo $? > {_marker}.tmp && mv {_marker}.tmp {_marker}")
+
+    def poll(self):
+        """Return the exit code, or None while the task is queued."""
+        if self.returncode is not None:
+            return self.returncode
+        if self.arrayId is None:
+            self.backend.flush()
+        _queued = self.backend.queue()
+        if os.path.isfile(self.marker):
+            with open(self.marker, "r") as f:
+                self.returncode = int(f.read().strip() or 1)
+        elif _queued is not None and \
+                self.backend.taskId(self) not in _queued:
+            # The marker may reach a shared filesystem after the task left
+            if self.missing is None:
+                self.missing = time.time()
+            if time.time() - self.missing >= self.backend.grace:
+                self.backend.log.warning(f"Task {self.backend.taskId(self)} " +
+                                         f"of job '{self.jobName}' left the " +
+                                         "queue without finishing.")
+                self.returncode = -1
+        return self.returncode
+
+    def wait(self) -> int:
+        """Wait for the task to finish and return its exit code."""
+        while self.poll() is None:
+            time.sleep(self.backend.interval)
+        return self.returncode
+
+    def terminate(self) -> None:
+        """Cancel the task."""
+        if self.arrayId is not None:
+            self.backend.cancel(self)
+        self.returncode = -signal.SIGTERM
+
+    def output(self) -> tuple[bytes, bytes]:
+        """Return the stdout and stderr written by the task."""
+        _output = []
+        for _ext in ("stdout", "stderr"):
+            _fname = os.path.join(self.workDir, f"{self.jobName}.{_ext}")
+            if os.path.isfile(_fname):
+                with open(_fname, "rb") as f:
+                    _output.append(f.read())
+            else:
+                _output.append(b"")
+        return tuple(_output)
+
+
+class ClusterBackend(abc.ABC):
+    """Backend submitting calculations to a batch system as job arrays.
+
+    Calculations launched between two polls are collected and submitted
+    as one job array per thread count and memory, the latter taken from
+    $rem mem_total (in MB). Working and scratch directories have to be on
+    a filesystem shared with the compute nodes.
+    """
+
+    name = ""
+    submitCommand = ""
+    indexVariable = ""
+
+    def __init__(self, options: list[str] = [], dir: str = "",
+                 interval: float = 5.0, grace: float = 60.0,
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the backend.
+
+        options are extra directives for the job scripts, which are written
+        to dir; the queue is queried at most once per interval seconds. A
+        task that left the queue is given grace seconds to write its exit
+        code before it is reported as failed.
+        """
+        self.initLogging(loggerLevel)
+
+        self.options = list(options)
+        self.dir = os.path.abspath(dir if dir != "" else ".")
+        self.interval = interval
+        self.grace = grace
+        self.queued = []
+        self.arrays = 0
+        self._queue = None
+        self._queried = 0.0
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemBackend")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def launch(self, calc) -> ArrayJob:
+        """Queue a QchemCalculation for submission, return its handle."""
+        _job = ArrayJob(self, calc)
+        self.queued.append(_job)
+        return _job
+
+    def flush(self) -> None:
+        """Submit all queued calculations as job arrays."""
+        _arrays = {}
+        for _job in self.queued:
+            _arrays.setdefault((_job.threads, _job.memory), []).append(_job)
+        self.queued = []
+        for (_threads, _memory), _jobs in _arrays.items():
+            self.arrays += 1
+            _fname = os.path.join(self.dir, f"RSHtune.{os.getpid()}." +
+                                  f"{self.arrays}.sh")
+            with open(_fname, "w") as f:
+                f.write(self.script(_jobs, _threads, _memory))
+            _id = self.submit(_fname)
+            for j, _job in enumerate(_jobs):
+                _job.arrayId = _id
+                _job.index = j
+            self.log.info(f"Submitted {len(_jobs)} calculations on " +
+                          f"{_threads} threads as array {_id}.")
+        self._queried = 0.0
+
+    def script(self, jobs: list, threads: int, memory) -> str:
+        """Return the job script running jobs as array tasks."""
+        _script = "#!/bin/bash\n"
+        for _directive in self.directives(len(jobs), threads, memory):
+            _script += f"{_directive}\n"
+        _script += f"case ${{{self.indexVariable}:-0}} in\n"
+        for j, _job in enumerate(jobs):
+            _script += f"{j}) {_job.command()} ;;\n"
+        _script += "esac\n"
+        return _script
+
+    def submit(self, fname: str) -> str:
+        """Submit a job script and return the id of the job array."""
+        _run = sb.run([self.submitCommand, fname], capture_output=True,
+                      text=True, check=True)
+        return self.parseId(_run.stdout.strip())
+
+    def queue(self):
+        """Return the ids of all queued tasks, None if the query failed."""
+        if time.time() - self._queried >= self.interval:
+            self._queried = time.time()
+            try:
+                self._queue = self.query()
+            except (OSError, sb.SubprocessError) as e:
+                self.log.warning(f"Could not query the queue: {e}")
+                self._queue = None
+        return self._queue
+
+    @abc.abstractmethod
+    def directives(self, ntasks: int, threads: int, memory) -> list[str]:
+        """Return the job script directives of an array."""
+
+    @abc.abstractmethod
+    def parseId(self, output: str) -> str:
+        """Return the array id from the output of the submit command."""
+
+    @abc.abstractmethod
+    def taskId(self, job: ArrayJob) -> str:
+        """Return the queue id of an array task."""
+
+    @abc.abstractmethod
+    def query(self) -> set:
+        """Return the ids of all queued tasks."""
+
+    @abc.abstractmethod
+    def cancel(self, job: ArrayJob) -> None:
+        """Cancel an array task."""
+
+
+class SlurmBackend(ClusterBackend):
+    """Backend submitting job arrays with SLURM (sbatch/squeue/scancel)."""
+
+    name = "slurm"
+    submitCommand = "sbatch"
+    indexVariable = "SLURM_ARRAY_TASK_ID"
+
+    def directives(self, ntasks: int, threads: int, memory) -> list[str]:
+        """Return the #SBATCH directives of an array."""
+        _directives = ["#SBATCH --job-name=RSHtune",
+                       f"#SBATCH --array=0-{ntasks - 1}",
+                       "#SBATCH --nodes=1",
+                       "#SBATCH --ntasks=1",
+                       f"#SBATCH --cpus-per-task={threads}",
+                       f"#SBATCH --output={self.dir}/RSHtune_%A_%a.log"]
+        if memory is not None:
+            _directives.append(f"#SBATCH --mem={memory}M")
+        return _directives + [f"#SBATCH {o}" for o in self.options]
+
+    def submit(self, fname: str) -> str:
+        """Submit a job script and return the id of the job array."""
+        _run = sb.run([self.submitCommand, "--parsable", fname],
+                      capture_output=True, text=True, check=True)
+        return self.parseId(_run.stdout.strip())
+
+    def parseId(self, output: str) -> str:
+        """Return the job id from sbatch --parsable output."""
+        return output.split(";")[0]
+
+    def taskId(self, job: ArrayJob) -> str:
+        """Return the SLURM id of an array task."""
+        return f"{job.arrayId}_{job.index}"
+
+    def query(self) -> set:
+        """Return the ids of the user's queued tasks."""
+        _run = sb.run(["squeue", "-h", "-r", "-o", "%i",
+                       "-u", getpass.getuser()],
+                      capture_output=True, text=True, check=True)
+        return set(_run.stdout.split())
+
+    def cancel(self, job: ArrayJob) -> None:
+        """Cancel an array task."""
+        sb.run(["scancel", self.taskId(job)], capture_output=True)
+
+
+class PbsBackend(ClusterBackend):
+    """Backend submitting job arrays with PBS Pro (qsub/qstat/qdel)."""
+
+    name = "pbs"
+    submitCommand = "qsub"
+    indexVariable = "PBS_ARRAY_INDEX"
+
+    def directives(self, ntasks: int, threads: int, memory) -> list[str]:
+        """Return the #PBS directives of an array."""
+        _select = f"select=1:ncpus={threads}"
+        if memory is not None:
+            _select += f":mem={memory}mb"
+        _directives = ["#PBS -N RSHtune",
+                       f"#PBS -l {_select}",
+                       "#PBS -j oe",
+                       f"#PBS -o {self.dir}/"]
+        if ntasks > 1:
+            _directives.append(f"#PBS -J 0-{ntasks - 1}")
+        return _directives + [f"#PBS {o}" for o in self.options]
+
+    def parseId(self, output: str) -> str:
+        """Return the job number (with [] for arrays) from qsub output."""
+        return re.match(r"^\d+(\[\])?", output)[0]
+
+    def taskId(self, job: ArrayJob) -> str:
+        """Return the PBS id of an array task."""
+        if job.arrayId.endswith("[]"):
+            return f"{job.arrayId[:-2]}[{job.index}]"
+        return job.arrayId
+
+    def query(self) -> set:
+        """Return the ids of the user's queued tasks."""
+        _run = sb.run(["qstat", "-t", "-w", "-u", getpass.getuser()],
+                      capture_output=True, text=True, check=True)
+        _ids = set()
+        for line in _run.stdout.splitlines():
+            _match = re.match(r"^(\d+(\[\d*\])?)\.", line)
+            if _match:
+                _ids.add(_match[1])
+        return _ids
+
+    def cancel(self, job: ArrayJob) -> None:
+        """Cancel an array task."""
+        sb.run(["qdel", self.taskId(job)], capture_output=True)
+
+
+BACKENDS = {"local": LocalBackend, "slurm": SlurmBackend, "pbs": PbsBackend}
@@ -0,0 +1,174 @@
+"""
+RSHtune  - Batch.
+
+Tune many molecules at once on a shared core budget.
+Dependencies: os, json, shutil, logging
+"""
+import os
+import json
+import shutil
+import logging
+from .input import QchemInput
+from .tuning import QchemTuning
+from .scheduler import QchemScheduler
+
+
+class QchemBatch():
+    """Object for tuning every molecule listed in a manifest.
+
+    The manifest is a JSON file of the form
+        {"molecules": [{"name": "water",
+                        "input": "RSH.in",
+                        "geometry": "water.mol",
+                        "multiplicities": [1, 2, 2],
+                        "objective": "OT",
+                        "omega": [0.2, 0.25, 0.3]}]}
+    where omega may also be {"start": 0.2, "stop": 0.3, "step": 0.01};
+    multiplicities and objective (by default the batch's) are optional.
+    Paths are relative to the manifest. Every molecule is tuned in its own
+    working directory below root.
+    """
+
+    def __init__(self, manifest: str, ncores: int, root: str = "",
+                 minThreads: int = 1, warmStart: bool = False,
+                 cache=None, journal=None, inline: bool = False,
+                 monitor: dict = None, retries: list[dict] = [],
+                 backend=None, metrics=None, scratch=None,
+                 objective: str = "OT", loggerLevel: str = "INFO") -> None:
+        """Read the manifest and set up the batch."""
+        self.initLogging(loggerLevel)
+
+        self.manifestFile = manifest
+        with open(self.manifestFile, "r") as f:
+            self.molecules = json.load(f)["molecules"]
+        self.log.info(f"Read {len(self.molecules)} molecules from " +
+                      f"<{self.manifestFile}>.")
+
+        self.root = root if root != "" else os.path.dirname(manifest)
+        self.numCores = ncores
+        self.minThreads = minThreads
+        self.warmStart = warmStart
+        self.cache = cache
+        self.journal = journal
+        self.inline = inline
+        self.monitor = monitor
+        self.retries = retries
+        self.backend = backend
+        self.metrics = metrics
+        self.scratch = scratch
+        self.objective = objective
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemBatch")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def setup(self, molecule: dict) -> str:
+        """Create a molecule's working directory, return its input file."""
+        _base = os.path.dirname(self.manifestFile)
+        _dir = os.path.join(self.root, molecule["name"])
+        os.makedirs(_dir, exist_ok=True)
+        _geometry = os.path.basename(molecule["geometry"])
+        shutil.copyfile(os.path.join(_base, molecule["geometry"]),
+                        os.path.join(_dir, _geometry))
+        _input = QchemInput(os.path.join(_base, molecule["input"]),
+                            loggerLevel=self.logLevel[0])
+        _input.input["molecule"] = [["read", _geometry]]
+        _fname = os.path.join(_dir, os.path.basename(molecule["input"]))
+        with open(_fname, "w") as f:
+            f.write(str(_input))
+        self.log.info(f"Set up <{_dir}> for molecule '{molecule['name']}'.")
+        return _fname
+
+    def run(self, callback=None) -> dict:
+        """Run all molecules, return J_OT by molecule name and omega.
+
+        callback(name, omega, jot) is invoked as soon as each omega of a
+        molecule has finished; jot is None if the calculations failed.
+        """
+        scheduler = QchemScheduler(ncores=self.numCores,
+                                   minThreads=self.minThreads,
+                                   warmStart=self.warmStart,
+                                   journal=self.journal,
+                                   monitor=self.monitor,
+                                   retries=self.retries,
+                                   backend=self.backend,
+                                   scratch=self.scratch,
+                                   loggerLevel=self.logLevel[0])
+        self.tuningRuns = {}
+        self.results = {m["name"]: {} for m in self.molecules}
+
+        def report(group: tuple, calcs: dict) -> None:
+            tuning_run = self.tuningRuns[group]
+            tuning_run.collectTimings(calcs)
+            try:
+                tuning_run.parseOutput()
+                tuning_run.calculateOptimalTuning()
+                _jot = tuning_run.data["tuning"]["JOT"]
+            except ValueError:
+                _jot = None
+            self.results[group[0]][group[1]] = _jot
+            if callback is not None:
+                callback(*group, _jot)
+
+        _immediate = []
+        for molecule in self.molecules:
+            _fname = self.setup(molecule)
+            _template = QchemInput(_fname, loggerLevel=self.logLevel[0])
+            _multi = molecule.get("multiplicities", [0, 0, 0])
+            for _o in sorted(omegaValues(molecule["omega"])):
+                tuning_run = QchemTuning(fname=_fname,
+                                         omega=_o,
+                                         nthreads=self.minThreads,
+                                         neutralSpMlt=_multi[0],
+                                         anionSpMlt=_multi[1],
+                                         cationSpMlt=_multi[2],
+                                         cache=self.cache,
+                                         journal=self.journal,
+                                         template=_template,
+                                         inline=self.inline,
+                                         metrics=self.metrics,
+                                         scratch=self.scratch,
+                                         objective=molecule.get(
+                                             "objective", self.objective),
+                                         scheduler=scheduler,
+                                         loggerLevel=self.logLevel[0])
+                _group = (molecule["name"], tuning_run.omega)
+                self.tuningRuns[_group] = tuning_run
+                if tuning_run.scheduleCalculations(
+                        scheduler, series=molecule["name"]) == 0:
+                    _immediate.append(_group)
+        for _group in _immediate:
+            report(_group, {})
+        scheduler.run(callback=report)
+        return self.results
+
+    def optimalOmega(self) -> dict:
+        """Return the omega with the lowest J_OT for every molecule."""
+        _optimal = {}
+        for name, _table in self.results.items():
+            _valid = {o: j for o, j in _table.items() if j is not None}
+            _optimal[name] = min(_valid, key=_valid.get) if _valid else None
+        return _optimal
+
+
+def omegaValues(spec) -> list[float]:
+    """Return the omega values of a list or start/stop/step spec."""
+    if isinstance(spec, dict):
+        _start = round(spec["start"] * 1000)
+        _stop = round(spec["stop"] * 1000)
+        _step = max(1, round(spec["step"] * 1000))
+        return [o / 1000 for o in range(_start, _stop + 1, _step)]
+    return list(spec)
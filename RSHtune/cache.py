@@ -0,0 +1,150 @@
+"""
+RSHtune  - Cache.
+
+Persistent store of parsed results of finished Qchem calculations.
+Dependencies: os, time, sqlite3, hashlib, logging
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+from .input import QchemInput
+
+
+class QchemCache():
+    """Object for caching calculation results keyed by their input."""
+
+    def __init__(self, fname: str = "RSHtune.db",
+                 loggerLevel: str = "INFO") -> None:
+        """Open (or create) the cache database."""
+        self.initLogging(loggerLevel)
+
+        self.cacheFile = fname
+        self.db = sqlite3.connect(self.cacheFile)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+                               key          TEXT PRIMARY KEY,
+                               omega        INTEGER,
+                               charge       INTEGER,
+                               multiplicity INTEGER,
+                               energy       REAL,
+                               homo         REAL,
+                               lumo         REAL,
+                               walltime     REAL,
+                               created      REAL,
+                               accessed     REAL)""")
+        self.db.commit()
+        self.log.info(f"Using result cache <{self.cacheFile}> with " +
+                      f"{len(self)} entries.")
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemCache")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def __len__(self) -> int:
+        """Return the number of cached results."""
+        return self.db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, fname: str) -> tuple[str, int, int, int]:
+        """Return hash key, omega, charge and multiplicity of an input file.
+
+        The key covers the rendered input text and the geometry it reads,
+        which includes charge and spin multiplicity.
+        """
+        _input = QchemInput(fname, loggerLevel=self.logLevel[0])
+        _molecule = _input.input["molecule"]
+        if _molecule[0][0].lower() == "read":
+            _path = os.path.join(os.path.dirname(fname), _molecule[0][1])
+            with open(_path, "r") as f:
+                _geometry = f.read()
+            _charge, _multi = _geometry.split("\n")[1].split()[:2]
+        else:
+            _geometry = ""
+            _charge, _multi = _molecule[0][:2]
+        _omega = [int(i[1]) for i in _input.input["rem"] if i[0] == "omega"]
+        _omega = _omega[0] if _omega else 0
+        _hash = hashlib.sha256()
+        for item in (str(_input), _geometry,
+                     f"{_charge} {_multi} {_omega}"):
+            _hash.update(item.encode())
+            _hash.update(b"\0")
+        return _hash.hexdigest(), _omega, int(_charge), int(_multi)
+
+    def get(self, key: str, touch: bool = True) -> dict:
+        """Return the cached result for a key, or None.
+
+        With touch=False the access time is left alone and nothing is
+        written to the database, as for read-only analysis.
+        """
+        _row = self.db.execute("""SELECT energy, homo, lumo, walltime
+                                  FROM results WHERE key = ?""",
+                               (key,)).fetchone()
+        if _row is None:
+            return None
+        if touch:
+            self.db.execute("UPDATE results SET accessed = ? WHERE key = ?",
+                            (time.time(), key))
+            self.db.commit()
+        return {"SCFenergy": _row[0], "HOMO": _row[1], "LUMO": _row[2],
+                "wallTime": _row[3]}
+
+    def put(self, key: str, omega: int, charge: int, multiplicity: int,
+            data: dict) -> None:
+        """Store the parsed result of a finished calculation."""
+        _now = time.time()
+        self.db.execute("""INSERT OR REPLACE INTO results
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (key, omega, charge, multiplicity,
+                         data["SCFenergy"], data["HOMO"], data["LUMO"],
+                         data.get("wallTime"), _now, _now))
+        self.db.commit()
+
+    def invalidate(self, key: str = "", omega: int = None) -> int:
+        """Remove results by key or by omega/1000, return the count."""
+        if key != "":
+            _cur = self.db.execute("DELETE FROM results WHERE key = ?",
+                                   (key,))
+        elif omega is not None:
+            _cur = self.db.execute("DELETE FROM results WHERE omega = ?",
+                                   (omega,))
+        else:
+            return 0
+        self.db.commit()
+        self.log.info(f"Invalidated {_cur.rowcount} cached results.")
+        return _cur.rowcount
+
+    def evict(self, maxAge: float = None, maxEntries: int = None) -> int:
+        """Remove results unused for maxAge days or beyond maxEntries."""
+        _removed = 0
+        if maxAge is not None:
+            _cur = self.db.execute("DELETE FROM results WHERE accessed < ?",
+                                   (time.time() - maxAge * 86400,))
+            _removed += _cur.rowcount
+        if maxEntries is not None:
+            _cur = self.db.execute("""DELETE FROM results WHERE key NOT IN
+                                      (SELECT key FROM results
+                                       ORDER BY accessed DESC LIMIT ?)""",
+                                   (maxEntries,))
+            _removed += _cur.rowcount
+        self.db.commit()
+        self.log.info(f"Evicted {_removed} cached results.")
+        return _removed
+
+    def clear(self) -> None:
+        """Remove all cached results."""
+        self.db.execute("DELETE FROM results")
+        self.db.commit()
+        self.log.info("Cleared result cache.")
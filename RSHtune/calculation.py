@@ -2,37 +2,89 @@
 RSHtune  - Calculation.
 
 Setup adn running of calculations.
-Dependencies: time, logging, subprocess
+Dependencies: os, time, shutil, logging, subprocess
 """
+import os
 import time
+import shutil
 import logging
 import subprocess as sb
 from .input import QchemInput
+from .output import QchemOutput
+from .monitor import QchemMonitor
+from .backend import LocalBackend
+from .scratch import RESTART
+
+# Escalating $rem overrides for rerunning calculations that failed
+RETRIES = ({"scf_algorithm": "diis_gdm"},
+           {"scf_algorithm": "gdm"},
+           {"scf_algorithm": "diis", "level_shift": "true", "lshift": 300},
+           {"scf_algorithm": "gdm", "scf_guess": "core"})
 
 
 class QchemCalculation():
     """Object for setting up and running a Qchem calculation."""\
 
     def __init__(self, fname: str, jname: str = "", nthreads: int = 0,
+                 guess: str = "", monitor: dict = None,
+                 retries: list[dict] = [], backend=None, scratch=None,
                  loggerLevel: str = "INFO") -> None:
-        """Initialize input."""
+        """Initialize input.
+
+        monitor holds keyword arguments of a QchemMonitor, retries $rem
+        overrides such as RETRIES[:2].
+        """
         self.initLogging(loggerLevel)
 
         # Input File
         self.log.info(f"Creating QChem calculation from <{fname}> input file.")
         self.input = QchemInput(fname, loggerLevel=self.logLevel[0])
+        self.baseRem = [list(item) for item in self.input.input["rem"]]
 
         # Molecular Geometry
-        self.molecule = self.input.input["molecule"][0][1]
+        self.molecule = self.input.input["molecule"][0][1] \
+            if self.input.input["molecule"][0][0].lower() == "read" \
+            else "inline"
         self.log.info(f"Using molecular geometry in <{self.molecule}>.")
 
-        # Jobname
-        self.jobName = fname.split(".")[0] if jname == "" else jname
+        # Jobname; Qchem runs inside the directory of the input file
+        self.workDir = os.path.dirname(fname)
+        self.jobName = os.path.splitext(os.path.basename(fname))[0] \
+            if jname == "" else jname
+        self.jobPath = os.path.join(self.workDir, self.jobName)
         self.log.info(f"This Qchem job will use jobname '{self.jobName}'.")
 
+        # Scratch directory name, unique across working directories
+        self.scratchName = self.jobName
+        if self.workDir != "":
+            _dir = os.path.basename(os.path.normpath(self.workDir))
+            self.scratchName = f"{_dir}_{self.jobName}"
+
         # Number of Threads
         self.numThreads = 1 if nthreads == 0 else nthreads
 
+        # Execution Backend
+        self.backend = LocalBackend() if backend is None else backend
+
+        # Scratch Management
+        self.scratch = scratch
+
+        # Initial Guess
+        self.guess = ""
+        if guess != "":
+            self.setGuess(guess)
+
+        # SCF Monitoring; failure records why a monitored job was aborted
+        self.monitorSettings = monitor
+        self.monitor = None
+        self.failure = None
+        self._data = None
+
+        # Retry Policy; attempts records every failed run of this job
+        self.retries = list(retries)
+        self.retried = 0
+        self.attempts = []
+
     def initLogging(self, level: str) -> None:
         """Initialize logging."""
         _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
@@ -50,16 +102,233 @@ class QchemCalculation():
             self.log.handlers.clear()
         self.log.addHandler(logStreamHandler)
 
+    def setGuess(self, sname: str) -> None:
+        """Read the initial guess from the saved scratch of another job."""
+        if not os.path.isdir(self.scratchDir(sname)):
+            self.log.warning(f"No saved scratch '{sname}', " +
+                             "using default guess.")
+            return
+        self.guess = sname
+        self.input.setRem("scf_guess", "read")
+        self.writeInput()
+        self.log.info(f"Reading initial guess from job '{self.guess}'.")
+
+    def writeInput(self) -> None:
+        """Write the (modified) input back to the job's input file."""
+        replaceFile(f"{self.jobPath}.in", str(self.input))
+
+    def outputData(self) -> dict:
+        """Return the data parsed from the output of the last run."""
+        if self._data is None:
+            _output = QchemOutput(loggerLevel=self.logLevel[0])
+            if os.path.isfile(f"{self.jobPath}.out"):
+                _output.read(f"{self.jobPath}.out")
+            self._data = _output.data
+        return self._data
+
+    def converged(self) -> bool:
+        """Return whether the finished job reached a converged SCF."""
+        return self.outputData()["converged"]
+
+    def metrics(self) -> dict:
+        """Return resource usage and Qchem timings of the last run.
+
+        cpuTime (s) and maxRSS (kB) come from the rusage of the Qchem
+        process and are None for backends that cannot measure them.
+        """
+        _data = self.outputData()
+        return {"threads": self.numThreads,
+                "returnCode": self.returnCode,
+                "wallTime": self.wallTime,
+                "cpuTime": self.cpuTime,
+                "maxRSS": self.maxRSS,
+                "SCFcycles": _data["SCFcycles"],
+                "converged": _data["converged"],
+                "SCFwall": _data["SCFtime"]["wall"],
+                "SCFcpu": _data["SCFtime"]["cpu"],
+                "qchemWall": _data["jobTime"]["wall"],
+                "qchemCPU": _data["jobTime"]["cpu"]}
+
+    def restartCold(self) -> bool:
+        """Relaunch a warm-started job that failed to converge without guess.
+
+        Returns True if the job was relaunched and needs waiting for again.
+        """
+        if self.guess == "" or self.converged():
+            return False
+        self.log.warning(f"Job '{self.jobPath}' did not converge from the " +
+                         f"guess of '{self.guess}', restarting cold.")
+        self.archiveAttempt()
+        self.guess = ""
+        self.input.removeRem("scf_guess")
+        self.writeInput()
+        shutil.rmtree(self.scratchDir(self.scratchName), ignore_errors=True)
+        self.start()
+        return True
+
+    def retry(self) -> bool:
+        """Relaunch a failed job with the next $rem overrides of retries.
+
+        Returns True if the job was relaunched and needs waiting for again.
+        """
+        if self.retried >= len(self.retries) or self.converged():
+            return False
+        _rem = self.retries[self.retried]
+        self.log.warning(f"Job '{self.jobPath}' did not converge, retry " +
+                         f"{self.retried + 1}/{len(self.retries)} with " +
+                         ", ".join(f"{k}={v}" for k, v in _rem.items()) + ".")
+        self.archiveAttempt()
+        self.guess = ""
+        self.input.input["rem"] = [list(item) for item in self.baseRem]
+        for key, value in _rem.items():
+            self.input.setRem(key, value)
+        self.writeInput()
+        self.retried += 1
+        shutil.rmtree(self.scratchDir(self.scratchName), ignore_errors=True)
+        self.start()
+        return True
+
+    def recover(self) -> bool:
+        """Restart a failed job cold, or else retry it, if possible."""
+        return self.restartCold() or self.retry()
+
+    def archiveAttempt(self) -> None:
+        """Keep the output and timings of a failed run for review."""
+        _output = f"{self.jobPath}.fail{len(self.attempts) + 1}.out"
+        _metrics = self.metrics()
+        if os.path.isfile(f"{self.jobPath}.out"):
+            os.replace(f"{self.jobPath}.out", _output)
+        self.attempts.append({"guess": self.guess,
+                              "rem": self.retries[self.retried - 1]
+                              if self.retried > 0 else {},
+                              "failure": self.failure,
+                              "output": _output,
+                              **_metrics})
+        self.log.info(f"Kept output of failed run in <{_output}>.")
+
+    def start(self) -> None:
+        """Launch a Qchem calculation without waiting for it to finish."""
+        self.log.info(f"Running Qchem with {self.numThreads} threads.")
+        if self.scratch is not None:
+            self.scratch.track(self.scratchName)
+        if self.guess != "" and self.scratch is not None:
+            self.scratch.restore(self.guess, self.scratchName)
+        elif self.guess != "":
+            _dest = scratchPath(self.scratchName)
+            os.makedirs(_dest, exist_ok=True)
+            for _file in RESTART:
+                _source = os.path.join(scratchPath(self.guess), _file)
+                if os.path.isfile(_source):
+                    shutil.copyfile(_source, os.path.join(_dest, _file))
+        self.failure = None
+        self._data = None
+        if self.monitorSettings is not None:
+            if os.path.isfile(f"{self.jobPath}.out"):
+                os.remove(f"{self.jobPath}.out")
+            self.monitor = QchemMonitor(f"{self.jobPath}.out",
+                                        **self.monitorSettings,
+                                        loggerLevel=self.logLevel[0])
+        self._start = time.time()
+        self.process = self.backend.launch(self)
+
+    def command(self) -> list[str]:
+        """Return the Qchem command line, run inside the working directory."""
+        return ["qchem",
+                "-save",
+                "-nt",
+                f"{self.numThreads}",
+                f"{self.jobName}.in",
+                f"{self.jobName}.out",
+                f"{self.scratchName}"]
+
+    def environment(self) -> dict:
+        """Return environment variables to set for Qchem."""
+        if self.scratch is None:
+            return {}
+        return {"QCSCRATCH": self.scratch.root}
+
+    def scratchDir(self, sname: str) -> str:
+        """Return the directory of the scratch saved under a name."""
+        if self.scratch is None:
+            return scratchPath(sname)
+        return self.scratch.path(sname)
+
+    def pruneScratch(self) -> None:
+        """Reduce the saved scratch of a finished job to restart files."""
+        if self.scratch is not None:
+            self.scratch.prune(self.scratchName, self.converged())
+
+    def poll(self):
+        """Check on a launched calculation, return its exit code or None.
+
+        Monitored jobs whose SCF stopped making progress are aborted.
+        """
+        if self.monitor is not None and self.process.poll() is None:
+            _failure = self.monitor.update()
+            if _failure is not None:
+                self.abort(_failure)
+        return self.process.poll()
+
+    def abort(self, failure: dict) -> None:
+        """Kill a running calculation and record why."""
+        self.failure = failure
+        self.log.warning(f"Aborting job '{self.jobPath}': SCF " +
+                         f"{failure['reason']} at cycle {failure['cycle']} " +
+                         f"with error {failure['error']:.2e}.")
+        self.process.terminate()
+
+    def wait(self) -> int:
+        """Wait for a launched Qchem calculation and return its exit code."""
+        if self.monitor is not None:
+            while self.poll() is None:
+                time.sleep(self.monitor.interval)
+            self.monitor.close()
+        self.process.wait()
+        self.wallTime = time.time() - self._start
+        self.returnCode = self.process.returncode
+        _usage = self.process.usage if self.process.usage else {}
+        self.cpuTime = _usage.get("cpuTime")
+        self.maxRSS = _usage.get("maxRSS")
+        self.calc = sb.CompletedProcess(self.process.args, self.returnCode,
+                                        *self.process.output())
+        self.log.info(f"Completed Qchem run in {self.wallTime:.1f}s " +
+                      (f"({self.cpuTime:.1f}s CPU) "
+                       if self.cpuTime is not None else "") +
+                      f"with exit code {self.returnCode}.")
+        self.log.info(f"Output written to <{self.jobPath}.out>.")
+        return self.returnCode
+
     def submit(self) -> None:
         """Run a single Qchem caluclation."""
-        self.log.info(f"Running Qchem with {self.numThreads} threads.")
-        _start = time.time()
-        self.calc = sb.run(["qchem",
-                            "-save",
-                            "-nt",
-                            f"{self.numThreads}",
-                            f"{self.jobName}.in",
-                            f"{self.jobName}.out",
-                            f"{self.jobName}"], capture_output=True)
-        self.log.info(f"Completed Qchem run in {time.time() - _start:.1f}s.")
-        self.log.info(f"Output written to <{self.jobName}.out>.")
+        self.start()
+        self.wait()
+        while self.recover():
+            self.wait()
+
+
+def replaceFile(fname: str, text: str) -> bool:
+    """Write text to a file unless it holds it already, return if written.
+
+    The file is replaced atomically, so a process reading it never sees it
+    truncated.
+    """
+    if os.path.isfile(fname):
+        with open(fname, "r") as f:
+            if f.read() == text:
+                return False
+    with open(f"{fname}.tmp", "w") as f:
+        f.write(text)
+    os.replace(f"{fname}.tmp", fname)
+    return True
+
+
+def scratchPath(sname: str) -> str:
+    """Return the Qchem scratch directory saved under a name."""
+    return os.path.join(os.environ.get("QCSCRATCH", "."), sname)
+
+
+def nearestGuess(finished: dict, omega: float) -> str:
+    """Return the scratch name of the finished omega closest to omega."""
+    if not finished:
+        return ""
+    return finished[min(finished, key=lambda o: abs(o - omega))]
@@ -9,7 +9,12 @@ import logging
 
 
 class QchemInput():
-    """Object for reading and modifying input for Q-Chem."""
+    """Object for reading and modifying input for Q-Chem.
+
+    Besides the editable input dictionary, the parsed file is kept as an
+    immutable model from which inputs with changed parameters can be
+    rendered in memory, without parsing the file again.
+    """
 
     def __init__(self, fname: str, loggerLevel: str = "INFO") -> None:
         """Initialize input."""
@@ -54,9 +59,56 @@ class QchemInput():
                     self.input[key] = []
                 elif ln[0][0] != "$":
                     self.input[key].append(ln)
+        self.model = tuple((sec, tuple(tuple(ln) for ln in lines))
+                           for sec, lines in self.input.items())
         self.log.info(f"Read {len(content)} lines, " +
                       f"finding {len(self.input.keys())} input sections.")
 
+    def setRem(self, key: str, value) -> None:
+        """Set a $rem variable, adding it if not present."""
+        for j, item in enumerate(self.input["rem"]):
+            if item[0].lower() == key.lower():
+                self.input["rem"][j] = [item[0], value]
+                return
+        self.input["rem"].append([key.lower(), value])
+
+    def getRem(self, key: str, default=None):
+        """Return the value of a $rem variable, or default if not set."""
+        for item in self.input["rem"]:
+            if item[0].lower() == key.lower():
+                return item[1]
+        return default
+
+    def removeRem(self, key: str) -> None:
+        """Remove a $rem variable if present."""
+        self.input["rem"] = [item for item in self.input["rem"]
+                             if item[0].lower() != key.lower()]
+
+    def xcWeights(self) -> dict:
+        """Return the $xc_functional weights keyed by (type, functional)."""
+        return {tuple(ln[:2]): float(ln[2])
+                for sec, lines in self.model if sec == "xc_functional"
+                for ln in lines if len(ln) > 2}
+
+    def hybridWeights(self, alpha: float) -> dict:
+        """Return xc weights for a short-range HF fraction alpha.
+
+        The other exchange functionals keep their ratios and are scaled to
+        the remaining 1 - alpha, as render expects for its xc argument.
+        """
+        _weights = self.xcWeights()
+        _hf = [k for k in _weights if k[0].upper() == "X"
+               and k[1].upper() == "HF"]
+        _dft = [k for k in _weights if k[0].upper() == "X" and k not in _hf]
+        if not _hf or not _dft:
+            raise ValueError("$xc_functional needs an X HF line and a " +
+                             "DFT exchange line to tune alpha.")
+        _total = sum(_weights[k] for k in _dft)
+        return {_hf[0]: alpha,
+                **{k: (1 - alpha) * (_weights[k] / _total if _total > 0
+                                     else 1 / len(_dft))
+                   for k in _dft}}
+
     def lineParse(self, line: str) -> list[str]:
         """Extract line arguments and unify styling."""
         ln = line.split("#")[0].split("!")[0]
@@ -83,18 +135,59 @@ class QchemInput():
         """Baeutify keys."""
         return f"{key.lower():<30s}"
 
+    def formatSection(self, sec: str, lines) -> str:
+        """Format a single input section."""
+        repr = f"${sec}\n"
+        for line in lines:
+            if len(line) == 2:
+                repr += f"{self.keyParse(line[0])} "
+                repr += f"{self.valParse(line[1])}\n"
+            else:
+                for item in line:
+                    repr += f"{item:<10s}"
+                repr += "\n"
+        repr += "$end\n\n"
+        return repr
+
+    def render(self, omega: int = None, charge: int = 0,
+               multiplicity: int = 1, molecule: str = "",
+               geometry: list = None, xc: dict = {},
+               rem: dict = {}) -> str:
+        """Render the parsed model with changed parameters as input text.
+
+        omega (in units of 1/1000) and rem override $rem variables, xc maps
+        (type, functional), e.g. ("X", "HF"), to new $xc_functional weights.
+        The $molecule section reads the file molecule, or, if geometry (a
+        list of atom lines) is given, is written inline with charge and
+        multiplicity.
+        """
+        _rem = {k.lower(): v for k, v in rem.items()}
+        if omega is not None:
+            _rem["omega"] = omega
+        repr = ""
+        for sec, lines in self.model:
+            if sec == "molecule" and geometry is not None:
+                lines = ((str(charge), str(multiplicity)),
+                         *(tuple(a.split()) for a in geometry))
+            elif sec == "molecule" and molecule != "":
+                lines = (("read", molecule),)
+            elif sec == "rem" and _rem:
+                _keys = [ln[0].lower() for ln in lines]
+                lines = tuple((ln[0], _rem[ln[0].lower()])
+                              if ln[0].lower() in _rem else ln
+                              for ln in lines) + \
+                    tuple((k, v) for k, v in _rem.items() if k not in _keys)
+            elif sec == "xc_functional" and xc:
+                lines = tuple((*ln[:2], f"{xc[tuple(ln[:2])]:.4f}")
+                              if tuple(ln[:2]) in xc else ln
+                              for ln in lines)
+            repr += self.formatSection(sec, [[str(i) for i in ln]
+                                             for ln in lines])
+        return repr
+
     def __repr__(self) -> str:
         """Provide string representation of object."""
         repr = ""
         for sec in self.input.keys():
-            repr += f"${sec}\n"
-            for line in self.input[sec]:
-                if len(line) == 2:
-                    repr += f"{self.keyParse(line[0])} "
-                    repr += f"{self.valParse(line[1])}\n"
-                else:
-                    for item in line:
-                        repr += f"{item:<10s}"
-                    repr += "\n"
-            repr += f"$end\n\n"
+            repr += self.formatSection(sec, self.input[sec])
         return repr
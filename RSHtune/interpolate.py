@@ -0,0 +1,171 @@
+"""
+RSHtune  - Interpolate.
+
+Sub-grid estimate of the optimal omega from a coarse scan.
+Dependencies: bisect, logging
+"""
+import bisect
+import logging
+from .analysis import QchemAnalysis
+
+GOLDEN = 0.3819660112501051
+
+
+class QchemInterpolation():
+    """Object for locating the minimum of J_OT between scanned omegas.
+
+    Natural cubic splines are fitted to the smooth components of J_OT, the
+    energies of the charge states and the neutral HOMO and LUMO, instead
+    of to J_OT itself, whose minimum is sharp. J of the objective is
+    evaluated from the splines on a fine grid and its minimum refined by
+    golden section search. The uncertainty of omega* is the largest shift
+    of the minimum when single interior points are left out of the fit.
+    """
+
+    def __init__(self, dir: str = "", nprocs: int = 0, cache=None,
+                 journal=None, resolution: float = 0.0001,
+                 multiplicities: list[int] = [], objective: str = "OT",
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the interpolation of the tuning runs in a directory."""
+        self.initLogging(loggerLevel)
+
+        self.analysis = QchemAnalysis(dir=dir, nprocs=nprocs, cache=cache,
+                                      journal=journal,
+                                      multiplicities=multiplicities,
+                                      objective=objective,
+                                      loggerLevel=self.logLevel[0])
+        self.states = self.analysis.states
+        self.resolution = resolution
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemInterpolation")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def load(self) -> dict:
+        """Return the components of all complete omegas as columns."""
+        _data = self.analysis.parse()
+        self.columns = {"omega": [], **{s: [] for s in self.states},
+                        "HOMO": [], "LUMO": []}
+        for o in sorted(_data):
+            if any(_data[o][s] is None for s in self.states):
+                continue
+            self.columns["omega"].append(o / 1000)
+            for s in self.states:
+                self.columns[s].append(_data[o][s]["SCFenergy"])
+            self.columns["HOMO"].append(_data[o]["neutral"]["HOMO"])
+            self.columns["LUMO"].append(_data[o]["neutral"]["LUMO"])
+        self.log.info(f"Loaded {len(self.columns['omega'])} complete " +
+                      "tuning runs.")
+        return self.columns
+
+    def fit(self, columns: dict, skip: int = None) -> dict:
+        """Return splines of every component, leaving out point skip."""
+        _keep = [j for j in range(len(columns["omega"])) if j != skip]
+        _omega = [columns["omega"][j] for j in _keep]
+        return {k: naturalSpline(_omega, [v[j] for j in _keep])
+                for k, v in columns.items() if k != "omega"}
+
+    def jot(self, splines: dict, omega: float) -> float:
+        """Return J of the objective at omega from the component splines."""
+        _e = {k: splineValue(s, omega) for k, s in splines.items()}
+        _jot = 0.0
+        if "cation" in self.states:
+            _jot += (_e["cation"] - _e["neutral"] + _e["HOMO"])**2
+        if "anion" in self.states:
+            _jot += (_e["neutral"] - _e["anion"] + _e["LUMO"])**2
+        return _jot
+
+    def minimize(self, splines: dict, start: float,
+                 stop: float) -> tuple[float, float]:
+        """Return omega and J of the minimum of J in [start, stop]."""
+        _n = max(1, round((stop - start) / self.resolution))
+        _grid = [start + (stop - start) * j / _n for j in range(_n + 1)]
+        _j = min(range(len(_grid)), key=lambda j: self.jot(splines,
+                                                           _grid[j]))
+        _a = _grid[max(0, _j - 1)]
+        _b = _grid[min(_n, _j + 1)]
+        while _b - _a > 1e-3 * self.resolution:
+            _x1 = _a + GOLDEN * (_b - _a)
+            _x2 = _b - GOLDEN * (_b - _a)
+            if self.jot(splines, _x1) < self.jot(splines, _x2):
+                _b = _x2
+            else:
+                _a = _x1
+        _omega = (_a + _b) / 2
+        return _omega, self.jot(splines, _omega)
+
+    def optimum(self) -> dict:
+        """Return omega*, J*, IP and/or EA and the uncertainty of omega*.
+
+        IP and EA are only given if the objective needs them. edge is True
+        if the minimum lies at the end of the scanned range, where it is
+        probably not bracketed.
+        """
+        if not hasattr(self, "columns"):
+            self.load()
+        _omega = self.columns["omega"]
+        if len(_omega) < 3:
+            raise ValueError("Need at least 3 complete tuning runs, " +
+                             f"found {len(_omega)}.")
+        _splines = self.fit(self.columns)
+        _best, _jot = self.minimize(_splines, _omega[0], _omega[-1])
+        _shifts = [abs(self.minimize(self.fit(self.columns, skip=j),
+                                     _omega[0], _omega[-1])[0] - _best)
+                   for j in range(1, len(_omega) - 1)
+                   if len(_omega) > 3]
+        _e = {k: splineValue(s, _best) for k, s in _splines.items()}
+        _optimum = {"omega": _best, "JOT": _jot,
+                    "error": max(_shifts) if _shifts else None,
+                    "HOMO": _e["HOMO"], "LUMO": _e["LUMO"],
+                    "points": len(_omega),
+                    "edge": min(_best - _omega[0], _omega[-1] - _best)
+                    < self.resolution}
+        if "cation" in self.states:
+            _optimum["IP"] = _e["cation"] - _e["neutral"]
+        if "anion" in self.states:
+            _optimum["EA"] = _e["neutral"] - _e["anion"]
+        self.log.info(f"Interpolated omega*={_best:.4f} from " +
+                      f"{len(_omega)} points.")
+        return _optimum
+
+
+def naturalSpline(x: list[float], y: list[float]) -> list[tuple]:
+    """Return the segments (x, a, b, c, d) of a natural cubic spline."""
+    _n = len(x) - 1
+    _h = [x[j+1] - x[j] for j in range(_n)]
+    _mu = [0.0] * (_n + 1)
+    _z = [0.0] * (_n + 1)
+    for j in range(1, _n):
+        _alpha = 3 * ((y[j+1] - y[j]) / _h[j] - (y[j] - y[j-1]) / _h[j-1])
+        _l = 2 * (x[j+1] - x[j-1]) - _h[j-1] * _mu[j-1]
+        _mu[j] = _h[j] / _l
+        _z[j] = (_alpha - _h[j-1] * _z[j-1]) / _l
+    _c = [0.0] * (_n + 1)
+    _segments = []
+    for j in range(_n - 1, -1, -1):
+        _c[j] = _z[j] - _mu[j] * _c[j+1]
+        _b = (y[j+1] - y[j]) / _h[j] - _h[j] * (_c[j+1] + 2 * _c[j]) / 3
+        _d = (_c[j+1] - _c[j]) / (3 * _h[j])
+        _segments.append((x[j], y[j], _b, _c[j], _d))
+    return _segments[::-1]
+
+
+def splineValue(spline: list[tuple], x: float) -> float:
+    """Evaluate a spline from naturalSpline at x."""
+    _j = bisect.bisect_right(spline, x, key=lambda s: s[0]) - 1
+    _x, _a, _b, _c, _d = spline[min(max(_j, 0), len(spline) - 1)]
+    _dx = x - _x
+    return _a + _dx * (_b + _dx * (_c + _dx * _d))
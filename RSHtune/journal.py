@@ -0,0 +1,118 @@
+"""
+RSHtune  - Journal.
+
+On-disk record of job states for restarting interrupted scans.
+Dependencies: os, json, time, hashlib, logging
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from .output import QchemOutput, findOutput
+
+STATES = ("pending", "running", "done", "failed")
+
+
+class QchemJournal():
+    """Object for tracking the state of every job of a scan on disk.
+
+    The journal is a JSON file that is rewritten atomically on every
+    update, so it is always complete even if the scan is killed. Jobs are
+    given by their path without extension and recorded relative to the
+    journal's directory, so the keys do not depend on the working
+    directory.
+    """
+
+    def __init__(self, fname: str = "RSHtune.journal",
+                 loggerLevel: str = "INFO") -> None:
+        """Open (or create) the journal."""
+        self.initLogging(loggerLevel)
+
+        self.journalFile = os.path.abspath(fname)
+        self.jobs = {}
+        if os.path.isfile(self.journalFile):
+            with open(self.journalFile, "r") as f:
+                self.jobs = json.load(f)["jobs"]
+            self.log.info(f"Read journal <{self.journalFile}> with " +
+                          f"{len(self.jobs)} jobs.")
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemJournal")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def write(self) -> None:
+        """Atomically replace the journal file with the current states."""
+        _tmp = f"{self.journalFile}.tmp"
+        with open(_tmp, "w") as f:
+            json.dump({"jobs": self.jobs}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(_tmp, self.journalFile)
+
+    def key(self, jname: str) -> str:
+        """Return the key of a job, its path relative to the journal."""
+        return os.path.relpath(os.path.abspath(jname),
+                               os.path.dirname(self.journalFile))
+
+    def mark(self, jname: str, state: str, **info) -> None:
+        """Set the state of a job and record any extra information."""
+        if state not in STATES:
+            raise ValueError(f"Unknown job state '{state}'.")
+        _job = self.jobs.setdefault(self.key(jname), {})
+        _job.update(info)
+        _job["state"] = state
+        _job["updated"] = time.time()
+        self.write()
+        self.log.info(f"Job '{jname}' is {state}.")
+
+    def state(self, jname: str) -> str:
+        """Return the recorded state of a job, or an empty string."""
+        return self.jobs.get(self.key(jname), {}).get("state", "")
+
+    def completed(self, jname: str, fname: str) -> bool:
+        """Return whether a job already finished for the same input.
+
+        A job counts as finished if it was run from an identical input file
+        and its output terminated normally with a converged SCF, whatever
+        state was recorded when the scan was interrupted.
+        """
+        _job = self.jobs.get(self.key(jname))
+        if _job is None or _job.get("input") != inputHash(fname):
+            return False
+        _output = findOutput(os.path.splitext(fname)[0])
+        if _output == "":
+            return False
+        _data = QchemOutput(_output, loggerLevel=self.logLevel[0]).data
+        if not (_data["converged"] and _data["finished"]):
+            self.log.warning(f"Output <{_output}> is incomplete, rerunning.")
+            return False
+        if _job["state"] != "done":
+            self.mark(jname, "done")
+        return True
+
+    def progress(self) -> dict:
+        """Return the number of jobs in every state."""
+        _count = {s: 0 for s in STATES}
+        for _job in self.jobs.values():
+            _count[_job["state"]] += 1
+        return _count
+
+
+def inputHash(fname: str) -> str:
+    """Return the SHA-256 hash of an input file."""
+    with open(fname, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
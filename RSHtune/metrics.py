@@ -0,0 +1,100 @@
+"""
+RSHtune  - Metrics.
+
+Export of per-calculation performance data.
+Dependencies: os, csv, json, time, logging
+"""
+import os
+import csv
+import json
+import time
+import logging
+
+FIELDS = ("time", "job", "omega", "state", "threads", "returnCode",
+          "converged", "wallTime", "cpuTime", "maxRSS", "SCFcycles",
+          "SCFwall", "SCFcpu", "qchemWall", "qchemCPU", "attempts",
+          "coreHours")
+
+
+class QchemMetrics():
+    """Object for recording the performance of every finished calculation.
+
+    One record per calculation is appended to a JSON lines file, or to a
+    CSV file if fname ends in .csv, as soon as the calculation finishes.
+    A calculation shared by several tuning runs is recorded only once.
+    coreHours counts threads times wall time of all attempts of a job.
+    """
+
+    def __init__(self, fname: str = "RSHtune.jsonl",
+                 loggerLevel: str = "INFO") -> None:
+        """Set up recording to fname, appending if it exists."""
+        self.initLogging(loggerLevel)
+
+        self.metricsFile = fname
+        self.format = "csv" if fname.lower().endswith(".csv") else "jsonl"
+        self.records = []
+        # Last recorded calculation of a job: jobPath -> (calc, record)
+        self.recorded = {}
+        self.log.info(f"Recording {self.format} metrics to " +
+                      f"<{self.metricsFile}>.")
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemMetrics")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def record(self, omega: float, state: str, calc) -> dict:
+        """Record a finished QchemCalculation and return the record.
+
+        If calc has been recorded before, its earlier record is returned.
+        """
+        if calc.jobPath in self.recorded and \
+                self.recorded[calc.jobPath][0] is calc:
+            return self.recorded[calc.jobPath][1]
+        _runs = [*calc.attempts, calc.metrics()]
+        _record = {"time": time.time(), "job": calc.jobPath,
+                   "omega": omega, "state": state,
+                   **_runs[-1],
+                   "attempts": len(calc.attempts),
+                   "coreHours": sum(r["threads"] * r["wallTime"]
+                                    for r in _runs) / 3600}
+        self.records.append(_record)
+        self.recorded[calc.jobPath] = (calc, _record)
+        self.write(_record)
+        return _record
+
+    def write(self, record: dict) -> None:
+        """Append a record to the metrics file."""
+        if self.format == "csv":
+            _header = not os.path.isfile(self.metricsFile) or \
+                os.path.getsize(self.metricsFile) == 0
+            with open(self.metricsFile, "a", newline="") as f:
+                _writer = csv.DictWriter(f, fieldnames=FIELDS,
+                                         extrasaction="ignore")
+                if _header:
+                    _writer.writeheader()
+                _writer.writerow(record)
+        else:
+            with open(self.metricsFile, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def summary(self) -> dict:
+        """Return core-hours by omega and by charge state."""
+        _summary = {"omega": {}, "state": {}}
+        for r in self.records:
+            for _key in _summary:
+                _summary[_key][r[_key]] = \
+                    _summary[_key].get(r[_key], 0.0) + r["coreHours"]
+        return _summary
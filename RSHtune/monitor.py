@@ -0,0 +1,105 @@
+"""
+RSHtune  - Monitor.
+
+Follow a running Qchem output and detect SCF runs that will not converge.
+Dependencies: os, logging
+"""
+import os
+import logging
+from .output import QchemOutput
+
+
+class QchemMonitor():
+    """Object for tailing the output of a running Qchem calculation.
+
+    New lines are fed to a QchemOutput as they are written, and the SCF
+    error of every cycle is checked for lack of progress. An SCF counts as
+    stuck if the smallest error of the last window cycles is not below
+    ratio times the smallest error before them; it is reported as
+    oscillating if at least the fraction oscillation of those cycles
+    increased the error, and as stalled otherwise.
+    """
+
+    def __init__(self, fname: str, window: int = 30, ratio: float = 0.5,
+                 oscillation: float = 0.4, interval: float = 1.0,
+                 loggerLevel: str = "INFO") -> None:
+        """Set up monitoring of an output file, which may not exist yet."""
+        self.initLogging(loggerLevel)
+
+        self.outputFile = fname
+        self.window = max(2, window)
+        self.ratio = ratio
+        self.oscillation = oscillation
+
+        # Polling interval in seconds for blocking waits
+        self.interval = interval
+
+        self.output = QchemOutput(loggerLevel=self.logLevel[0])
+        self.output.outputFile = fname
+        self._file = None
+        self._partial = ""
+        self._checked = 0
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemMonitor")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def update(self) -> dict:
+        """Read newly written lines, return a failure record or None."""
+        if self._file is None:
+            if not os.path.isfile(self.outputFile):
+                return None
+            self._file = open(self.outputFile, "r", errors="replace")
+        if os.fstat(self._file.fileno()).st_size < self._file.tell():
+            self.log.debug(f"Output <{self.outputFile}> was truncated.")
+            self._file.seek(0)
+            self._partial = ""
+            self._checked = 0
+            self.output.reset()
+        line = self._file.readline()
+        while line:
+            if not line.endswith("\n"):
+                self._partial += line
+                break
+            self.output.feed(self._partial + line)
+            self._partial = ""
+            line = self._file.readline()
+        return self.check()
+
+    def check(self) -> dict:
+        """Return a failure record if the SCF stopped making progress."""
+        _errors = self.output.data["SCFerrors"]
+        if len(_errors) <= self.window or len(_errors) == self._checked:
+            return None
+        self._checked = len(_errors)
+        _recent = _errors[-self.window:]
+        _best = min(_errors[:-self.window])
+        if min(_recent) < self.ratio * _best:
+            return None
+        _rises = sum(1 for a, b in zip(_recent, _recent[1:]) if b > a)
+        _reason = "oscillating" \
+            if _rises >= self.oscillation * (self.window - 1) else "stalled"
+        return {"reason": _reason,
+                "cycle": self.output.data["SCFcycles"],
+                "error": _recent[-1],
+                "best": min(_best, min(_recent)),
+                "window": self.window}
+
+    def close(self) -> None:
+        """Stop following the output file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,223 @@
+"""
+RSHtune  - Optimize.
+
+Locate the optimal range separation parameter with a 1-D minimizer.
+Dependencies: logging
+"""
+import logging
+from .input import QchemInput
+from .tuning import QchemTuning
+
+GOLDEN = 0.3819660112501051
+
+
+class QchemOptimizer():
+    """Object for minimizing the optimal tuning error over omega.
+
+    All omega values are handled as integers in units of 1/1000, the
+    resolution of the Qchem omega keyword, and every point is evaluated
+    at most once. The minimum is located by lineSearch.
+    """
+
+    def __init__(self, fname: str, nthreads: int = 0,
+                 neutralSpMlt: int = 0,
+                 anionSpMlt: int = 0,
+                 cationSpMlt: int = 0,
+                 tolerance: float = 0.001,
+                 step: float = 0.05,
+                 maxEvaluations: int = 30,
+                 concurrent: bool = False,
+                 warmStart: bool = False,
+                 cache=None,
+                 journal=None,
+                 inline: bool = False,
+                 monitor: dict = None,
+                 retries: list[dict] = [],
+                 backend=None,
+                 metrics=None,
+                 scratch=None,
+                 objective: str = "OT",
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the optimization."""
+        self.initLogging(loggerLevel)
+
+        self.inputFile = fname
+        self.template = QchemInput(fname, loggerLevel=self.logLevel[0])
+        self.inline = inline
+        self.numThreads = nthreads
+        self.multiplicities = (neutralSpMlt, anionSpMlt, cationSpMlt)
+        self.concurrent = concurrent
+        self.cache = cache
+        self.journal = journal
+        self.monitor = monitor
+        self.retries = retries
+        self.backend = backend
+        self.metrics = metrics
+        self.scratch = scratch
+        self.objective = objective
+
+        # Converged jobs to read SCF guesses from: state -> {omega: job name}
+        self.warmStart = warmStart
+        self.finished = {}
+
+        # Search parameters in units of omega/1000
+        self.tolerance = max(1, round(tolerance * 1000))
+        self.step = max(1, round(step * 1000))
+        self.maxEvaluations = maxEvaluations
+
+        # Evaluated points: omega/1000 -> J_OT
+        self.points = {}
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemOptimizer")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def evaluate(self, omega: int) -> float:
+        """Return J_OT at omega/1000, running the calculations if needed."""
+        omega = max(1, omega)
+        if omega in self.points:
+            return self.points[omega]
+        if len(self.points) >= self.maxEvaluations:
+            raise RuntimeError(f"Reached {self.maxEvaluations} evaluations " +
+                               "without converging.")
+        tuning_run = QchemTuning(fname=self.inputFile,
+                                 omega=omega/1000,
+                                 nthreads=self.numThreads,
+                                 neutralSpMlt=self.multiplicities[0],
+                                 anionSpMlt=self.multiplicities[1],
+                                 cationSpMlt=self.multiplicities[2],
+                                 cache=self.cache,
+                                 journal=self.journal,
+                                 template=self.template,
+                                 inline=self.inline,
+                                 monitor=self.monitor,
+                                 retries=self.retries,
+                                 backend=self.backend,
+                                 metrics=self.metrics,
+                                 scratch=self.scratch,
+                                 objective=self.objective,
+                                 loggerLevel=self.logLevel[0])
+        if self.warmStart:
+            tuning_run.setGuesses(self.finished)
+        tuning_run.runCalculations(concurrent=self.concurrent)
+        if self.warmStart:
+            tuning_run.recordGuesses(self.finished)
+        try:
+            tuning_run.parseOutput()
+            tuning_run.calculateOptimalTuning()
+            self.points[omega] = tuning_run.data["tuning"]["JOT"]
+        except ValueError:
+            self.log.error(f"Tuning calculation at omega={omega/1000:.3f} " +
+                           "failed.")
+            self.points[omega] = float("inf")
+        self.log.info(f"J_OT({omega/1000:.3f}) = {self.points[omega]:.4E}")
+        return self.points[omega]
+
+    def minimize(self, omega: float) -> float:
+        """Return the omega minimizing J_OT, starting from a guess."""
+        lineSearch(self.evaluate, round(omega * 1000), self.step,
+                   self.tolerance, log=self.log)
+        self.omega = min(self.points, key=self.points.get)
+        self.log.info(f"Optimal omega {self.omega/1000:.3f} found after " +
+                      f"{len(self.points)} tuning calculations.")
+        return self.omega / 1000
+
+
+def bracketMinimum(f, x: int, step: int, lower: int = 1,
+                   upper: int = None) -> tuple[int, int, int]:
+    """Find a < b < c with f(b) below both f(a) and f(c).
+
+    The bracket is found by walking downhill from x with growing steps,
+    within [lower, upper] (None for no bound); at a bound a, b or c may
+    coincide.
+    """
+    def clip(v: int) -> int:
+        v = v if lower is None else max(lower, v)
+        return v if upper is None else min(upper, v)
+
+    a, b = x, clip(x + step)
+    if b == a:
+        b = clip(x - step)
+    if f(b) > f(a):
+        a, b = b, a
+    c = clip(b + round(1.618 * (b - a)))
+    while c != b and f(c) < f(b):
+        a, b = b, c
+        c = clip(b + round(1.618 * (b - a)))
+    return min(a, c), b, max(a, c)
+
+
+def lineSearch(f, x: int, step: int, tolerance: int, lower: int = 1,
+               upper: int = None, log=None) -> int:
+    """Return the integer minimizing f, starting from a guess x.
+
+    The minimum is bracketed by walking downhill from the guess, then
+    refined by parabolic steps through the bracket, falling back to
+    golden-section steps whenever a parabolic step is unusable or
+    fails to shrink the bracket enough. Every value is computed once;
+    log, if given, reports the bracket in units of 1/1000.
+    """
+    _values = {}
+
+    def value(v: int) -> float:
+        if v not in _values:
+            _values[v] = f(v)
+        return _values[v]
+
+    a, b, c = bracketMinimum(value, x, step, lower, upper)
+    if log is not None:
+        if b in (a, c):
+            log.warning(f"Minimum at the bound {b/1000:.3f}.")
+        log.info(f"Bracketed minimum in [{a/1000:.3f}, {c/1000:.3f}].")
+    _golden = True
+    while c - a > 2 * tolerance and b > a and c > b:
+        _width = c - a
+        v = None if _golden else parabolicStep(a, b, c, _values)
+        if v is None:
+            if c - b > b - a:
+                v = b + max(1, round(GOLDEN * (c - b)))
+            else:
+                v = b - max(1, round(GOLDEN * (b - a)))
+        if v in (a, b, c):
+            break
+        if value(v) < value(b):
+            if v < b:
+                c = b
+            else:
+                a = b
+            b = v
+        elif v < b:
+            a = v
+        else:
+            c = v
+        _golden = not _golden and (c - a) > (1 - GOLDEN) * _width
+    return min(_values, key=_values.get)
+
+
+def parabolicStep(a: int, b: int, c: int, values: dict) -> int:
+    """Return the integer vertex of the parabola through a, b and c.
+
+    None is returned if the vertex is outside (a, c) or already in values.
+    """
+    fa, fb, fc = values[a], values[b], values[c]
+    _num = (b - a)**2 * (fb - fc) - (b - c)**2 * (fb - fa)
+    _den = (b - a) * (fb - fc) - (b - c) * (fb - fa)
+    if _den == 0 or float("inf") in (fa, fb, fc):
+        return None
+    x = round(b - 0.5 * _num / _den)
+    if x <= a or x >= c or x == b or x in values:
+        return None
+    return x
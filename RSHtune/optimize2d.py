@@ -0,0 +1,202 @@
+"""
+RSHtune  - Optimize 2D.
+
+Tune the short-range HF fraction alpha together with omega.
+Dependencies: logging
+"""
+import logging
+from .input import QchemInput
+from .tuning import QchemTuning
+from .scheduler import QchemScheduler
+from .optimize import lineSearch
+
+
+class QchemOptimizer2D():
+    """Object for minimizing the optimal tuning error over alpha and omega.
+
+    Both parameters are handled as integers in units of 1/1000, and every
+    (alpha, omega) point is evaluated at most once, the three states of a
+    point sharing one core budget. The search is Powell's method: every
+    cycle minimizes J_OT along omega and alpha in turn with the line
+    search of QchemOptimizer, then along the overall shift of the cycle,
+    which replaces the older direction. This follows the valley that runs
+    diagonally between the axes, until a cycle moves the point by no more
+    than the tolerances.
+
+    Files are named after both parameters, e.g. a200w270_neutral.in, so
+    that with a journal or cache an interrupted search resumes without
+    rerunning finished points.
+    """
+
+    def __init__(self, fname: str, ncores: int = 1,
+                 minThreads: int = 1,
+                 neutralSpMlt: int = 0,
+                 anionSpMlt: int = 0,
+                 cationSpMlt: int = 0,
+                 tolerance: tuple[float, float] = (0.01, 0.001),
+                 step: tuple[float, float] = (0.05, 0.05),
+                 maxEvaluations: int = 100,
+                 warmStart: bool = False,
+                 cache=None,
+                 journal=None,
+                 inline: bool = False,
+                 monitor: dict = None,
+                 retries: list[dict] = [],
+                 backend=None,
+                 metrics=None,
+                 scratch=None,
+                 objective: str = "OT",
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the optimization.
+
+        tolerance and step are given as (alpha, omega).
+        """
+        self.initLogging(loggerLevel)
+
+        self.inputFile = fname
+        self.template = QchemInput(fname, loggerLevel=self.logLevel[0])
+        self.inline = inline
+        self.numCores = ncores
+        self.minThreads = minThreads
+        self.multiplicities = (neutralSpMlt, anionSpMlt, cationSpMlt)
+        self.warmStart = warmStart
+        self.cache = cache
+        self.journal = journal
+        self.monitor = monitor
+        self.retries = retries
+        self.backend = backend
+        self.metrics = metrics
+        self.scratch = scratch
+        self.objective = objective
+
+        # Search parameters in units of 1/1000
+        self.tolerance = tuple(max(1, round(t * 1000)) for t in tolerance)
+        self.step = tuple(max(1, round(s * 1000)) for s in step)
+        self.maxEvaluations = maxEvaluations
+
+        # Evaluated points: (alpha/1000, omega/1000) -> J_OT
+        self.points = {}
+
+        # One scheduler for the whole search keeps the warm-start guesses
+        self.scheduler = QchemScheduler(ncores=self.numCores,
+                                        minThreads=self.minThreads,
+                                        warmStart=self.warmStart,
+                                        journal=self.journal,
+                                        monitor=self.monitor,
+                                        retries=self.retries,
+                                        backend=self.backend,
+                                        scratch=self.scratch,
+                                        loggerLevel=self.logLevel[0])
+        self.tuningRuns = {}
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemOptimizer2D")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def evaluate(self, points: list[tuple[int, int]]) -> list[float]:
+        """Return J_OT at every point, running new points concurrently."""
+        _new = [p for p in dict.fromkeys(points) if p not in self.points]
+        if len(self.points) + len(_new) > self.maxEvaluations:
+            raise RuntimeError(f"Reached {self.maxEvaluations} evaluations " +
+                               "without converging.")
+        for _a, _o in _new:
+            tuning_run = QchemTuning(fname=self.inputFile,
+                                     omega=_o/1000,
+                                     alpha=_a/1000,
+                                     nthreads=self.minThreads,
+                                     neutralSpMlt=self.multiplicities[0],
+                                     anionSpMlt=self.multiplicities[1],
+                                     cationSpMlt=self.multiplicities[2],
+                                     cache=self.cache,
+                                     journal=self.journal,
+                                     template=self.template,
+                                     inline=self.inline,
+                                     metrics=self.metrics,
+                                     scratch=self.scratch,
+                                     objective=self.objective,
+                                     scheduler=self.scheduler,
+                                     loggerLevel=self.logLevel[0])
+            self.tuningRuns[(tuning_run.alpha, tuning_run.omega)] = \
+                tuning_run
+            if tuning_run.scheduleCalculations(self.scheduler,
+                                               series=tuning_run.alpha) == 0:
+                self.report((tuning_run.alpha, tuning_run.omega), {})
+        self.scheduler.run(callback=self.report)
+        return [self.points[p] for p in points]
+
+    def report(self, group: tuple, calcs: dict) -> None:
+        """Store J_OT of a finished tuning run."""
+        tuning_run = self.tuningRuns.pop(group)
+        _point = (round(tuning_run.alpha * 1000),
+                  round(tuning_run.omega * 1000))
+        tuning_run.collectTimings(calcs)
+        try:
+            tuning_run.parseOutput()
+            tuning_run.calculateOptimalTuning()
+            self.points[_point] = tuning_run.data["tuning"]["JOT"]
+        except ValueError:
+            self.log.error("Tuning calculation at " +
+                           f"alpha={_point[0]/1000:.3f}, " +
+                           f"omega={_point[1]/1000:.3f} failed.")
+            self.points[_point] = float("inf")
+        self.log.info(f"J_OT({_point[0]/1000:.3f}, {_point[1]/1000:.3f}) = " +
+                      f"{self.points[_point]:.4E}")
+
+    def search(self, point: tuple[int, int], direction: tuple[float, float],
+               step: float) -> tuple[tuple[int, int], int]:
+        """Minimize J_OT along a direction, return the best point.
+
+        direction and step are in units of the tolerances; the distance
+        moved is returned in the same units.
+        """
+        def at(t: int) -> tuple[int, int]:
+            return (min(1000, max(0, point[0] + round(
+                        t * direction[0] * self.tolerance[0]))),
+                    max(1, point[1] + round(
+                        t * direction[1] * self.tolerance[1])))
+
+        _t = lineSearch(lambda t: self.evaluate([at(t)])[0], 0,
+                        max(1, round(step)), 1, lower=None)
+        return at(_t), abs(_t)
+
+    def minimize(self, alpha: float, omega: float) -> tuple[float, float]:
+        """Return alpha and omega minimizing J_OT, starting from a guess."""
+        _best = (round(alpha * 1000), round(omega * 1000))
+        self.evaluate([_best])
+        _directions = [(0.0, 1.0), (1.0, 0.0)]
+        _steps = [self.step[1] / self.tolerance[1],
+                  self.step[0] / self.tolerance[0]]
+        while True:
+            _start = _best
+            for j, _direction in enumerate(_directions):
+                _best, _moved = self.search(_best, _direction, _steps[j])
+                _steps[j] = max(2, _moved)
+            _shift = tuple((b - s) / t for b, s, t
+                           in zip(_best, _start, self.tolerance))
+            _length = max(abs(x) for x in _shift)
+            if _length <= 1:
+                break
+            _direction = tuple(x / _length for x in _shift)
+            _best, _moved = self.search(_best, _direction, _length)
+            _directions = [_directions[1], _direction]
+            _steps = [_steps[1], max(2, _moved)]
+            self.log.info(f"Searching along ({_direction[0]:.3f}, " +
+                          f"{_direction[1]:.3f}) next.")
+        self.alpha, self.omega = min(self.points, key=self.points.get)
+        self.log.info(f"Optimal alpha {self.alpha/1000:.3f} and omega " +
+                      f"{self.omega/1000:.3f} found after " +
+                      f"{len(self.points)} tuning calculations.")
+        return self.alpha / 1000, self.omega / 1000
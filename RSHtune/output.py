@@ -0,0 +1,184 @@
+"""
+RSHtune  - Output.
+
+Single-pass reading of results from Qchem output files.
+Dependencies: os, gzip, logging, zstandard (optional)
+"""
+import os
+import gzip
+import logging
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Extensions of output files, plain and compressed
+EXTENSIONS = (".out", ".out.gz", ".out.zst")
+
+
+class QchemOutput():
+    """Object for reading results from a (possibly unfinished) Qchem output.
+
+    Lines are processed one at a time, so the file is never held in memory
+    and the same object can be fed incrementally while Qchem is running.
+    Outputs compressed with gzip (.gz) or zstd (.zst) are read transparently.
+    """
+
+    def __init__(self, fname: str = "", loggerLevel: str = "INFO") -> None:
+        """Initialize output and read fname, if given."""
+        self.initLogging(loggerLevel)
+
+        self.reset()
+        self.outputFile = fname
+        if fname != "":
+            self.read(fname)
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemOutput")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        self.data = {"SCFenergy": None, "HOMO": None, "LUMO": None,
+                     "alpha": {"HOMO": None, "LUMO": None},
+                     "beta": {"HOMO": None, "LUMO": None},
+                     "SCFcycles": 0, "SCFerrors": [],
+                     "SCFtime": {"wall": None, "cpu": None},
+                     "jobTime": {"wall": None, "cpu": None},
+                     "converged": False, "failed": False, "finished": False}
+        self._spin = "alpha"
+        self._previous = ""
+        self._virtual = False
+        self._cycles = False
+
+    def read(self, fname: str) -> dict:
+        """Read an output file line by line and return the parsed data."""
+        with openOutput(fname) as fout:
+            for line in fout:
+                self.feed(line)
+        self.log.info(f"Read <{fname}>: {self.data['SCFcycles']} SCF " +
+                      f"cycles, converged: {self.data['converged']}.")
+        return self.data
+
+    def results(self) -> dict:
+        """Return SCF energy, HOMO, LUMO and SCF cycles of a finished run."""
+        if not self.data["converged"]:
+            raise ValueError("No converged SCF energy in " +
+                             f"<{self.outputFile}>.")
+        if self.data["HOMO"] is None or self.data["LUMO"] is None:
+            raise ValueError(f"No orbital energies in <{self.outputFile}>.")
+        return {"SCFenergy": self.data["SCFenergy"],
+                "HOMO": self.data["HOMO"],
+                "LUMO": self.data["LUMO"],
+                "SCFcycles": self.data["SCFcycles"]}
+
+    def feed(self, line: str) -> None:
+        """Process a single line of Qchem output."""
+        if self._virtual:
+            self._virtual = False
+            self.setOrbital("LUMO", line.split()[:1])
+        elif self._cycles:
+            self.scfCycle(line)
+
+        if "--" in line:
+            if "-- Virtual --" in line:
+                self._virtual = True
+                self.setOrbital("HOMO", self._previous.split()[-1:])
+            elif self._cycles and line.lstrip().startswith("---") \
+                    and self.data["SCFcycles"] > 0:
+                self._cycles = False
+        elif " MOs" in line:
+            if "Alpha MOs" in line:
+                self._spin = "alpha"
+            elif "Beta MOs" in line:
+                self._spin = "beta"
+        elif "Cycle" in line and "Energy" in line:
+            self._cycles = True
+            self.data["SCFcycles"] = 0
+            self.data["SCFerrors"] = []
+        elif "Convergence criterion met" in line:
+            self.data["SCFenergy"] = float(line.split()[1])
+            self.data["converged"] = True
+        elif "SCF failed to converge" in line:
+            self.data["failed"] = True
+        elif "Thank you very much for using Q-Chem" in line:
+            self.data["finished"] = True
+        elif "time:" in line:
+            if line.lstrip().startswith("SCF time:"):
+                self.setTime("SCFtime", line)
+            elif "Total job time:" in line:
+                self.setTime("jobTime", line)
+        self._previous = line
+
+    def scfCycle(self, line: str) -> None:
+        """Record cycle number and error of an SCF iteration line."""
+        _items = line.split()
+        if len(_items) < 3 or not _items[0].isdigit():
+            return
+        try:
+            self.data["SCFerrors"].append(float(_items[2]))
+            self.data["SCFcycles"] = int(_items[0])
+        except ValueError:
+            pass
+
+    def setTime(self, key: str, line: str) -> None:
+        """Store Qchem's wall and CPU seconds from a timing line.
+
+        Both "CPU 3.21s  wall 1.10s" and "1.10s(wall), 3.21s(cpu)" styles
+        are understood.
+        """
+        _items = line.replace(",", " ").split()
+        for j, item in enumerate(_items):
+            _item = item.lower()
+            try:
+                if _item in ("cpu", "wall") and j + 1 < len(_items):
+                    self.data[key][_item] = float(_items[j+1].rstrip("s"))
+                elif _item.endswith(("s(wall)", "s(cpu)")):
+                    _value, _kind = _item[:-1].split("s(")
+                    self.data[key][_kind] = float(_value)
+            except ValueError:
+                pass
+
+    def setOrbital(self, orbital: str, items: list[str]) -> None:
+        """Store a frontier orbital energy for the current spin."""
+        try:
+            self.data[self._spin][orbital] = float(items[0])
+        except (ValueError, IndexError):
+            return
+        _values = [self.data[s][orbital] for s in ("alpha", "beta")
+                   if self.data[s][orbital] is not None]
+        self.data[orbital] = max(_values) if orbital == "HOMO" \
+            else min(_values)
+
+
+def openOutput(fname: str):
+    """Open a plain, gzip or zstd compressed output file as text."""
+    if fname.endswith(".gz"):
+        return gzip.open(fname, "rt", errors="replace")
+    if fname.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError(f"Reading <{fname}> requires the zstandard " +
+                             "package.")
+        return zstandard.open(fname, "rt", errors="replace")
+    return open(fname, "r", errors="replace")
+
+
+def findOutput(jname: str) -> str:
+    """Return the plain or compressed output file of a job, "" if none."""
+    for _ext in EXTENSIONS:
+        if os.path.isfile(f"{jname}{_ext}"):
+            return f"{jname}{_ext}"
+    return ""
@@ -0,0 +1,286 @@
+"""
+RSHtune  - Predict.
+
+Starting omega for new molecules from the omega* of tuned ones.
+Dependencies: os, json, math, time, logging
+"""
+import os
+import json
+import math
+import time
+import logging
+from .input import QchemInput
+
+NUMBERS = {"H": 1, "He": 2, "Li": 3, "Be": 4, "B": 5, "C": 6, "N": 7, "O": 8,
+           "F": 9, "Ne": 10, "Na": 11, "Mg": 12, "Al": 13, "Si": 14, "P": 15,
+           "S": 16, "Cl": 17, "Ar": 18, "K": 19, "Ca": 20, "Ga": 31,
+           "Ge": 32, "As": 33, "Se": 34, "Br": 35, "Kr": 36, "Sn": 50,
+           "Sb": 51, "Te": 52, "I": 53, "Xe": 54}
+
+# Covalent radii (Angstrom) and usual valences, for finding bonds and
+# unsaturated atoms
+RADII = {"H": 0.31, "B": 0.84, "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57,
+         "Si": 1.11, "P": 1.07, "S": 1.05, "Cl": 1.02, "Se": 1.20,
+         "Br": 1.20, "I": 1.39}
+VALENCES = {"H": 1, "B": 3, "C": 4, "N": 3, "O": 2, "F": 1, "Si": 4,
+            "P": 3, "S": 2, "Cl": 1, "Se": 2, "Br": 1, "I": 1}
+
+
+class QchemPredictor():
+    """Object for predicting omega* of a molecule from tuned molecules.
+
+    The omega* of every tuned molecule is stored in a JSON file together
+    with cheap descriptors of its geometry: electron count, number of
+    (heavy) atoms, largest interatomic distance and the size of the
+    largest conjugated cluster of unsaturated heavy atoms. log(omega*) is
+    fitted linearly to the logarithms of electron count, conjugated cluster
+    and size, using only molecules tuned with the same basis if there are
+    enough. With fewer than MINFIT molecules the prediction is a distance-
+    weighted average of the nearest ones instead. The bracket spans the
+    scatter of the stored values around the prediction.
+    """
+
+    MINFIT = 6
+
+    def __init__(self, fname: str = "", loggerLevel: str = "INFO") -> None:
+        """Open the history fname, by default $RSHTUNE_HISTORY."""
+        self.initLogging(loggerLevel)
+
+        self.historyFile = fname if fname != "" else os.environ.get(
+            "RSHTUNE_HISTORY",
+            os.path.join(os.path.expanduser("~"), ".RSHtune_history.json"))
+        self.molecules = {}
+        if os.path.isfile(self.historyFile):
+            with open(self.historyFile, "r") as f:
+                self.molecules = json.load(f)["molecules"]
+        self.log.info(f"Read omega* of {len(self.molecules)} molecules " +
+                      f"from <{self.historyFile}>.")
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemPredictor")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def descriptors(self, fname: str) -> dict:
+        """Return the descriptors of the molecule of a neutral input."""
+        _input = QchemInput(fname, loggerLevel="WARNING")
+        _lines = _input.input["molecule"]
+        if _lines[0][0].lower() == "read":
+            with open(os.path.join(os.path.dirname(fname), _lines[0][1]),
+                      "r") as f:
+                _lines = [ln.split() for ln in f
+                          if ln.strip() != "" and ln.strip()[0] != "$"]
+        _descriptors = moleculeDescriptors(_lines)
+        _descriptors["basis"] = str(_input.getRem("basis", "")).lower()
+        return _descriptors
+
+    def record(self, fname: str, omega: float) -> None:
+        """Store omega* of the molecule of a neutral input."""
+        _descriptors = self.descriptors(fname)
+        _key = f"{os.path.abspath(fname)}|{_descriptors['basis']}"
+        self.molecules[_key] = {**_descriptors, "omega": omega,
+                                "updated": time.time()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.historyFile)),
+                    exist_ok=True)
+        _tmp = f"{self.historyFile}.tmp"
+        with open(_tmp, "w") as f:
+            json.dump({"molecules": self.molecules}, f, indent=1)
+        os.replace(_tmp, self.historyFile)
+        self.log.info(f"Recorded omega*={omega:.3f} for <{fname}>.")
+
+    def recordScan(self, fname: str, table: dict) -> float:
+        """Store the omega with the lowest J_OT of a scan, return it.
+
+        table maps omega to J_OT (None if failed). Nothing is stored, and
+        None returned, if the lowest J_OT lies at either end of the scan.
+        """
+        _valid = {o: j for o, j in table.items() if j is not None}
+        if len(_valid) < 3:
+            return None
+        _omega = min(_valid, key=_valid.get)
+        if _omega in (min(_valid), max(_valid)):
+            self.log.warning(f"J_OT of <{fname}> is lowest at the end of " +
+                             "the scan, not recording omega*.")
+            return None
+        self.record(fname, _omega)
+        return _omega
+
+    def predict(self, fname: str) -> tuple[float, tuple[float, float]]:
+        """Return a starting omega and a bracket for a neutral input.
+
+        Returns None if no molecules have been tuned yet.
+        """
+        _new = self.descriptors(fname)
+        _key = f"{os.path.abspath(fname)}|{_new['basis']}"
+        _known = [m for k, m in self.molecules.items() if k != _key]
+        _same = [m for m in _known if m["basis"] == _new["basis"]]
+        if len(_same) >= min(self.MINFIT, len(_known)):
+            _known = _same
+        if not _known:
+            return None
+        _x = features(_new)
+        _y = [math.log(m["omega"]) for m in _known]
+        _X = [features(m) for m in _known]
+        if len(_known) >= self.MINFIT:
+            _beta = ridge(_X, _y)
+            _predict = sum(b * x for b, x in zip(_beta, _x))
+            _residuals = [y - sum(b * x for b, x in zip(_beta, xs))
+                          for xs, y in zip(_X, _y)]
+            _sigma = math.sqrt(sum(r**2 for r in _residuals) /
+                               (len(_y) - len(_beta)) if len(_y) >
+                               len(_beta) else 0.0)
+        else:
+            _weights = [1 / (1e-3 + sum((a - b)**2 for a, b in
+                                        zip(_x[1:], xs[1:])))
+                        for xs in _X]
+            _predict = sum(w * y for w, y in zip(_weights, _y)) / \
+                sum(_weights)
+            _sigma = math.sqrt(sum(w * (y - _predict)**2
+                                   for w, y in zip(_weights, _y)) /
+                               sum(_weights))
+        _omega = math.exp(_predict)
+        _width = max(0.01, _omega * (math.exp(max(_sigma, 0.05)) - 1))
+        _bracket = (max(0.001, round(_omega - _width, 3)),
+                    round(_omega + _width, 3))
+        self.log.info(f"Predicted omega*={_omega:.3f} in " +
+                      f"[{_bracket[0]:.3f}, {_bracket[1]:.3f}] from " +
+                      f"{len(_known)} molecules.")
+        return round(_omega, 3), _bracket
+
+
+def moleculeDescriptors(lines: list[list[str]]) -> dict:
+    """Return descriptors from the lines of a $molecule section.
+
+    lines hold charge and multiplicity followed by atoms in Cartesian or
+    Z-matrix format, Z-matrix variables being defined by "name value"
+    lines; size and conjugation are 0 if the geometry cannot be read.
+    """
+    _charge = int(lines[0][0])
+    _atoms = [ln for ln in lines[1:] if len(ln) != 2]
+    _variables = {ln[0]: ln[1] for ln in lines[1:] if len(ln) == 2}
+    _symbols = [ln[0].rstrip("0123456789").capitalize() for ln in _atoms]
+    _descriptors = {"electrons": sum(NUMBERS.get(s, 6) for s in _symbols) -
+                    _charge,
+                    "atoms": len(_symbols),
+                    "heavyAtoms": sum(s != "H" for s in _symbols),
+                    "size": 0.0, "conjugation": 0}
+    try:
+        _xyz = cartesian([[_variables.get(v.lstrip("-"), v)
+                           if not v.startswith("-") else
+                           "-" + _variables.get(v[1:], v[1:]) for v in ln]
+                          for ln in _atoms])
+    except (ValueError, IndexError, ZeroDivisionError):
+        return _descriptors
+    _bonds = {j: set() for j in range(len(_xyz))}
+    for j in range(len(_xyz)):
+        for k in range(j):
+            _distance = math.dist(_xyz[j], _xyz[k])
+            _descriptors["size"] = max(_descriptors["size"], _distance)
+            if _distance < 1.2 * (RADII.get(_symbols[j], 0.8) +
+                                  RADII.get(_symbols[k], 0.8)):
+                _bonds[j].add(k)
+                _bonds[k].add(j)
+    _unsaturated = {j for j, s in enumerate(_symbols) if s != "H"
+                    and len(_bonds[j]) < VALENCES.get(s, 0)}
+    while _unsaturated:
+        _cluster, _front = set(), [_unsaturated.pop()]
+        while _front:
+            j = _front.pop()
+            _cluster.add(j)
+            _front += [k for k in _bonds[j] if k in _unsaturated]
+            _unsaturated -= _bonds[j]
+        if len(_cluster) > 1:
+            _descriptors["conjugation"] = max(_descriptors["conjugation"],
+                                              len(_cluster))
+    return _descriptors
+
+
+def cartesian(atoms: list[list[str]]) -> list[tuple[float, float, float]]:
+    """Return Cartesian coordinates of atoms in Cartesian or Z-matrix form.
+
+    Z-matrix lines have to refer to earlier atoms by number.
+    """
+    if len(atoms[0]) >= 4:
+        return [tuple(float(v) for v in ln[1:4]) for ln in atoms]
+    _xyz = []
+    for j, ln in enumerate(atoms):
+        if j == 0:
+            _xyz.append((0.0, 0.0, 0.0))
+        elif j == 1:
+            _xyz.append((0.0, 0.0, float(ln[2])))
+        else:
+            _a, _b = int(ln[1]) - 1, int(ln[3]) - 1
+            _ref, _phi = ((1.0, 0.0, 0.0), 0.0) if j == 2 else \
+                (_xyz[int(ln[5]) - 1], math.radians(float(ln[6])))
+            _xyz.append(place(_xyz[_a], _xyz[_b], _ref, float(ln[2]),
+                              math.radians(float(ln[4])), _phi))
+    return _xyz
+
+
+def place(a: tuple, b: tuple, c: tuple, r: float, theta: float,
+          phi: float) -> tuple[float, float, float]:
+    """Return the position at distance r from a, angle theta with b and
+    dihedral phi with c."""
+    _bc = [x - y for x, y in zip(b, c)]
+    _ab = [x - y for x, y in zip(a, b)]
+    _n = cross(_bc, _ab)
+    if math.hypot(*_n) < 1e-8:
+        _n = cross([1.0, 0.0, 0.0] if abs(_ab[0]) < 0.9 else [0.0, 1.0, 0.0],
+                   _ab)
+    _ab, _n = unit(_ab), unit(_n)
+    _m = cross(_n, _ab)
+    _d = (-r * math.cos(theta), r * math.sin(theta) * math.cos(phi),
+          r * math.sin(theta) * math.sin(phi))
+    return tuple(a[k] + _d[0] * _ab[k] + _d[1] * _m[k] + _d[2] * _n[k]
+                 for k in range(3))
+
+
+def cross(u: list, v: list) -> list[float]:
+    """Return the cross product of two vectors."""
+    return [u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2],
+            u[0] * v[1] - u[1] * v[0]]
+
+
+def unit(u: list) -> list[float]:
+    """Return a vector scaled to unit length."""
+    _norm = math.hypot(*u)
+    return [x / _norm for x in u]
+
+
+def features(descriptors: dict) -> list[float]:
+    """Return the regression features of a molecule."""
+    return [1.0, math.log(descriptors["electrons"]),
+            math.log(1 + descriptors["conjugation"]),
+            math.log(1 + descriptors["size"])]
+
+
+def ridge(X: list[list[float]], y: list[float],
+          penalty: float = 1e-2) -> list[float]:
+    """Return least-squares coefficients, the non-constant ones damped."""
+    _n = len(X[0])
+    _A = [[sum(x[j] * x[k] for x in X) + (penalty if j == k and j > 0
+                                           else 0.0) for k in range(_n)] +
+          [sum(x[j] * t for x, t in zip(X, y))] for j in range(_n)]
+    for j in range(_n):
+        _pivot = max(range(j, _n), key=lambda k: abs(_A[k][j]))
+        _A[j], _A[_pivot] = _A[_pivot], _A[j]
+        for k in range(j + 1, _n):
+            _f = _A[k][j] / _A[j][j]
+            _A[k] = [a - _f * b for a, b in zip(_A[k], _A[j])]
+    _beta = [0.0] * _n
+    for j in range(_n - 1, -1, -1):
+        _beta[j] = (_A[j][_n] - sum(_A[j][k] * _beta[k]
+                                    for k in range(j + 1, _n))) / _A[j][j]
+    return _beta
@@ -0,0 +1,201 @@
+"""
+RSHtune  - Scheduler.
+
+Pack many Qchem calculations onto a fixed core budget.
+Dependencies: time, logging
+"""
+import time
+import logging
+from .calculation import QchemCalculation, nearestGuess
+
+
+class QchemScheduler():
+    """Object for running queued Qchem calculations on a core budget."""
+
+    def __init__(self, ncores: int, minThreads: int = 1, maxThreads: int = 0,
+                 interval: float = 1.0, warmStart: bool = False,
+                 journal=None, monitor: dict = None,
+                 retries: list[dict] = [], backend=None, scratch=None,
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the scheduler on a budget of ncores."""
+        self.initLogging(loggerLevel)
+
+        # Core Budget
+        self.numCores = ncores
+        self.minThreads = min(max(1, minThreads), ncores)
+        self.maxThreads = ncores if maxThreads == 0 else maxThreads
+        self.log.info(f"Scheduling on {self.numCores} cores with " +
+                      f"{self.minThreads}-{self.maxThreads} threads per job.")
+
+        # Polling interval in seconds
+        self.interval = interval
+
+        self.warmStart = warmStart
+        self.finished = {}
+        self.journal = journal
+        self.monitor = monitor
+        self.retries = retries
+        self.backend = backend
+        self.scratch = scratch
+
+        self.pending = []
+        self.running = []
+        self.groups = {}
+
+        # Jobs by input file, shared between groups until all have reported
+        self.jobs = {}
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemScheduler")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def shared(self, fname: str) -> bool:
+        """Return whether a job is queued, running or converged."""
+        _job = self.jobs.get(fname)
+        return _job is not None and (_job["calc"] is None or
+                                     _job in self.running or
+                                     _job["calc"].converged())
+
+    def add(self, group, name: str, fname: str, weight: float = 1,
+            series=None, omega: float = None) -> None:
+        """Queue a calculation as part of a group (e.g. one omega).
+
+        For warm starts, guesses are only read between jobs with the same
+        name and series (e.g. one molecule); omega defaults to the group.
+        A job whose input file is already queued, running or converged is
+        not added again but shared, counting as part of both groups, until
+        all groups of the job have reported.
+        """
+        if self.shared(fname):
+            _job = self.jobs[fname]
+            _job["groups"].append(group)
+            self.groups.setdefault(group, {})[name] = _job
+            self.log.info(f"Sharing <{fname}> with group {group}.")
+            return
+        _job = {"groups": [group], "name": name, "fname": fname,
+                "weight": weight, "calc": None,
+                "series": (series, name),
+                "omega": group if omega is None else omega}
+        self.pending.append(_job)
+        self.groups.setdefault(group, {})[name] = _job
+        self.jobs[fname] = _job
+
+    def freeCores(self) -> int:
+        """Return the number of cores not used by running calculations."""
+        return self.numCores - sum(j["calc"].numThreads for j in self.running)
+
+    def threadCount(self, job: dict) -> int:
+        """Choose the thread count for the next calculation to launch.
+
+        Cores are shared in proportion to weight between the running jobs
+        and as many pending jobs as could run alongside them, so the last
+        jobs of a scan pick up the cores left behind by earlier ones.
+        """
+        _slots = max(1, self.numCores // self.minThreads - len(self.running))
+        _active = self.running + self.pending[:_slots]
+        _share = self.numCores * job["weight"] / sum(j["weight"]
+                                                     for j in _active)
+        return max(self.minThreads,
+                   min(int(_share), self.maxThreads, self.freeCores()))
+
+    def scratchFull(self) -> bool:
+        """Return whether launching has to wait for scratch to be freed."""
+        return self.scratch is not None and len(self.running) > 0 and \
+            self.scratch.full()
+
+    def launch(self) -> None:
+        """Start pending calculations for as long as cores are free."""
+        while self.pending and self.freeCores() >= self.minThreads and \
+                not self.scratchFull():
+            _job = self.pending[0]
+            _threads = self.threadCount(_job)
+            self.pending.pop(0)
+            _guess = ""
+            if self.warmStart:
+                _guess = nearestGuess(self.finished.get(_job["series"], {}),
+                                      _job["omega"])
+            _job["calc"] = QchemCalculation(fname=_job["fname"],
+                                            nthreads=_threads,
+                                            guess=_guess,
+                                            monitor=self.monitor,
+                                            retries=self.retries,
+                                            backend=self.backend,
+                                            scratch=self.scratch,
+                                            loggerLevel=self.logLevel[0])
+            if self.journal is not None:
+                self.journal.mark(_job["calc"].jobPath, "running")
+            _job["calc"].start()
+            self.running.append(_job)
+            self.log.info(f"Started <{_job['fname']}> on {_threads} " +
+                          f"threads, {self.freeCores()} cores free.")
+
+    def run(self, callback=None) -> dict:
+        """Run all queued calculations, return calculations by group.
+
+        Groups are started in the order they were added, the heavier jobs of
+        a group first. callback(group, calcs) is invoked as soon as every
+        calculation of a group has finished.
+        """
+        self.sortPending()
+        _results = self.step(callback)
+        while self.running:
+            time.sleep(self.interval)
+            _results.update(self.step(callback))
+        return _results
+
+    def sortPending(self) -> None:
+        """Order pending jobs by group, the heavier jobs of a group first."""
+        _order = {g: j for j, g in enumerate(self.groups)}
+        self.pending.sort(key=lambda j: (_order[j["groups"][0]],
+                                         -j["weight"]))
+
+    def step(self, callback=None) -> dict:
+        """Collect finished calculations and launch pending ones.
+
+        Returns the calculations of the groups that finished completely,
+        for which callback(group, calcs) has been invoked.
+        """
+        _results = {}
+        for _job in [j for j in self.running
+                     if j["calc"].poll() is not None]:
+            _job["calc"].wait()
+            if _job["calc"].recover():
+                continue
+            self.running.remove(_job)
+            _converged = _job["calc"].converged()
+            if self.journal is not None:
+                self.journal.mark(_job["calc"].jobPath,
+                                  "done" if _converged else "failed",
+                                  failure=_job["calc"].failure,
+                                  attempts=len(_job["calc"].attempts))
+            if self.warmStart and _converged:
+                self.finished.setdefault(_job["series"], {})[
+                    _job["omega"]] = _job["calc"].scratchName
+        for _name, _group in list(self.groups.items()):
+            if not all(j["calc"] is not None and j not in self.running
+                       for j in _group.values()):
+                continue
+            _results[_name] = {n: j["calc"] for n, j in _group.items()}
+            for j in _group.values():
+                j["calc"].pruneScratch()
+                j["groups"].remove(_name)
+                if not j["groups"] and self.jobs.get(j["fname"]) is j:
+                    del self.jobs[j["fname"]]
+            del self.groups[_name]
+            if callback is not None:
+                callback(_name, _results[_name])
+        self.launch()
+        return _results
@@ -0,0 +1,191 @@
+"""
+RSHtune  - Scratch.
+
+Placement, pruning and quota of Qchem scratch directories.
+Dependencies: os, gzip, time, shutil, logging
+"""
+import os
+import gzip
+import time
+import shutil
+import logging
+
+# Scratch files read back by "scf_guess read": MO coefficients and density
+RESTART = ("53.0", "58.0")
+
+
+class QchemScratch():
+    """Object for managing the scratch directories of Qchem calculations.
+
+    Every job saves its scratch under root, which can be a fast local path
+    such as node-local disk or tmpfs, instead of $QCSCRATCH. Once the jobs
+    of a tuning run have finished, their scratch is pruned to the restart
+    files in keep, optionally gzip-compressed, which is all later jobs
+    need to read a guess; scratch of jobs that did not converge is removed.
+    With a quota (in GB), no further jobs are launched while the scratch
+    of the jobs run through this object exceeds it, after pruned scratch
+    has been evicted oldest first; other directories below root are not
+    counted.
+    """
+
+    def __init__(self, root: str = "", keep: tuple[str] = RESTART,
+                 compress: bool = False, quota: float = 0,
+                 interval: float = 10.0, loggerLevel: str = "INFO") -> None:
+        """Set up scratch management below root, by default $QCSCRATCH.
+
+        The scratch of running jobs is measured at most once per interval
+        seconds.
+        """
+        self.initLogging(loggerLevel)
+
+        self.root = os.path.abspath(root if root != "" else
+                                    os.environ.get("QCSCRATCH", "."))
+        os.makedirs(self.root, exist_ok=True)
+        self.keep = tuple(keep)
+        self.compress = compress
+        self.quota = quota * 1024**3
+
+        # Pruned scratch that may be evicted: name -> time it was pruned
+        self.retained = {}
+        # Size in bytes of pruned scratch: name -> size
+        self.sizes = {}
+        # Scratch of jobs that have not been pruned yet
+        self.active = set()
+        self.interval = interval
+        self._activeSize = 0
+        self._scanned = 0.0
+        self.log.info(f"Managing Qchem scratch in <{self.root}>" +
+                      (f" with a quota of {quota} GB." if quota else "."))
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemScratch")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def path(self, sname: str) -> str:
+        """Return the scratch directory saved under a name."""
+        return os.path.join(self.root, sname)
+
+    def track(self, sname: str) -> None:
+        """Count the scratch of a job that is being launched."""
+        self.active.add(sname)
+
+    def restore(self, guess: str, sname: str) -> None:
+        """Copy the scratch of job guess to sname, decompressing files."""
+        _dest = self.path(sname)
+        os.makedirs(_dest, exist_ok=True)
+        with os.scandir(self.path(guess)) as _entries:
+            for _entry in _entries:
+                if not _entry.is_file():
+                    continue
+                if _entry.name.endswith(".gz"):
+                    with gzip.open(_entry.path, "rb") as fin, \
+                            open(os.path.join(_dest, _entry.name[:-3]),
+                                 "wb") as fout:
+                        shutil.copyfileobj(fin, fout)
+                else:
+                    shutil.copyfile(_entry.path,
+                                    os.path.join(_dest, _entry.name))
+        if guess in self.retained:
+            self.retained[guess] = time.time()
+
+    def prune(self, sname: str, converged: bool = True) -> None:
+        """Reduce finished scratch to its restart files, remove the rest.
+
+        Scratch of a job that did not converge is removed entirely.
+        """
+        _dir = self.path(sname)
+        if not os.path.isdir(_dir):
+            return
+        if not converged:
+            self.remove(sname)
+            return
+        _freed = 0
+        with os.scandir(_dir) as _entries:
+            for _entry in list(_entries):
+                if _entry.name in self.keep and _entry.is_file():
+                    if self.compress:
+                        with open(_entry.path, "rb") as fin, \
+                                gzip.open(f"{_entry.path}.gz", "wb",
+                                          compresslevel=1) as fout:
+                            shutil.copyfileobj(fin, fout)
+                        _freed += _entry.stat().st_size - \
+                            os.path.getsize(f"{_entry.path}.gz")
+                        os.remove(_entry.path)
+                elif _entry.name[:-3] in self.keep and \
+                        _entry.name.endswith(".gz"):
+                    continue
+                elif _entry.is_dir(follow_symlinks=False):
+                    _freed += directorySize(_entry.path)
+                    shutil.rmtree(_entry.path)
+                else:
+                    _freed += _entry.stat(follow_symlinks=False).st_size
+                    os.remove(_entry.path)
+        self.active.discard(sname)
+        self.retained[sname] = time.time()
+        self.sizes[sname] = directorySize(_dir)
+        self._scanned = 0.0
+        self.log.info(f"Pruned scratch '{sname}', freeing " +
+                      f"{_freed / 1024**2:.1f} MB.")
+
+    def remove(self, sname: str) -> None:
+        """Remove the scratch saved under a name."""
+        shutil.rmtree(self.path(sname), ignore_errors=True)
+        self.retained.pop(sname, None)
+        self.sizes.pop(sname, None)
+        if sname in self.active:
+            self.active.discard(sname)
+            self._scanned = 0.0
+
+    def usage(self) -> int:
+        """Return the size in bytes of the scratch of this object's jobs."""
+        if time.time() - self._scanned >= self.interval:
+            self._scanned = time.time()
+            self._activeSize = sum(directorySize(self.path(s))
+                                   for s in self.active)
+        return self._activeSize + sum(self.sizes.values())
+
+    def full(self) -> bool:
+        """Return whether the quota is exceeded, evicting pruned scratch.
+
+        Scratch that was pruned longest ago (and not read as a guess since)
+        is removed until the usage drops below the quota.
+        """
+        if self.quota <= 0:
+            return False
+        _usage = self.usage()
+        for _sname in sorted(self.retained, key=self.retained.get):
+            if _usage < self.quota:
+                break
+            _usage -= self.sizes.get(_sname, 0)
+            self.remove(_sname)
+            self.log.info(f"Evicted scratch '{_sname}' to stay within the " +
+                          "quota.")
+        if _usage >= self.quota:
+            self.log.info(f"Scratch usage {_usage / 1024**3:.2f} GB " +
+                          "exceeds the quota.")
+        return _usage >= self.quota
+
+
+def directorySize(dir: str) -> int:
+    """Return the total size in bytes of the files below a directory."""
+    _size = 0
+    for _root, _dirs, _files in os.walk(dir):
+        for _fname in _files:
+            try:
+                _size += os.lstat(os.path.join(_root, _fname)).st_size
+            except FileNotFoundError:
+                pass
+    return _size
@@ -0,0 +1,417 @@
+"""
+RSHtune  - Service.
+
+Tuning service sharing one core budget between the requests of many users.
+Dependencies: os, json, time, queue, hashlib, logging, tempfile,
+              threading, http.server, urllib
+"""
+import os
+import json
+import time
+import queue
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .input import QchemInput
+from .tuning import QchemTuning, OBJECTIVES
+from .scheduler import QchemScheduler
+from .batch import omegaValues
+
+
+class QchemService():
+    """Object for running the tuning requests of many clients on one node.
+
+    Requests are exchanged as JSON over HTTP on a local port:
+        POST /tune              {"name": "water", "input": "<input text>",
+                                 "geometry": "<.mol text>",
+                                 "omega": [0.2, 0.25] or
+                                     {"start": 0.2, "stop": 0.3, "step": 0.01},
+                                 "multiplicities": [1, 2, 2],
+                                 "objective": "OT"}  -> {"id": 1}
+        GET  /tune/<id>         state and J of every finished omega
+        GET  /tune/<id>/stream  one JSON line per omega as it finishes
+        GET  /status            core budget, queued and running jobs
+    Every distinct input and geometry is tuned in its own directory below
+    root, named by their hash, and all calculations share one
+    QchemScheduler. An omega that is requested again while the same
+    calculations are queued or running, or after they finished, is not run
+    a second time; requests with other multiplicities or objectives only
+    run the charge states that differ.
+    """
+
+    def __init__(self, root: str = "", ncores: int = 1, port: int = 8765,
+                 host: str = "127.0.0.1", minThreads: int = 1,
+                 warmStart: bool = False, cache=None, journal=None,
+                 inline: bool = False, monitor: dict = None,
+                 retries: list[dict] = [], backend=None, metrics=None,
+                 scratch=None, interval: float = 1.0,
+                 loggerLevel: str = "INFO") -> None:
+        """Set up the service; it listens once serve is called."""
+        self.initLogging(loggerLevel)
+
+        self.root = root if root != "" else "."
+        self.minThreads = minThreads
+        self.cache = cache
+        self.journal = journal
+        self.inline = inline
+        self.metrics = metrics
+        self.scratch = scratch
+        self.interval = interval
+        self.scheduler = QchemScheduler(ncores=ncores, minThreads=minThreads,
+                                        interval=interval,
+                                        warmStart=warmStart,
+                                        journal=journal, monitor=monitor,
+                                        retries=retries, backend=backend,
+                                        scratch=scratch,
+                                        loggerLevel=self.logLevel[0])
+
+        # Requests by id, guarded by lock; new ones wait in incoming
+        self.lock = threading.Condition()
+        self.incoming = queue.Queue()
+        self.requests = {}
+
+        # Tuning runs and J by ((key, objective, *multiplicities), omega),
+        # key hashing the molecule
+        self.tuningRuns = {}
+        self.results = {}
+
+        self.server = ThreadingHTTPServer((host, port), ServiceHandler)
+        self.server.service = self
+        self.address = f"http://{host}:{self.server.server_address[1]}"
+
+    def initLogging(self, level: str) -> None:
+        """Initialize logging."""
+        _log_levels = {"CRITICAL": 50, "ERROR": 40, "WARNING": 30, "INFO": 20,
+                       "DEBUG": 10, "NOTSET": 0}
+        self.logLevel = (level, _log_levels[level])
+        self.log = logging.getLogger("QchemService")
+        self.log.setLevel(self.logLevel[1])
+        logStreamHandler = logging.StreamHandler()
+        logStreamHandler.setLevel(self.logLevel[1])
+        logFormatter = logging.Formatter("%(asctime)s " +
+                                         "%(name)s:%(levelname)s " +
+                                         "%(message)s")
+        logStreamHandler.setFormatter(logFormatter)
+        if (self.log.hasHandlers()):
+            self.log.handlers.clear()
+        self.log.addHandler(logStreamHandler)
+
+    def submit(self, request: dict) -> int:
+        """Queue a tuning request and return its id."""
+        for _field in ("input", "geometry", "omega"):
+            if _field not in request:
+                raise ValueError(f"Request has no '{_field}'.")
+        _multi = list(request.get("multiplicities", [0, 0, 0]))
+        if len(_multi) != 3:
+            raise ValueError("Request needs three multiplicities.")
+        _multi = [m if m != 0 else d for m, d in zip(_multi, (1, 2, 2))]
+        _objective = request.get("objective", "OT")
+        if _objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{_objective}'.")
+        self.checkInput(request["input"])
+        _key = hashlib.sha256(json.dumps(
+            [request["input"], request["geometry"]]).encode()
+        ).hexdigest()[:16]
+        _omega = sorted({round(o * 1000) / 1000
+                         for o in omegaValues(request["omega"])})
+        if not _omega:
+            raise ValueError("Request has no omega values.")
+        with self.lock:
+            _id = len(self.requests) + 1
+            self.requests[_id] = {"id": _id,
+                                  "name": request.get("name", _key),
+                                  "key": _key, "multiplicities": _multi,
+                                  "objective": _objective,
+                                  "series": (_key, _objective, *_multi),
+                                  "omega": _omega, "results": {},
+                                  "state": "queued", "error": "",
+                                  "submitted": time.time()}
+        self.incoming.put((_id, request))
+        self.log.info(f"Queued request {_id} for " +
+                      f"'{self.requests[_id]['name']}' with {len(_omega)} " +
+                      "omegas.")
+        return _id
+
+    def checkInput(self, text: str) -> None:
+        """Raise ValueError unless text parses as a Qchem input."""
+        with tempfile.NamedTemporaryFile("w", suffix=".in") as f:
+            f.write(text)
+            f.flush()
+            try:
+                _input = QchemInput(f.name, loggerLevel="WARNING")
+            except (KeyError, IndexError):
+                raise ValueError("The input has lines outside of a $section.")
+        for _section in ("rem", "molecule"):
+            if _section not in _input.input:
+                raise ValueError(f"The input has no ${_section} section.")
+
+    def setup(self, key: str, request: dict) -> str:
+        """Create the directory of a molecule, return its input file."""
+        _dir = os.path.join(self.root, key)
+        _fname = os.path.join(_dir, "RSH.in")
+        if os.path.isfile(_fname):
+            return _fname
+        os.makedirs(_dir, exist_ok=True)
+        with open(os.path.join(_dir, "geometry.mol"), "w") as f:
+            f.write(request["geometry"])
+        with open(os.path.join(_dir, "template.in"), "w") as f:
+            f.write(request["input"])
+        _input = QchemInput(os.path.join(_dir, "template.in"),
+                            loggerLevel=self.logLevel[0])
+        _input.input["molecule"] = [["read", "geometry.mol"]]
+        with open(_fname, "w") as f:
+            f.write(str(_input))
+        return _fname
+
+    def schedule(self, rid: int, request: dict) -> None:
+        """Queue the calculations of a request that are not known yet."""
+        _request = self.requests[rid]
+        _key = _request["key"]
+        _fname = self.setup(_key, request)
+        _template = QchemInput(_fname, loggerLevel=self.logLevel[0])
+        _multi = _request["multiplicities"]
+        _series = _request["series"]
+        _finished = []
+        for _o in _request["omega"]:
+            _group = (_series, _o)
+            if _group in self.results:
+                _finished.append(_group)
+                continue
+            if _group in self.tuningRuns:
+                continue
+            tuning_run = QchemTuning(fname=_fname,
+                                     omega=_o,
+                                     nthreads=self.minThreads,
+                                     neutralSpMlt=_multi[0],
+                                     anionSpMlt=_multi[1],
+                                     cationSpMlt=_multi[2],
+                                     cache=self.cache,
+                                     journal=self.journal,
+                                     template=_template,
+                                     inline=self.inline,
+                                     metrics=self.metrics,
+                                     scratch=self.scratch,
+                                     objective=_request["objective"],
+                                     scheduler=self.scheduler,
+                                     loggerLevel=self.logLevel[0])
+            self.tuningRuns[_group] = tuning_run
+            if tuning_run.scheduleCalculations(self.scheduler,
+                                               series=_series) == 0:
+                _finished.append(_group)
+                self.report(_group, {})
+        self.scheduler.sortPending()
+        with self.lock:
+            _request["state"] = "running"
+        for _group in _finished:
+            self.deliver(_group)
+
+    def report(self, group: tuple, calcs: dict) -> None:
+        """Store J of a finished tuning run and pass it on."""
+        tuning_run = self.tuningRuns[group]
+        tuning_run.collectTimings(calcs)
+        try:
+            tuning_run.parseOutput()
+            tuning_run.calculateOptimalTuning()
+            _jot = tuning_run.data["tuning"]["JOT"]
+        except ValueError:
+            _jot = None
+        with self.lock:
+            self.results[group] = _jot
+        self.deliver(group)
+
+    def deliver(self, group: tuple) -> None:
+        """Give a finished result to every request waiting for it."""
+        with self.lock:
+            for _request in self.requests.values():
+                if _request["series"] != group[0] or \
+                        group[1] not in _request["omega"] or \
+                        _request["state"] != "running":
+                    continue
+                _request["results"][group[1]] = self.results[group]
+                if len(_request["results"]) == len(_request["omega"]):
+                    _request["state"] = "done"
+                    self.log.info(f"Request {_request['id']} is done.")
+            self.lock.notify_all()
+
+    def status(self, rid: int) -> dict:
+        """Return the state and results of a request."""
+        with self.lock:
+            _request = self.requests[rid]
+            _valid = {o: j for o, j in _request["results"].items()
+                      if j is not None}
+            return {"id": rid, "name": _request["name"],
+                    "objective": _request["objective"],
+                    "state": _request["state"], "error": _request["error"],
+                    "results": [{"omega": o, "JOT": j} for o, j
+                                in sorted(_request["results"].items())],
+                    "pending": len(_request["omega"]) -
+                    len(_request["results"]),
+                    "optimal": min(_valid, key=_valid.get)
+                    if _valid else None}
+
+    def stream(self, rid: int):
+        """Yield the results of a request as they finish, then its status."""
+        _sent = set()
+        while True:
+            with self.lock:
+                _request = self.requests[rid]
+                self.lock.wait_for(lambda: len(_request["results"]) >
+                                   len(_sent) or _request["state"] in
+                                   ("done", "failed"), timeout=60)
+                _new = sorted((o, j) for o, j in _request["results"].items()
+                              if o not in _sent)
+                _done = _request["state"] in ("done", "failed")
+            for _o, _jot in _new:
+                _sent.add(_o)
+                yield {"omega": _o, "JOT": _jot}
+            if _done:
+                yield self.status(rid)
+                return
+
+    def overview(self) -> dict:
+        """Return the core budget and the number of jobs and requests."""
+        with self.lock:
+            _states = [r["state"] for r in self.requests.values()]
+        return {"cores": self.scheduler.numCores,
+                "freeCores": self.scheduler.freeCores(),
+                "running": len(self.scheduler.running),
+                "pending": len(self.scheduler.pending),
+                "requests": {s: _states.count(s) for s in set(_states)}}
+
+    def serve(self) -> None:
+        """Answer clients and run their calculations until interrupted."""
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.log.info(f"Serving on {self.address} with " +
+                      f"{self.scheduler.numCores} cores.")
+        try:
+            while True:
+                while not self.incoming.empty():
+                    _id, _request = self.incoming.get()
+                    try:
+                        self.schedule(_id, _request)
+                    except Exception as e:
+                        _error = f"{type(e).__name__}: {e}"
+                        self.log.error(f"Request {_id} failed: {_error}")
+                        with self.lock:
+                            self.requests[_id]["state"] = "failed"
+                            self.requests[_id]["error"] = _error
+                            self.lock.notify_all()
+                self.scheduler.step(callback=self.report)
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            self.log.info("Shutting down, stopping running calculations.")
+            for _job in self.scheduler.running:
+                _job["calc"].process.terminate()
+        finally:
+            self.server.shutdown()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP requests to a QchemService."""
+
+    def sendJSON(self, data: dict, status: int = 200) -> None:
+        """Send data as a JSON response."""
+        _body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_body)))
+        self.end_headers()
+        self.wfile.write(_body)
+
+    def requestId(self) -> int:
+        """Return the request id in the path, None if unknown."""
+        _parts = self.path.strip("/").split("/")
+        if len(_parts) < 2 or not _parts[1].isdigit() or \
+                int(_parts[1]) not in self.server.service.requests:
+            return None
+        return int(_parts[1])
+
+    def do_POST(self) -> None:
+        """Accept a tuning request."""
+        if self.path.rstrip("/") != "/tune":
+            self.sendJSON({"error": "Not found."}, 404)
+            return
+        try:
+            _length = int(self.headers.get("Content-Length", 0))
+            _id = self.server.service.submit(
+                json.loads(self.rfile.read(_length)))
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            self.sendJSON({"error": str(e)}, 400)
+            return
+        self.sendJSON({"id": _id})
+
+    def do_GET(self) -> None:
+        """Report the service status or the results of a request."""
+        _service = self.server.service
+        if self.path.rstrip("/") == "/status":
+            self.sendJSON(_service.overview())
+            return
+        _id = self.requestId()
+        if not self.path.startswith("/tune/") or _id is None:
+            self.sendJSON({"error": "Not found."}, 404)
+        elif self.path.rstrip("/").endswith("/stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for _line in _service.stream(_id):
+                self.wfile.write((json.dumps(_line) + "\n").encode())
+                self.wfile.flush()
+        else:
+            self.sendJSON(_service.status(_id))
+
+    def log_message(self, format: str, *args) -> None:
+        """Log requests at debug level instead of printing them."""
+        self.server.service.log.debug(format % args)
+
+
+class QchemClient():
+    """Client submitting tuning requests to a QchemService."""
+
+    def __init__(self, url: str = "http://127.0.0.1:8765") -> None:
+        """Set up the client of the service at url."""
+        self.url = url.rstrip("/")
+
+    def call(self, path: str, data: dict = None) -> dict:
+        """Send a request (POST if data is given) and return the reply."""
+        _request = urllib.request.Request(
+            self.url + path,
+            data=None if data is None else json.dumps(data).encode(),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(_request) as f:
+            return json.load(f)
+
+    def submit(self, fname: str, omega, multiplicities: list[int] = [],
+               name: str = "", objective: str = "OT") -> int:
+        """Submit the neutral input fname and its geometry, return the id.
+
+        omega is a list or a start/stop/step dictionary, as for QchemBatch.
+        """
+        _input = QchemInput(fname, loggerLevel="WARNING")
+        if _input.input["molecule"][0][0].lower() != "read":
+            raise ValueError(f"The $molecule section of <{fname}> has to " +
+                             "read a geometry file.")
+        with open(os.path.join(os.path.dirname(fname),
+                               _input.input["molecule"][0][1]), "r") as f:
+            _geometry = f.read()
+        with open(fname, "r") as f:
+            _text = f.read()
+        return self.call("/tune", {
+            "name": name if name != "" else
+            os.path.splitext(_input.input["molecule"][0][1])[0],
+            "input": _text, "geometry": _geometry, "omega": omega,
+            "multiplicities": multiplicities if multiplicities != []
+            else [0, 0, 0], "objective": objective})["id"]
+
+    def status(self, rid: int = None) -> dict:
+        """Return the status of a request, or of the service."""
+        return self.call("/status" if rid is None else f"/tune/{rid}")
+
+    def stream(self, rid: int):
+        """Yield the results of a request as they finish, then its status."""
+        with urllib.request.urlopen(f"{self.url}/tune/{rid}/stream") as f:
+            for _line in f:
+                yield json.loads(_line)
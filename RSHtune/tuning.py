@@ -2,24 +2,50 @@
 RSHtune  - Tuning.
 
 Tune the range separation parameter of an RSH funtional.
-Dependencies: os,sys, copy, logging
+Dependencies: os,sys, copy, time, logging
 """
 import os
 import sys
+import time
 import logging
 from .input import QchemInput
-from .calculation import QchemCalculation
+from .output import QchemOutput, findOutput
+from .journal import inputHash
+from .calculation import QchemCalculation, nearestGuess, replaceFile
+
+# Charge states needed by every tuning objective
+OBJECTIVES = {"OT": ("neutral", "anion", "cation"),
+              "IP": ("neutral", "cation"),
+              "EA": ("neutral", "anion")}
+CHARGES = {"neutral": 0, "anion": -1, "cation": 1}
+MULTIPLICITIES = {"neutral": 1, "anion": 2, "cation": 2}
 
 
 class QchemTuning():
     """Object for tuning the RSH range separation parameter."""
 
     def __init__(self, fname: str, omega: float, nthreads: int = 0,
+                 alpha: float = None,
                  neutralSpMlt: int = 0,
                  anionSpMlt: int = 0,
                  cationSpMlt: int = 0,
+                 cache=None,
+                 journal=None,
+                 template: QchemInput = None,
+                 inline: bool = False,
+                 monitor: dict = None,
+                 retries: list[dict] = [],
+                 backend=None,
+                 metrics=None,
+                 scratch=None,
+                 objective: str = "OT",
+                 scheduler=None,
                  loggerLevel: str = "INFO") -> None:
-        """Set up the tuning process."""
+        """Set up the tuning process.
+
+        With alpha, the short-range HF fraction is set as well. template is
+        the QchemInput of fname, if already parsed.
+        """
         self.initLogging(loggerLevel)
 
         # Check for input file
@@ -27,15 +53,54 @@ class QchemTuning():
             self.log.error(f"Cannot find neutral input file <{fname}>!")
             sys.exit()
 
-        # Neutral Input
+        # Neutral Input; all generated files are placed next to it
         self.inputFile = fname
-        self.neutralInput = QchemInput(fname=self.inputFile,
-                                       loggerLevel=self.logLevel[0])
+        self.workDir = os.path.dirname(fname)
+        self.neutralInput = template if template is not None else \
+            QchemInput(fname=self.inputFile, loggerLevel=self.logLevel[0])
         self.neutralMolecule = self.neutralInput.input["molecule"][0][1]
+        self.inline = inline
 
         # Number of Threads
         self.numThreads = 1 if nthreads == 0 else nthreads
 
+        # Short-range HF fraction, None to keep the template's weights
+        self.alpha = alpha
+        self.xc = {} if alpha is None else \
+            self.neutralInput.hybridWeights(alpha)
+
+        # Result Cache
+        self.cache = cache
+        self.timings = {}
+
+        # Job Journal
+        self.journal = journal
+
+        # SCF Monitoring
+        self.monitor = monitor
+
+        # Retry Policy
+        self.retries = retries
+
+        # Execution Backend
+        self.backend = backend
+
+        # Performance Metrics
+        self.metrics = metrics
+
+        # Scratch Management
+        self.scratch = scratch
+
+        # Initial guesses: state -> scratch name of a converged calculation
+        self.guesses = {}
+
+        # Tuning Objective
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown tuning objective '{objective}'.")
+        self.objective = objective
+        self.states = OBJECTIVES[objective]
+        self.scheduler = scheduler
+
         self.setSpinMultiplicities(neutralSpMlt, anionSpMlt, cationSpMlt)
         self.createGeometries()
         self.createInputFiles(omega)
@@ -69,127 +134,306 @@ class QchemTuning():
         self.log.info(f"  - Anion Charge Spin:    -1 {self.anionSpinMulti}")
         self.log.info(f"  - Cation Charge Spin:   +1 {self.cationSpinMulti}")
 
+    def multiplicity(self, state: str) -> int:
+        """Return the spin multiplicity of a charge state."""
+        return {"neutral": self.neutralSpinMulti,
+                "anion": self.anionSpinMulti,
+                "cation": self.cationSpinMulti}[state]
+
+    def stateName(self, state: str) -> str:
+        """Return a state's name in files, with a non-default multiplicity."""
+        return stateName(state, self.multiplicity(state))
+
     def createGeometries(self) -> None:
-        """Create molecule files."""
-        with open(self.neutralMolecule, "r") as f:
+        """Create molecule files, or read the geometry for inline inputs."""
+        with open(self.path(self.neutralMolecule), "r") as f:
             _neutralGeometry = f.readlines()
-        self.anionMolecule = f"{self.neutralMolecule.split('.')[0]}_anion.mol"
-        self.cationMolecule = f"{self.neutralMolecule.split('.')[0]}_cation.mol"
-        with open(self.anionMolecule, "w") as _fanion:
-            _fanion.write(_neutralGeometry[0])
-            _fanion.write(f"{-1} {self.anionSpinMulti}\n")
-            for line in _neutralGeometry[2:]:
-                _fanion.write(line)
-        self.log.info(f"Written anion geometry to <{self.anionMolecule}>.")
-        with open(self.cationMolecule, "w") as fcation:
-            fcation.write(_neutralGeometry[0])
-            fcation.write(f"{1} {self.cationSpinMulti}\n")
-            for line in _neutralGeometry[2:]:
-                fcation.write(line)
-        self.log.info(f"Written cation geometry to <{self.cationMolecule}>.")
+        if self.inline:
+            self.geometry = [line for line in _neutralGeometry[2:]
+                             if line.strip() != ""
+                             and line.strip()[0] != "$"]
+            self.log.info(f"Read {len(self.geometry)} atoms from " +
+                          f"<{self.neutralMolecule}>.")
+            return
+        _base = os.path.splitext(self.neutralMolecule)[0]
+        self.molecules = {"neutral": self.neutralMolecule}
+        for s in self.states[1:]:
+            self.molecules[s] = f"{_base}_{self.stateName(s)}.mol"
+            if replaceFile(self.path(self.molecules[s]),
+                           _neutralGeometry[0] +
+                           f"{CHARGES[s]} {self.multiplicity(s)}\n" +
+                           "".join(_neutralGeometry[2:])):
+                self.log.info(f"Written {s} geometry to " +
+                              f"<{self.molecules[s]}>.")
 
     def createInputFiles(self, omega: float) -> None:
-        """Create input files."""
+        """Create input files, rendered from the parsed neutral input."""
         self.omega = omega
-        self.neutralFile = f"w{int(self.omega*1000):0>3}_neutral.in"
-        with open(self.neutralFile, "w") as fneutral:
-            for j, item in enumerate(self.neutralInput.input["rem"]):
-                if item[0] == "omega":
-                    self.neutralInput.input["rem"][j][1] = int(self.omega*1000)
-            self.neutralInput.input["molecule"][0][1] = self.neutralMolecule
-            fneutral.write(str(self.neutralInput))
-        self.log.info(f"Written working neutral input to <{self.neutralFile}>")
-
-        self.anionFile = f"w{int(self.omega*1000):0>3}_anion.in"
-        with open(self.anionFile, "w") as _fanion:
-            _anionInput = QchemInput(fname=self.inputFile,
-                                     loggerLevel=self.logLevel[0])
-            for j, item in enumerate(_anionInput.input["rem"]):
-                if item[0] == "omega":
-                    _anionInput.input["rem"][j][1] = int(self.omega*1000)
-                _anionInput.input["molecule"][0][1] = self.anionMolecule
-            _fanion.write(str(_anionInput))
-        self.log.info(f"Written working anion input to <{self.anionFile}>")
-
-        self.cationFile = f"w{int(self.omega*1000):0>3}_cation.in"
-        with open(self.cationFile, "w") as _fcation:
-            _cationInput = QchemInput(fname=self.inputFile,
+        _omega = round(self.omega*1000)
+        _prefix = f"w{_omega:0>3}"
+        if self.alpha is not None:
+            _prefix = f"a{round(self.alpha*1000):0>3}{_prefix}"
+        self.files = {s: self.path(f"{_prefix}_{self.stateName(s)}.in")
+                      for s in self.states}
+        for s, fname in self.jobFiles().items():
+            if self.scheduler is not None and self.scheduler.shared(fname):
+                self.log.info(f"Keeping input <{fname}> of a shared job.")
+            elif replaceFile(fname, self.renderInput(s, _omega)):
+                self.log.info(f"Written working {s} input to <{fname}>")
+
+    def renderInput(self, state: str, omega: int) -> str:
+        """Return the input text of a charge state at omega/1000."""
+        if self.inline:
+            return self.neutralInput.render(omega=omega,
+                                            charge=CHARGES[state],
+                                            multiplicity=self.multiplicity(
+                                                state),
+                                            geometry=self.geometry,
+                                            xc=self.xc)
+        return self.neutralInput.render(omega=omega,
+                                        molecule=self.molecules[state],
+                                        xc=self.xc)
+
+    def path(self, fname: str) -> str:
+        """Return the path of a file in the working directory."""
+        return os.path.join(self.workDir, fname)
+
+    def jobFiles(self) -> dict:
+        """Return the input files of the jobs the objective needs."""
+        return dict(self.files)
+
+    def jobWeights(self) -> dict:
+        """Return relative job costs, open-shell states counting double."""
+        return {s: 1 if self.multiplicity(s) == 1 else 2
+                for s in self.states}
+
+    def cachedResults(self) -> dict:
+        """Return cached results of the jobs the objective needs."""
+        if self.cache is None:
+            return {}
+        if not hasattr(self, "cacheKeys"):
+            self.cacheKeys = {s: self.cache.key(f)
+                              for s, f in self.jobFiles().items()}
+        _cached = {}
+        for s, _key in self.cacheKeys.items():
+            _result = self.cache.get(_key[0])
+            if _result is not None:
+                _cached[s] = _result
+        if _cached:
+            self.log.info(f"Using cached results for {', '.join(_cached)}.")
+        return _cached
+
+    def pendingStates(self) -> dict:
+        """Return input files of the states that still need to be run."""
+        _cached = self.cachedResults()
+        _files = {}
+        for s, fname in self.jobFiles().items():
+            if s in _cached:
+                continue
+            _jname = os.path.splitext(fname)[0]
+            if self.journal is not None:
+                if self.journal.completed(_jname, fname):
+                    self.log.info(f"Job '{_jname}' already finished.")
+                    continue
+                _alpha = {} if self.alpha is None else {"alpha": self.alpha}
+                self.journal.mark(_jname, "pending", omega=self.omega,
+                                  species=s, input=inputHash(fname),
+                                  **_alpha)
+            _files[s] = fname
+        return _files
+
+    def runCalculations(self, concurrent: bool = False,
+                        weights: list[float] = []) -> dict:
+        """Run the Qchem calculations the objective needs.
+
+        With concurrent=True all jobs are launched at once and the thread
+        budget is split between them according to weights (one per state
+        of the objective, neutral first). By default open-shell states get
+        twice the threads of closed-shell ones, since unrestricted runs take
+        longer.
+        """
+        _files = self.pendingStates()
+        if not _files:
+            return self.timings
+
+        if concurrent:
+            _weights = self.jobWeights()
+            if weights != []:
+                _weights = dict(zip(_weights, weights))
+            _threads = dict(zip(_files, splitThreads(
+                self.numThreads, [_weights[s] for s in _files])))
+        else:
+            _threads = {s: self.numThreads for s in _files}
+
+        _calcs = {s: QchemCalculation(fname=_files[s],
+                                      nthreads=_threads[s],
+                                      guess=self.guesses.get(s, ""),
+                                      monitor=self.monitor,
+                                      retries=self.retries,
+                                      backend=self.backend,
+                                      scratch=self.scratch,
                                       loggerLevel=self.logLevel[0])
-            for j, item in enumerate(_cationInput.input["rem"]):
-                if item[0] == "omega":
-                    _cationInput.input["rem"][j][1] = int(self.omega*1000)
-            _cationInput.input["molecule"][0][1] = self.cationMolecule
-            _fcation.write(str(_cationInput))
-        self.log.info(f"Written working cation input to <{self.cationFile}>")
-
-    def runCalculations(self) -> None:
-        """Run three Qchem calculations for anion, cation and neutral."""
-        _calc = QchemCalculation(fname=self.neutralFile,
-                                 nthreads=self.numThreads,
-                                 loggerLevel=self.logLevel[0])
-        _calc.submit()
-
-        _calc = QchemCalculation(fname=self.anionFile,
-                                 nthreads=self.numThreads,
-                                 loggerLevel=self.logLevel[0])
-        _calc.submit()
-
-        _calc = QchemCalculation(fname=self.cationFile,
-                                 nthreads=self.numThreads,
-                                 loggerLevel=self.logLevel[0])
-        _calc.submit()
+                  for s in _files}
+        if concurrent:
+            self.log.info(f"Running {', '.join(_calcs)} concurrently " +
+                          f"with {', '.join(map(str, _threads.values()))} " +
+                          "threads.")
+            for s in _calcs:
+                self.journalMark(_calcs[s], "running")
+                _calcs[s].start()
+            _running = list(_calcs)
+            while _running:
+                for s in [s for s in _running
+                          if _calcs[s].poll() is not None]:
+                    _calcs[s].wait()
+                    if not _calcs[s].recover():
+                        _running.remove(s)
+                        self.journalMark(_calcs[s])
+                if _running:
+                    time.sleep(1.0 if self.monitor is None else
+                               self.monitor.get("interval", 1.0))
+        else:
+            for s in _calcs:
+                self.journalMark(_calcs[s], "running")
+                _calcs[s].submit()
+                self.journalMark(_calcs[s])
+        for _calc in _calcs.values():
+            _calc.pruneScratch()
+
+        self.calcs = _calcs
+        return self.collectTimings(_calcs)
+
+    def journalMark(self, calc, state: str = "") -> None:
+        """Record a job state, done or failed by convergence if not given."""
+        if self.journal is None:
+            return
+        if state == "":
+            state = "done" if calc.converged() else "failed"
+        self.journal.mark(calc.jobPath, state, failure=calc.failure,
+                          attempts=len(calc.attempts))
+
+    def setGuesses(self, finished: dict) -> None:
+        """Warm-start every state from its nearest converged omega.
+
+        finished maps each state to {omega: scratch name} of jobs whose
+        saved scratch can be read as an SCF guess.
+        """
+        self.guesses = {s: nearestGuess(finished.get(s, {}), self.omega)
+                        for s in self.jobFiles()}
+
+    def recordGuesses(self, finished: dict) -> None:
+        """Add this omega's converged calculations to finished."""
+        for s, _calc in getattr(self, "calcs", {}).items():
+            if _calc.converged():
+                finished.setdefault(s, {})[self.omega] = _calc.scratchName
+
+    def scheduleCalculations(self, scheduler, series=None) -> int:
+        """Queue calculations on a QchemScheduler, return the job count.
+
+        Jobs are grouped by omega, or by (series, omega) if a series such
+        as a molecule name is given. Warm starts are only read between jobs
+        of the same series and multiplicity.
+        """
+        _group = self.omega if series is None else (series, self.omega)
+        _weights = self.jobWeights()
+        _files = self.pendingStates()
+        for s, fname in _files.items():
+            scheduler.add(_group, s, fname, _weights[s],
+                          series=(series, self.multiplicity(s)),
+                          omega=self.omega)
+        return len(_files)
+
+    def collectTimings(self, calcs: dict) -> dict:
+        """Store resource usage, timings and failed attempts of jobs.
+
+        Finished jobs are also recorded in the QchemMetrics, if given.
+        """
+        self.timings.update({s: {**calcs[s].metrics(),
+                                 "failure": calcs[s].failure,
+                                 "attempts": calcs[s].attempts}
+                             for s in calcs})
+        if self.metrics is not None:
+            for s in calcs:
+                self.metrics.record(self.omega, s, calcs[s])
+        return self.timings
 
     def parseOutput(self) -> None:
-        """Read output files and store relevant data."""
-        self.data = {"neutral": {}, "anion": {}, "cation": {}}
-
-        with open(f"{self.neutralFile.split('.')[0]}.out", "r") as nout:
-            _homo = []
-            _lumo = []
-            _lines = nout.readlines()
-            for j, line in enumerate(_lines):
-                if "Convergence criterion met" in line:
-                    self.data["neutral"]["SCFenergy"] = float(line.split()[1])
-                if "-- Virtual --" in line:
-                    _homo.append(float(_lines[j-1].split()[-1]))
-                    _lumo.append(float(_lines[j+1].split()[0]))
-            self.data["neutral"]["HOMO"] = max(_homo)
-            self.data["neutral"]["LUMO"] = min(_lumo)
-
-        with open(f"{self.anionFile.split('.')[0]}.out", "r") as aout:
-            _homo = []
-            _lumo = []
-            _lines = aout.readlines()
-            for j, line in enumerate(_lines):
-                if "Convergence criterion met" in line:
-                    self.data["anion"]["SCFenergy"] = float(line.split()[1])
-                if "-- Virtual --" in line:
-                    _homo.append(float(_lines[j-1].split()[-1]))
-                    _lumo.append(float(_lines[j+1].split()[0]))
-            self.data["anion"]["HOMO"] = max(_homo)
-            self.data["anion"]["LUMO"] = min(_lumo)
-
-        with open(f"{self.cationFile.split('.')[0]}.out", "r") as cout:
-            _homo = []
-            _lumo = []
-            _lines = cout.readlines()
-            for j, line in enumerate(_lines):
-                if "Convergence criterion met" in line:
-                    self.data["cation"]["SCFenergy"] = float(line.split()[1])
-                if "-- Virtual --" in line:
-                    _homo.append(float(_lines[j-1].split()[-1]))
-                    _lumo.append(float(_lines[j+1].split()[0]))
-            self.data["cation"]["HOMO"] = max(_homo)
-            self.data["cation"]["LUMO"] = min(_lumo)
+        """Read output files (or cached results) and store relevant data."""
+        self.data = {}
+        _cached = self.cachedResults()
+        for s, fname in self.jobFiles().items():
+            if s in _cached:
+                self.data[s] = _cached[s]
+                continue
+            _base = os.path.splitext(fname)[0]
+            self.data[s] = self.parseOutputFile(findOutput(_base) or
+                                                f"{_base}.out")
+            if self.cache is not None:
+                if s in self.timings:
+                    self.data[s]["wallTime"] = self.timings[s]["wallTime"]
+                self.cache.put(*self.cacheKeys[s], self.data[s])
+
+    def parseOutputFile(self, fname: str) -> dict:
+        """Read SCF energy, HOMO and LUMO from a single output file."""
+        if not os.path.isfile(fname):
+            raise ValueError(f"No output file <{fname}>.")
+        return QchemOutput(fname, loggerLevel=self.logLevel[0]).results()
 
     def calculateOptimalTuning(self) -> None:
-        """Calculate optimal tuning error from neutral, anion and cation."""
-        self.data["tuning"] = {}
-        self.data["tuning"]["IP"] = (self.data["cation"]["SCFenergy"] -
-                                     self.data["neutral"]["SCFenergy"])
-        self.data["tuning"]["EA"] = (self.data["neutral"]["SCFenergy"] -
-                                     self.data["anion"]["SCFenergy"])
-        self.data["tuning"]["JOT"] = ((self.data["tuning"]["IP"] +
-                                       self.data["neutral"]["HOMO"])**2 +
-                                      (self.data["tuning"]["EA"] +
-                                       self.data["neutral"]["LUMO"])**2)
+        """Calculate the tuning error of the objective from the states."""
+        self.data["tuning"] = optimalTuningError(self.data, self.objective)
+
+
+def stateName(state: str, multiplicity: int = 0) -> str:
+    """Return a state's name in files, with a non-default multiplicity."""
+    return state if multiplicity in (0, MULTIPLICITIES[state]) else \
+        f"{state}{multiplicity}"
+
+
+def stateNames(objective: str = "OT", multiplicities: list[int] = []) -> dict:
+    """Return the file names of the states an objective needs.
+
+    multiplicities are given for neutral, anion and cation, 0 or none
+    meaning the default.
+    """
+    _multi = dict(zip(CHARGES, multiplicities))
+    return {s: stateName(s, _multi.get(s, 0)) for s in OBJECTIVES[objective]}
+
+
+def splitThreads(nthreads: int, weights: list[float]) -> list[int]:
+    """Split a thread budget between jobs proportionally to weights.
+
+    Shares are rounded by largest remainder, then jobs left without a
+    thread take one from the job with the most.
+    """
+    if nthreads < len(weights):
+        return [1 for _ in weights]
+    _share = [nthreads * w / sum(weights) for w in weights]
+    _threads = [int(t) for t in _share]
+    _order = sorted(range(len(weights)),
+                    key=lambda j: _share[j] - int(_share[j]), reverse=True)
+    for j in _order[:nthreads - sum(_threads)]:
+        _threads[j] += 1
+    while 0 in _threads:
+        _threads[_threads.index(max(_threads))] -= 1
+        _threads[_threads.index(0)] = 1
+    return _threads
+
+
+def optimalTuningError(data: dict, objective: str = "OT") -> dict:
+    """Return IP and/or EA and the tuning error from state results.
+
+    J_OT sums (IP + HOMO)^2 and (EA + LUMO)^2, the IP and EA objectives
+    keep only one of the terms. The error is returned as JOT whatever the
+    objective.
+    """
+    _tuning = {"JOT": 0.0}
+    if "cation" in OBJECTIVES[objective]:
+        _tuning["IP"] = (data["cation"]["SCFenergy"] -
+                         data["neutral"]["SCFenergy"])
+        _tuning["JOT"] += (_tuning["IP"] + data["neutral"]["HOMO"])**2
+    if "anion" in OBJECTIVES[objective]:
+        _tuning["EA"] = (data["neutral"]["SCFenergy"] -
+                         data["anion"]["SCFenergy"])
+        _tuning["JOT"] += (_tuning["EA"] + data["neutral"]["LUMO"])**2
+    return _tuning
@@ -0,0 +1,168 @@
+"""
+RSHtune Benchmarks.
+
+Time RSHtune's own overhead against a synthetic Qchem stand-in.
+Dependencies: os, sys, json, time, shutil, argparse, tempfile, RSHtune
+
+The fake qchem in this directory is put on PATH, so no Qchem installation
+is needed. Every benchmark runs in a fresh temporary directory.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse as argp
+import tempfile
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH))
+sys.path.insert(0, BENCH)
+import RSHtune as tune  # noqa: E402
+from fakeqchem import writeOutput  # noqa: E402
+
+TEST = os.path.join(os.path.dirname(BENCH), "test")
+
+
+def setupDir(dir: str) -> str:
+    """Copy the test input and geometry into dir, return the input file."""
+    for fname in ("RSH.in", "water.mol"):
+        shutil.copyfile(os.path.join(TEST, fname), os.path.join(dir, fname))
+    return os.path.join(dir, "RSH.in")
+
+
+def timeit(func, repeat: int = 3) -> float:
+    """Return the best wall time of repeat calls of func."""
+    _best = float("inf")
+    for _ in range(repeat):
+        _start = time.perf_counter()
+        func()
+        _best = min(_best, time.perf_counter() - _start)
+    return _best
+
+
+def benchRender(dir: str, n: int) -> list[tuple]:
+    """Time rendering inputs from a template and writing tuning inputs."""
+    _input = setupDir(dir)
+    _template = tune.QchemInput(_input, loggerLevel="WARNING")
+    _omega = [200 + j % 200 for j in range(n)]
+
+    def render():
+        for o in _omega:
+            _template.render(omega=o, molecule="water.mol")
+
+    def tuning():
+        for o in _omega[:n // 10]:
+            tune.QchemTuning(fname=_input, omega=o/1000, template=_template,
+                             loggerLevel="WARNING")
+
+    return [("render input", n, timeit(render)),
+            ("write tuning inputs", n // 10, timeit(tuning))]
+
+
+def benchParse(dir: str, n: int) -> list[tuple]:
+    """Time parsing outputs of increasing size."""
+    _results = []
+    for nbasis in (100, 1000, 5000):
+        _fname = os.path.join(dir, f"n{nbasis}.out")
+        writeOutput(_fname, 0.27, atoms=15 * ["O", "H", "H"], nbasis=nbasis,
+                    cycles=20)
+        _size = os.path.getsize(_fname) / 1024
+
+        def parse():
+            for _ in range(n):
+                tune.QchemOutput(_fname, loggerLevel="WARNING").results()
+
+        _results.append((f"parse output ({_size:.0f} kB)", n, timeit(parse)))
+    return _results
+
+
+def benchDry(dir: str, n: int) -> list[tuple]:
+    """Time the read-only analysis of n omegas (3n output files)."""
+    for o in range(n):
+        for _charge, _state in ((0, "neutral"), (-1, "anion"),
+                                (1, "cation")):
+            writeOutput(os.path.join(dir, f"w{o+1:0>3}_{_state}.out"),
+                        (o + 1) / 1000, charge=_charge,
+                        multiplicity=1 if _charge == 0 else 2,
+                        atoms=15 * ["O", "H", "H"], nbasis=400)
+    _results = []
+    for nprocs in (1, 0):
+        def dry():
+            tune.QchemAnalysis(dir=dir, nprocs=nprocs,
+                               loggerLevel="WARNING").table()
+
+        _name = "dry run, 1 process" if nprocs == 1 else \
+            f"dry run, all {os.cpu_count()} CPUs"
+        _results.append((_name, 3 * n, timeit(dry, repeat=1)))
+    return _results
+
+
+def benchScheduler(dir: str, n: int) -> list[tuple]:
+    """Time a scheduled scan of n omegas with instantaneous Qchem runs."""
+    _input = setupDir(dir)
+    _template = tune.QchemInput(_input, loggerLevel="WARNING")
+    _ncores = os.cpu_count()
+
+    def scan():
+        scheduler = tune.QchemScheduler(ncores=_ncores, interval=0.01,
+                                        loggerLevel="WARNING")
+        _runs = {}
+        for o in range(n):
+            tuning_run = tune.QchemTuning(fname=_input,
+                                          omega=(200 + o) / 1000,
+                                          template=_template,
+                                          loggerLevel="WARNING")
+            _runs[tuning_run.omega] = tuning_run
+            tuning_run.scheduleCalculations(scheduler)
+
+        def report(_o, calcs):
+            _runs[_o].collectTimings(calcs)
+            _runs[_o].parseOutput()
+            _runs[_o].calculateOptimalTuning()
+
+        scheduler.run(callback=report)
+
+    return [(f"scheduled scan, {_ncores} cores", 3 * n,
+             timeit(scan, repeat=1))]
+
+
+BENCHMARKS = {"render": (benchRender, 2000, 200),
+              "parse": (benchParse, 20, 5),
+              "dry": (benchDry, 1000, 100),
+              "scheduler": (benchScheduler, 50, 10)}
+
+
+if __name__ == "__main__":
+    """Run the benchmarks and print a table of timings."""
+
+    parser = argp.ArgumentParser(description="""Benchmarks of RSHtune's own
+                                 overhead using a fake Qchem.""")
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS),
+                        metavar="name",
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--quick", action="store_true", default=False,
+                        help="Use small problem sizes.")
+    parser.add_argument("--json", type=str, default="", metavar="file",
+                        help="Also write the results to a JSON file.")
+    args = parser.parse_args()
+
+    os.environ["PATH"] = BENCH + os.pathsep + os.environ["PATH"]
+    _results = []
+    print(f"#{'benchmark':<35s} {'items':>6s} {'total [s]':>10s} " +
+          f"{'per item [ms]':>14s}\n{69*'#'}")
+    for _name in args.benchmarks:
+        _bench, _full, _small = BENCHMARKS[_name]
+        with tempfile.TemporaryDirectory() as dir:
+            os.environ["QCSCRATCH"] = os.path.join(dir, "scratch")
+            os.environ["RSHTUNE_HISTORY"] = os.path.join(dir,
+                                                         "history.json")
+            for _label, _items, _time in _bench(dir, _small if args.quick
+                                                else _full):
+                print(f"{_label:<36s} {_items:>6d} {_time:>10.3f} " +
+                      f"{1000 * _time / _items:>14.3f}", flush=True)
+                _results.append({"benchmark": _label, "items": _items,
+                                 "seconds": _time})
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(_results, f, indent=1)
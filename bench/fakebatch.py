@@ -0,0 +1,130 @@
+"""
+RSHtune Benchmarks - Fake Batch System.
+
+Synthetic stand-in for the SLURM and PBS commands used by the cluster
+backends of RSHtune.
+Dependencies: os, re, sys, signal, tempfile, subprocess
+
+Called as sbatch, squeue, scancel, qsub, qstat or qdel it runs the tasks
+of a job array as background processes on this node. A task is queued
+while its file <id>.queued exists in the state directory. It is
+configured by environment variables:
+    FAKEBATCH_DIR     state directory (default <tmp>/fakebatch-<uid>)
+    FAKEBATCH_LAG     seconds between a task leaving the queue and running
+                      its script, i.e. writing its exit code (default 0)
+    FAKEBATCH_LOST    drop tasks from the queue without running them
+"""
+import os
+import re
+import sys
+import signal
+import tempfile
+import subprocess as sb
+
+SLURM = {"directive": "#SBATCH", "array": r"--array=(\d+)-(\d+)",
+         "index": "SLURM_ARRAY_TASK_ID"}
+PBS = {"directive": "#PBS", "array": r"-J (\d+)-(\d+)",
+       "index": "PBS_ARRAY_INDEX"}
+
+
+def stateDir() -> str:
+    """Return the state directory, creating it if needed."""
+    _dir = os.environ.get("FAKEBATCH_DIR",
+                          os.path.join(tempfile.gettempdir(),
+                                       f"fakebatch-{os.getuid()}"))
+    os.makedirs(_dir, exist_ok=True)
+    return _dir
+
+
+def nextId() -> int:
+    """Return a new job number."""
+    _fname = os.path.join(stateDir(), "lastid")
+    _id = 100
+    if os.path.isfile(_fname):
+        with open(_fname, "r") as f:
+            _id = int(f.read()) + 1
+    with open(_fname, "w") as f:
+        f.write(str(_id))
+    return _id
+
+
+def startTask(script: str, task: str, env: dict) -> None:
+    """Run one task of a job script in the background."""
+    _queued = os.path.join(stateDir(), f"{task}.queued")
+    open(_queued, "w").close()
+    _run = f"bash {script}; rm -f {_queued}"
+    if os.environ.get("FAKEBATCH_LOST", "") != "":
+        _run = f"rm -f {_queued}"
+    elif float(os.environ.get("FAKEBATCH_LAG", "0")) > 0:
+        _run = f"rm -f {_queued}; " + \
+            f"sleep {os.environ['FAKEBATCH_LAG']}; bash {script}"
+    _process = sb.Popen(["bash", "-c", _run], env={**os.environ, **env},
+                        stdin=sb.DEVNULL, stdout=sb.DEVNULL,
+                        stderr=sb.DEVNULL, start_new_session=True)
+    with open(os.path.join(stateDir(), f"{task}.pid"), "w") as f:
+        f.write(str(_process.pid))
+
+
+def submit(script: str, system: dict) -> tuple[int, list[int]]:
+    """Start every task of a job script, return job number and indices."""
+    with open(script, "r") as f:
+        _directives = [ln for ln in f
+                       if ln.startswith(system["directive"] + " ")]
+    _indices = None
+    for ln in _directives:
+        _match = re.search(system["array"], ln)
+        if _match:
+            _indices = list(range(int(_match[1]), int(_match[2]) + 1))
+    _id = nextId()
+    for j in _indices if _indices is not None else [None]:
+        if j is None:
+            startTask(script, str(_id), {})
+        else:
+            _task = f"{_id}_{j}" if system is SLURM else f"{_id}[{j}]"
+            startTask(script, _task, {system["index"]: str(j)})
+    return _id, _indices
+
+
+def queued() -> list[str]:
+    """Return the ids of all queued tasks."""
+    return sorted(f[:-len(".queued")] for f in os.listdir(stateDir())
+                  if f.endswith(".queued"))
+
+
+def cancel(task: str) -> None:
+    """Stop a task and remove it from the queue."""
+    _fname = os.path.join(stateDir(), f"{task}.pid")
+    if os.path.isfile(_fname):
+        with open(_fname, "r") as f:
+            try:
+                os.killpg(int(f.read()), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    _queued = os.path.join(stateDir(), f"{task}.queued")
+    if os.path.isfile(_queued):
+        os.remove(_queued)
+
+
+def main(args: list[str]) -> int:
+    """Run the batch command named by args[0]."""
+    _command, _args = os.path.basename(args[0]), args[1:]
+    if _command == "sbatch":
+        _id, _indices = submit(_args[-1], SLURM)
+        print(_id if "--parsable" in _args else f"Submitted batch job {_id}")
+    elif _command == "qsub":
+        _id, _indices = submit(_args[-1], PBS)
+        print(f"{_id}[].fakebatch" if _indices is not None
+              else f"{_id}.fakebatch")
+    elif _command == "squeue":
+        for _task in queued():
+            print(_task)
+    elif _command == "qstat":
+        for _task in queued():
+            print(f"{_task}.fakebatch  {os.environ.get('USER', 'user')}  " +
+                  "workq  RSHtune  R")
+    elif _command in ("scancel", "qdel"):
+        cancel(_args[-1])
+    else:
+        print(f"fakebatch: unknown command '{_command}'", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,173 @@
+"""
+RSHtune Benchmarks - Fake Qchem.
+
+Synthetic stand-in for the qchem executable, used by the benchmarks.
+Dependencies: os, re, sys, time, math
+
+Called as "qchem [-save] [-nt N] input output [scratch]" it reads omega, the
+HF fraction and the charge of the molecule from the input, optionally sleeps
+and burns CPU, and writes an output file with the sections RSHtune parses
+(SCF iterations, orbital energies, timings) padded to a realistic size. J_OT
+of the results has its minimum near omega=0.270 and alpha=0.200. It is
+configured by environment variables:
+    FAKEQCHEM_SLEEP   seconds to sleep (default 0)
+    FAKEQCHEM_BURN    CPU seconds to burn (default 0)
+    FAKEQCHEM_NBASIS  number of basis functions (default 200)
+    FAKEQCHEM_CYCLES  SCF cycles until convergence (default 12)
+    FAKEQCHEM_FAIL    fail to converge if this string is in the input name
+    FAKEQCHEM_CURE    converge anyway if this string is in the input text
+"""
+import os
+import re
+import sys
+import time
+import math
+
+ELECTRONS = {"H": 1, "He": 2, "Li": 3, "Be": 4, "B": 5, "C": 6, "N": 7,
+             "O": 8, "F": 9, "Ne": 10, "Na": 11, "Mg": 12, "Al": 13,
+             "Si": 14, "P": 15, "S": 16, "Cl": 17, "Ar": 18}
+
+
+def readMolecule(input: str, workDir: str) -> tuple[int, int, list[str]]:
+    """Return charge, multiplicity and atom symbols of an input."""
+    _section = re.search(r"\$molecule\s*\n(.*?)\$end", input,
+                         re.S | re.I)[1].split("\n")
+    _lines = [ln.split() for ln in _section if ln.strip() != ""]
+    if _lines[0][0].lower() == "read":
+        with open(os.path.join(workDir, _lines[0][1]), "r") as f:
+            _lines = [ln.split() for ln in f
+                      if ln.strip() != "" and ln.strip()[0] != "$"]
+    _charge, _multiplicity = int(_lines[0][0]), int(_lines[0][1])
+    return _charge, _multiplicity, [ln[0] for ln in _lines[1:]]
+
+
+def orbitalBlock(energies: list[float]) -> str:
+    """Format orbital energies in rows of eight, as Qchem does."""
+    return "".join(" " + "".join(f"{e:9.4f}" for e in energies[j:j+8]) +
+                   "\n" for j in range(0, len(energies), 8))
+
+
+def writeOutput(fname: str, omega: float, charge: int = 0,
+                multiplicity: int = 1, atoms: list[str] = ["O", "H", "H"],
+                alpha: float = 0.2,
+                nbasis: int = 200, cycles: int = 12, converge: bool = True,
+                threads: int = 1, wall: float = 0.0, cpu: float = 0.0) -> None:
+    """Write a synthetic Qchem output file."""
+    _electrons = sum(ELECTRONS.get(a.capitalize(), 6) for a in atoms) - charge
+    _alpha = (_electrons + multiplicity - 1) // 2
+    _beta = _electrons - _alpha
+    _energy = -76.4 * len(atoms) / 3 + 0.3 * charge + \
+        (omega - 0.3)**2 * (1 + charge)
+    _homo = -0.3 - 0.5 * (omega - 0.27) - 0.3 * (alpha - 0.2) - 0.1 * charge
+    _lumo = -0.3 + 0.4 * (omega - 0.27) + 0.2 * (alpha - 0.2)
+    with open(fname, "w") as f:
+        f.write("                  Welcome to Q-Chem\n" +
+                "     A Quantum Leap Into The Future Of Chemistry\n\n" +
+                f" Q-Chem begins on {time.ctime()}\n" +
+                f" Host: fakeqchem, {threads} threads\n\n")
+        f.write(" " + 69 * "-" + "\n" +
+                "       Standard Nuclear Orientation (Angstroms)\n" +
+                "    I     Atom           X                Y" +
+                "                Z\n" +
+                " " + 69 * "-" + "\n")
+        for j, a in enumerate(atoms):
+            f.write(f"    {j+1:<3d}    {a:<2s}     {math.sin(j):15.10f}  " +
+                    f"{math.cos(j):15.10f}  {0.1*j:15.10f}\n")
+        f.write(" " + 69 * "-" + "\n" +
+                f" There are {_alpha} alpha and {_beta} beta electrons\n" +
+                f" There are {nbasis} shells and {nbasis} basis functions\n\n")
+        for j in range(nbasis):
+            f.write(f" Shell {j+1:>5d}  exponent {math.exp(-j/50):12.6f}  " +
+                    f"contraction {math.cos(j):10.6f}\n")
+        f.write(" " + 39 * "-" + "\n" +
+                "  Cycle       Energy         DIIS error\n" +
+                " " + 39 * "-" + "\n")
+        _cycles = cycles if converge else 10 * cycles
+        for j in range(1, _cycles + 1):
+            _error = 10**(-8.5 * j / cycles) if converge \
+                else 1e-2 * (1 + j % 2)
+            _line = f" {j:>5d}    {_energy + 0.1/j:.10f}      {_error:.2e}  "
+            if converge and j == cycles:
+                _line = f" {j:>5d}    {_energy:.10f}      {_error:.2e}  " + \
+                    "00000 Convergence criterion met"
+            f.write(_line + "\n")
+        f.write(" " + 39 * "-" + "\n")
+        if not converge:
+            f.write(" SCF failed to converge\n")
+            return
+        f.write(f" SCF time:   CPU {cpu:.2f}s  wall {wall:.2f}s\n" +
+                f" SCF   energy in the final basis set = {_energy:.10f}\n" +
+                f" Total energy in the final basis set = {_energy:.10f}\n\n")
+        f.write(" " + 62 * "-" + "\n" +
+                "                    Orbital Energies (a.u.)\n" +
+                " " + 62 * "-" + "\n\n")
+        for _spin, _occupied in (("Alpha", _alpha), ("Beta", _beta)):
+            _levels = [_homo - 19 * (1 - (j + 1) / _occupied)**3
+                       for j in range(_occupied)]
+            _levels += [_lumo + 2 * (j / nbasis)**0.5
+                        for j in range(nbasis - _occupied)]
+            f.write(f" {_spin} MOs\n -- Occupied --\n" +
+                    orbitalBlock(_levels[:_occupied]) +
+                    " -- Virtual --\n" +
+                    orbitalBlock(_levels[_occupied:]) + "\n")
+        f.write(" " + 62 * "-" + "\n" +
+                "          Ground-State Mulliken Net Atomic Charges\n\n")
+        for j, a in enumerate(atoms):
+            f.write(f"    {j+1:<3d} {a:<2s}   {0.1*math.sin(j):12.6f}\n")
+        f.write(f"\n Total job time:  {wall:.2f}s(wall), {cpu:.2f}s(cpu)\n" +
+                f" {time.ctime()}\n\n" +
+                "        *************************************************" +
+                "************\n" +
+                "        *  Thank you very much for using Q-Chem.  " +
+                "Have a nice day.  *\n" +
+                "        *************************************************" +
+                "************\n")
+
+
+def burn(seconds: float) -> None:
+    """Keep one CPU busy for the given number of seconds."""
+    _end = time.process_time() + seconds
+    _x = 0.0
+    while time.process_time() < _end:
+        for j in range(10000):
+            _x += math.sqrt(j)
+
+
+def main(args: list[str]) -> int:
+    """Run a fake Qchem calculation with command line arguments args."""
+    _start = time.time()
+    _threads = int(args[args.index("-nt") + 1]) if "-nt" in args else 1
+    _files = [a for j, a in enumerate(args) if not a.startswith("-")
+              and (j == 0 or args[j-1] != "-nt")]
+    _inputFile, _outputFile = _files[0], _files[1]
+    with open(_inputFile, "r") as f:
+        _input = f.read()
+    _omega = re.search(r"^\s*omega\s+(\d+)", _input, re.M | re.I)
+    _omega = int(_omega[1]) / 1000 if _omega else 0.3
+    _alpha = re.search(r"^\s*X\s+HF\s+([\d.]+)", _input, re.M | re.I)
+    _alpha = float(_alpha[1]) if _alpha else 0.2
+    _charge, _multiplicity, _atoms = readMolecule(
+        _input, os.path.dirname(os.path.abspath(_inputFile)))
+
+    if "-save" in args and len(_files) > 2:
+        _scratch = os.path.join(os.environ.get("QCSCRATCH", "."), _files[2])
+        os.makedirs(_scratch, exist_ok=True)
+        with open(os.path.join(_scratch, "53.0"), "wb") as f:
+            f.write(bytes(1024))
+
+    time.sleep(float(os.environ.get("FAKEQCHEM_SLEEP", "0")))
+    burn(float(os.environ.get("FAKEQCHEM_BURN", "0")))
+    _fail = os.environ.get("FAKEQCHEM_FAIL", "")
+    _cure = os.environ.get("FAKEQCHEM_CURE", "")
+    _converge = _fail == "" or _fail not in _inputFile or \
+        (_cure != "" and _cure in _input)
+    writeOutput(_outputFile, _omega, _charge, _multiplicity, _atoms, _alpha,
+                nbasis=int(os.environ.get("FAKEQCHEM_NBASIS", "200")),
+                cycles=int(os.environ.get("FAKEQCHEM_CYCLES", "12")),
+                converge=_converge, threads=_threads,
+                wall=time.time() - _start, cpu=time.process_time())
+    return 0 if _converge else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -2,69 +2,156 @@
 RSHtune - Driver.
 
 Driver script for the RSHtune package
-DependenciesL os, sys, argparse, RSHtune (on PYTHONPATH)
+DependenciesL os, sys, shlex, argparse, RSHtune (on PYTHONPATH)
 """
 import os
 import sys
+import shlex
 import RSHtune as tune
 import argparse as argp
 
 
-def dryRun(inputFile: str, dir: str = "",
-           multiplicities: list[int] = []) -> None:
-    """Navigate to a directory and analyze tuning files already present."""
-    if dir != "":
-        os.chdir(dir)
-    _dirContents = os.listdir('.')
-    _omega = {float(i.split("_")[0].split('w')[1])/1000 for i in _dirContents
-              if i.split(".")[-1] == "out"
-              and f"{i.split('_')[0]}_neutral.out" in _dirContents
-              and f"{i.split('_')[0]}_anion.out" in _dirContents
-              and f"{i.split('_')[0]}_cation.out" in _dirContents}
-    print(f"#omega         J_OT\n{22*'#'}")
-    for _o in sorted(list(_omega)):
-        if multiplicities != []:
-            tuning_run = tune.QchemTuning(fname=inputFile,
-                                          omega=_o,
-                                          nthreads=1,
-                                          neutralSpMlt=multiplicities[0],
-                                          anionSpMlt=multiplicities[1],
-                                          cationSpMlt=multiplicities[2],
-                                          loggerLevel="WARNING")
+def dryRun(dir: str = "", cache=None, nprocs: int = 0,
+           journal=None, multiplicities: list[int] = [],
+           objective: str = "OT") -> None:
+    """Analyze tuning files already present in a directory, read-only."""
+    if journal is not None:
+        _progress = journal.progress()
+        print("# Journal: " + ", ".join(f"{n} {s}"
+                                        for s, n in _progress.items()))
+    analysis = tune.QchemAnalysis(dir=dir, nprocs=nprocs, cache=cache,
+                                  journal=journal,
+                                  multiplicities=multiplicities,
+                                  objective=objective, loggerLevel="WARNING")
+    print(f"#omega         J_{objective}\n{22*'#'}")
+    for _o, _jot in analysis.table().items():
+        if _jot is None:
+            print(f"{_o/1000:.3f}         ERROR")
         else:
-            tuning_run = tune.QchemTuning(fname=inputFile,
-                                          omega=_o,
-                                          nthreads=1,
-                                          loggerLevel="WARNING")
-        try:
-            tuning_run.parseOutput()
-            tuning_run.calculateOptimalTuning()
-            print(f"{_o:.3f}      {tuning_run.data['tuning']['JOT']:.4E}")
-        except ValueError:
-            print(f"{_o:.3f}         ERROR")
+            print(f"{_o/1000:.3f}      {_jot:.4E}")
+
+
+def interpolateTuning(dir: str = "", cache=None, nprocs: int = 0,
+                      journal=None, multiplicities: list[int] = [],
+                      objective: str = "OT") -> None:
+    """Estimate omega* between the finished tuning runs in a directory."""
+    interpolation = tune.QchemInterpolation(dir=dir, nprocs=nprocs,
+                                            cache=cache, journal=journal,
+                                            multiplicities=multiplicities,
+                                            objective=objective,
+                                            loggerLevel="WARNING")
+    try:
+        _opt = interpolation.optimum()
+    except ValueError as e:
+        print(f"# Cannot interpolate: {e}")
+        return
+    _error = "" if _opt["error"] is None else f" +- {_opt['error']:.4f}"
+    print(f"# Interpolated omega*={_opt['omega']:.4f}{_error} from " +
+          f"{_opt['points']} points, J_{objective}*={_opt['JOT']:.4E}")
+    print("# " + "".join(f"{k}={_opt[k]:.5f}  " for k in ("IP", "EA")
+                         if k in _opt) +
+          f"HOMO={_opt['HOMO']:.5f}  LUMO={_opt['LUMO']:.5f}")
+    if _opt["edge"]:
+        print("# omega* is at the edge of the scanned range, extend it!")
+
+
+def archiveResults(archive, dirs: dict, nprocs: int = 0,
+                   compress: str = None, multiplicities: dict = {}) -> None:
+    """Add the results in every molecule's directory to an archive.
+
+    multiplicities maps molecule names to the multiplicities of their
+    output files, by default the default ones.
+    """
+    _added = sum(archive.add(_name, _dir, nprocs,
+                             multiplicities.get(_name, []))
+                 for _name, _dir in dirs.items())
+    archive.write()
+    print(f"# Archived {_added} new results in <{archive.archiveFile}>, " +
+          f"{len(archive.rows)} in total.")
+    if compress is not None:
+        _count = sum(archive.compress(_name, _dir, compress,
+                                      multiplicities.get(_name, []))
+                     for _name, _dir in dirs.items())
+        archive.write()
+        print(f"# Compressed {_count} archived output files with " +
+              f"{compress}.")
+
+
+def printOptimalOmega(archive, objective: str = "OT") -> None:
+    """Print omega* of every molecule in an archive."""
+    print(f"#molecule             alpha  omega         J_{objective}\n" +
+          f"{47*'#'}")
+    for (_name, _alpha), (_o, _jot) in sorted(
+            archive.optimalOmega(objective).items(),
+            key=lambda i: (i[0][0], -1 if i[0][1] is None else i[0][1])):
+        _alpha = "  -  " if _alpha is None else f"{_alpha:.3f}"
+        print(f"{_name:<20s}  {_alpha}  {_o:.3f}      {_jot:.4E}")
+
+
+def serverTuning(url: str, inputFile: str, omega: list, dir: str = "",
+                 multiplicities: list[int] = [],
+                 objective: str = "OT") -> None:
+    """Submit a tuning request to a QchemService and print its results."""
+    client = tune.QchemClient(url)
+    _id = client.submit(os.path.join(dir, inputFile), omega, multiplicities,
+                        objective=objective)
+    print(f"# Submitted request {_id} to {url}.")
+    print(f"#omega         J_{objective}\n{22*'#'}")
+    for _result in client.stream(_id):
+        if "state" in _result:
+            break
+        if _result["JOT"] is None:
+            print(f"""{_result['omega']:.3f}         ERROR""", flush=True)
+        else:
+            print(f"""{_result['omega']:.3f}      {_result['JOT']:.4E}""",
+                  flush=True)
+    if _result.get("error"):
+        print(f"# Request failed: {_result['error']}")
+    elif _result.get("optimal") is not None:
+        print(f"# Optimal omega={_result['optimal']:.3f}")
+
+
+def printMetrics(metrics) -> None:
+    """Print the core-hours spent per omega and per charge state."""
+    _summary = metrics.summary()
+    print(f"# Core-hours recorded in <{metrics.metricsFile}>:")
+    for _o, _hours in sorted(_summary["omega"].items()):
+        print(f"#   omega={_o:.3f}  {_hours:10.4f}")
+    for _s, _hours in _summary["state"].items():
+        print(f"#   {_s:<11s}  {_hours:10.4f}")
 
 
 def singlePoint(inputFile: str, nthreads: int,
                 omega: float, dir: str = "",
-                multiplicities: list[int] = []) -> None:
+                multiplicities: list[int] = [],
+                concurrent: bool = False, cache=None,
+                journal=None, inline: bool = False,
+                monitor: dict = None, retries: list[dict] = [],
+                backend=None,
+                metrics=None, scratch=None,
+                objective: str = "OT") -> None:
     """Run a single tuning calculation for a given value of omega."""
-    if dir != "":
-        os.chdir(dir)
-    if multiplicities != []:
-        tuning_run = tune.QchemTuning(fname=inputFile,
-                                      omega=omega,
-                                      nthreads=nthreads,
-                                      neutralSpMlt=multiplicities[0],
-                                      anionSpMlt=multiplicities[1],
-                                      cationSpMlt=multiplicities[2],
-                                      loggerLevel="WARNING")
-    else:
-        tuning_run = tune.QchemTuning(fname=inputFile,
-                                      omega=omega,
-                                      nthreads=nthreads,
-                                      loggerLevel="WARNING")
-    print(f"#omega         J_OT\n{22*'#'}")
-    tuning_run.runCalculations()
+    inputFile = os.path.join(dir, inputFile)
+    if multiplicities == []:
+        multiplicities = [0, 0, 0]
+    tuning_run = tune.QchemTuning(fname=inputFile,
+                                  omega=omega,
+                                  nthreads=nthreads,
+                                  neutralSpMlt=multiplicities[0],
+                                  anionSpMlt=multiplicities[1],
+                                  cationSpMlt=multiplicities[2],
+                                  cache=cache,
+                                  journal=journal,
+                                  inline=inline,
+                                  metrics=metrics,
+                                  scratch=scratch,
+                                  objective=objective,
+                                  monitor=monitor,
+                                  retries=retries,
+                                  backend=backend,
+                                  loggerLevel="WARNING")
+    print(f"#omega         J_{objective}\n{22*'#'}")
+    tuning_run.runCalculations(concurrent=concurrent)
     try:
         tuning_run.parseOutput()
         tuning_run.calculateOptimalTuning()
@@ -75,32 +162,263 @@ def singlePoint(inputFile: str, nthreads: int,
 
 def rangeTuning(inputFile: str, nthreads: int,
                 omega: list, dir: str = "",
-                multiplicities: list[int] = []) -> None:
-    """Run a series of tuning calculation over a range of omega."""
-    if dir != "":
-        os.chdir(dir)
-    print(f"#omega         J_OT\n{22*'#'}")
+                multiplicities: list[int] = [],
+                concurrent: bool = False, cache=None,
+                warmStart: bool = False, journal=None,
+                inline: bool = False, monitor: dict = None,
+                retries: list[dict] = [], backend=None,
+                metrics=None, scratch=None,
+                objective: str = "OT") -> dict:
+    """Run a series of tuning calculation over a range of omega.
+
+    Returns J of the objective by omega, None where the calculations failed.
+    """
+    inputFile = os.path.join(dir, inputFile)
+    if multiplicities == []:
+        multiplicities = [0, 0, 0]
+    template = tune.QchemInput(fname=inputFile, loggerLevel="WARNING")
+    finished = {}
+    table = {}
+    print(f"#omega         J_{objective}\n{22*'#'}")
     for _o in omega:
-        if multiplicities != []:
-            tuning_run = tune.QchemTuning(fname=inputFile,
-                                          omega=_o,
-                                          nthreads=nthreads,
-                                          neutralSpMlt=multiplicities[0],
-                                          anionSpMlt=multiplicities[1],
-                                          cationSpMlt=multiplicities[2],
-                                          loggerLevel="WARNING")
-        else:
-            tuning_run = tune.QchemTuning(fname=inputFile,
-                                          omega=_o,
-                                          nthreads=nthreads,
-                                          loggerLevel="WARNING")
-        tuning_run.runCalculations()
+        tuning_run = tune.QchemTuning(fname=inputFile,
+                                      omega=_o,
+                                      nthreads=nthreads,
+                                      neutralSpMlt=multiplicities[0],
+                                      anionSpMlt=multiplicities[1],
+                                      cationSpMlt=multiplicities[2],
+                                      cache=cache,
+                                      journal=journal,
+                                      template=template,
+                                      inline=inline,
+                                      metrics=metrics,
+                                      scratch=scratch,
+                                      objective=objective,
+                                      monitor=monitor,
+                                      retries=retries,
+                                      backend=backend,
+                                      loggerLevel="WARNING")
+        if warmStart:
+            tuning_run.setGuesses(finished)
+        tuning_run.runCalculations(concurrent=concurrent)
+        if warmStart:
+            tuning_run.recordGuesses(finished)
         try:
             tuning_run.parseOutput()
             tuning_run.calculateOptimalTuning()
-            print(f"""{_o:.3f}      {tuning_run.data['tuning']['JOT']:.4E}""")
+            table[_o] = tuning_run.data['tuning']['JOT']
+            print(f"""{_o:.3f}      {table[_o]:.4E}""")
         except ValueError:
+            table[_o] = None
             print(f"""{_o:.3f}         ERROR""")
+    return table
+
+
+def scheduledTuning(inputFile: str, ncores: int,
+                    omega: list, dir: str = "",
+                    multiplicities: list[int] = [],
+                    minThreads: int = 1, cache=None,
+                    warmStart: bool = False, journal=None,
+                    inline: bool = False, monitor: dict = None,
+                    retries: list[dict] = [], backend=None,
+                    metrics=None, scratch=None,
+                    objective: str = "OT") -> dict:
+    """Run a range of tuning calculations packed onto a core budget.
+
+    Returns J of the objective by omega, None where the calculations failed.
+    """
+    inputFile = os.path.join(dir, inputFile)
+    if multiplicities == []:
+        multiplicities = [0, 0, 0]
+    if warmStart:
+        omega = sorted(omega)
+    template = tune.QchemInput(fname=inputFile, loggerLevel="WARNING")
+    scheduler = tune.QchemScheduler(ncores=ncores, minThreads=minThreads,
+                                    warmStart=warmStart,
+                                    journal=journal,
+                                    monitor=monitor,
+                                    retries=retries,
+                                    backend=backend,
+                                    scratch=scratch,
+                                    loggerLevel="WARNING")
+    tuning_runs = {}
+    table = {}
+    for _o in omega:
+        tuning_run = tune.QchemTuning(fname=inputFile,
+                                      omega=_o,
+                                      nthreads=minThreads,
+                                      neutralSpMlt=multiplicities[0],
+                                      anionSpMlt=multiplicities[1],
+                                      cationSpMlt=multiplicities[2],
+                                      cache=cache,
+                                      journal=journal,
+                                      template=template,
+                                      inline=inline,
+                                      metrics=metrics,
+                                      scratch=scratch,
+                                      objective=objective,
+                                      scheduler=scheduler,
+                                      loggerLevel="WARNING")
+        tuning_runs[tuning_run.omega] = tuning_run
+
+    def report(_o: float, calcs: dict) -> None:
+        tuning_run = tuning_runs[_o]
+        tuning_run.collectTimings(calcs)
+        try:
+            tuning_run.parseOutput()
+            tuning_run.calculateOptimalTuning()
+            table[_o] = tuning_run.data['tuning']['JOT']
+            print(f"""{_o:.3f}      {table[_o]:.4E}""", flush=True)
+        except ValueError:
+            table[_o] = None
+            print(f"""{_o:.3f}         ERROR""", flush=True)
+
+    print(f"#omega         J_{objective}\n{22*'#'}")
+    for _o, tuning_run in tuning_runs.items():
+        if tuning_run.scheduleCalculations(scheduler) == 0:
+            report(_o, {})
+    scheduler.run(callback=report)
+    return table
+
+
+def optimizeTuning(inputFile: str, nthreads: int,
+                   omega: float, dir: str = "",
+                   multiplicities: list[int] = [],
+                   concurrent: bool = False,
+                   tolerance: float = 0.001,
+                   step: float = 0.05, cache=None,
+                   warmStart: bool = False, journal=None,
+                   inline: bool = False, monitor: dict = None,
+                   retries: list[dict] = [], backend=None,
+                   metrics=None, scratch=None,
+                   objective: str = "OT") -> dict:
+    """Minimize the optimal tuning error starting from a guess for omega.
+
+    Returns J of the objective by omega of every evaluated point.
+    """
+    inputFile = os.path.join(dir, inputFile)
+    if multiplicities == []:
+        multiplicities = [0, 0, 0]
+    optimizer = tune.QchemOptimizer(fname=inputFile,
+                                    nthreads=nthreads,
+                                    neutralSpMlt=multiplicities[0],
+                                    anionSpMlt=multiplicities[1],
+                                    cationSpMlt=multiplicities[2],
+                                    tolerance=tolerance,
+                                    step=step,
+                                    concurrent=concurrent,
+                                    warmStart=warmStart,
+                                    cache=cache,
+                                    journal=journal,
+                                    inline=inline,
+                                    metrics=metrics,
+                                    scratch=scratch,
+                                    objective=objective,
+                                    monitor=monitor,
+                                    retries=retries,
+                                    backend=backend,
+                                    loggerLevel="WARNING")
+    try:
+        _best = optimizer.minimize(omega)
+    except RuntimeError as e:
+        _best = e
+    print(f"#omega         J_{objective}\n{22*'#'}")
+    for _o in sorted(optimizer.points):
+        print(f"""{_o/1000:.3f}      {optimizer.points[_o]:.4E}""")
+    if isinstance(_best, RuntimeError):
+        print(f"# {_best}")
+        if optimizer.points:
+            _o = min(optimizer.points, key=optimizer.points.get)
+            print(f"# Best omega so far={_o/1000:.3f}.")
+        sys.exit(1)
+    print(f"# Optimal omega={_best:.3f} after {len(optimizer.points)} " +
+          "tuning calculations.")
+    return {_o/1000: _j for _o, _j in optimizer.points.items()}
+
+
+def optimizeTuning2D(inputFile: str, ncores: int,
+                     alpha: float, omega: float, dir: str = "",
+                     multiplicities: list[int] = [],
+                     minThreads: int = 1,
+                     tolerance: tuple[float, float] = (0.01, 0.001),
+                     step: tuple[float, float] = (0.05, 0.05), cache=None,
+                     warmStart: bool = False, journal=None,
+                     inline: bool = False, monitor: dict = None,
+                     retries: list[dict] = [], backend=None,
+                     metrics=None, scratch=None,
+                     objective: str = "OT") -> None:
+    """Minimize the optimal tuning error over alpha and omega."""
+    inputFile = os.path.join(dir, inputFile)
+    if multiplicities == []:
+        multiplicities = [0, 0, 0]
+    optimizer = tune.QchemOptimizer2D(fname=inputFile,
+                                      ncores=ncores,
+                                      minThreads=minThreads,
+                                      neutralSpMlt=multiplicities[0],
+                                      anionSpMlt=multiplicities[1],
+                                      cationSpMlt=multiplicities[2],
+                                      tolerance=tolerance,
+                                      step=step,
+                                      warmStart=warmStart,
+                                      cache=cache,
+                                      journal=journal,
+                                      inline=inline,
+                                      metrics=metrics,
+                                      scratch=scratch,
+                                      objective=objective,
+                                      monitor=monitor,
+                                      retries=retries,
+                                      backend=backend,
+                                      loggerLevel="WARNING")
+    if alpha is None:
+        alpha = optimizer.template.xcWeights().get(("X", "HF"), 0.2)
+    try:
+        _best = optimizer.minimize(alpha, omega)
+    except RuntimeError as e:
+        _best = e
+    print(f"#alpha  omega         J_{objective}\n{29*'#'}")
+    for _a, _o in sorted(optimizer.points):
+        print(f"""{_a/1000:.3f}  {_o/1000:.3f}      """ +
+              f"""{optimizer.points[(_a, _o)]:.4E}""")
+    if isinstance(_best, RuntimeError):
+        print(f"# {_best}")
+        if optimizer.points:
+            _a, _o = min(optimizer.points, key=optimizer.points.get)
+            print(f"# Best alpha={_a/1000:.3f}, omega={_o/1000:.3f} so far.")
+        sys.exit(1)
+    print(f"# Optimal alpha={_best[0]:.3f}, omega={_best[1]:.3f} after " +
+          f"{len(optimizer.points)} tuning calculations.")
+
+
+def batchTuning(manifest: str, ncores: int, dir: str = "",
+                minThreads: int = 1, cache=None,
+                warmStart: bool = False, journal=None,
+                inline: bool = False, monitor: dict = None,
+                retries: list[dict] = [], backend=None,
+                metrics=None, scratch=None, objective: str = "OT"):
+    """Tune every molecule of a manifest on one shared core budget.
+
+    Returns the QchemBatch with its results.
+    """
+    batch = tune.QchemBatch(manifest=manifest, ncores=ncores, root=dir,
+                            minThreads=minThreads, warmStart=warmStart,
+                            cache=cache, journal=journal, inline=inline,
+                            monitor=monitor, retries=retries,
+                            backend=backend, metrics=metrics,
+                            scratch=scratch, objective=objective,
+                            loggerLevel="WARNING")
+    results = batch.run()
+    print(f"#molecule             omega         J_{objective}\n{40*'#'}")
+    for _name, _table in results.items():
+        for _o in sorted(_table):
+            if _table[_o] is None:
+                print(f"{_name:<20s}  {_o:.3f}         ERROR")
+            else:
+                print(f"{_name:<20s}  {_o:.3f}      {_table[_o]:.4E}")
+    print(f"#{39*'#'}\n# Optimal omega:")
+    for _name, _o in batch.optimalOmega().items():
+        print(f"# {_name:<20s}  " + ("ERROR" if _o is None else f"{_o:.3f}"))
+    return batch
 
 
 if __name__ == "__main__":
@@ -108,37 +426,312 @@ if __name__ == "__main__":
 
     parser = argp.ArgumentParser(description="""Driver for the RSHtune package
                                  for tuning RSH functionals using QChem.""")
-    parser.add_argument("--inputFile", type=str, required=True, metavar="file",
+    parser.add_argument("--inputFile", type=str, default="", metavar="file",
                         help="NEUTRAL calculation input file. Respects --dir!")
+    parser.add_argument("--batch", type=str, default="", metavar="file",
+                        help="JSON manifest of molecules to tune together.")
     parser.add_argument("--numThreads", type=int, default=1,
                         metavar="int", help="Number of CPU threads for Qchem.")
     parser.add_argument("--omega", type=float, default=None,
                         metavar="float", help="Single value for omega.")
     parser.add_argument("--omegaRange", type=float, nargs="*",
-                        metavar="float", help="Range of omega values.")
+                        metavar="float",
+                        help="Range of omega values. Without values: " +
+                        "around the predicted omega*")
     parser.add_argument("--dir", type=str, default="", metavar="dir",
                         help="Working directory if different to CWD.")
     parser.add_argument("--multiplicities", nargs=3, type=int, default=[],
                         metavar="int int int",
                         help="Spin-multiplicities: neutral anion cation.")
+    parser.add_argument("--objective", type=str, default="OT",
+                        choices=list(tune.OBJECTIVES),
+                        help="Tune IP and EA (OT), or only IP or EA.")
+    parser.add_argument("--concurrent", action="store_true", default=False,
+                        help="Run neutral, anion and cation concurrently.")
+    parser.add_argument("--numCores", type=int, default=0, metavar="int",
+                        help="Core budget for scheduling a whole omega range.")
+    parser.add_argument("--minThreads", type=int, default=1, metavar="int",
+                        help="Minimum threads per scheduled calculation.")
+    parser.add_argument("--optimize", action="store_true", default=False,
+                        help="Minimize J starting from --omega.")
+    parser.add_argument("--omegaTol", type=float, default=0.001,
+                        metavar="float", help="Tolerance for --optimize.")
+    parser.add_argument("--omegaStep", type=float, default=None,
+                        metavar="float",
+                        help="Initial bracketing step for --optimize. " +
+                        "Default: 0.05 or the predicted bracket")
+    parser.add_argument("--tuneAlpha", action="store_true", default=False,
+                        help="Also tune the short-range HF fraction with " +
+                        "--optimize.")
+    parser.add_argument("--alpha", type=float, default=None,
+                        metavar="float",
+                        help="Starting HF fraction for --tuneAlpha. " +
+                        "Default: from input")
+    parser.add_argument("--alphaTol", type=float, default=0.01,
+                        metavar="float", help="Tolerance for --tuneAlpha.")
+    parser.add_argument("--alphaStep", type=float, default=0.05,
+                        metavar="float",
+                        help="Initial search step for --tuneAlpha.")
+    parser.add_argument("--cache", type=str, default="", metavar="file",
+                        help="SQLite result cache. Respects --dir!")
+    parser.add_argument("--clearCache", action="store_true", default=False,
+                        help="Remove all results from --cache first.")
+    parser.add_argument("--cacheMaxAge", type=float, default=None,
+                        metavar="days",
+                        help="Evict cached results unused for this long.")
+    parser.add_argument("--warmStart", action="store_true", default=False,
+                        help="Read SCF guesses from the nearest finished " +
+                        "omega.")
+    parser.add_argument("--journal", type=str, default="", metavar="file",
+                        help="Job journal for resuming scans. Respects --dir!")
+    parser.add_argument("--inline", action="store_true", default=False,
+                        help="Write geometries inline instead of .mol files.")
+    parser.add_argument("--monitor", action="store_true", default=False,
+                        help="Abort calculations whose SCF stalls.")
+    parser.add_argument("--stallCycles", type=int, default=30, metavar="int",
+                        help="SCF cycles without progress for --monitor.")
+    parser.add_argument("--stallRatio", type=float, default=0.5,
+                        metavar="float",
+                        help="Error reduction counting as progress.")
+    parser.add_argument("--oscillation", type=float, default=0.4,
+                        metavar="float",
+                        help="Rising error fraction reported as oscillation.")
+    parser.add_argument("--retries", type=int, default=0, metavar="int",
+                        help="Reruns of failed calculations with other SCF " +
+                        "settings.")
+    parser.add_argument("--backend", type=str, default="local",
+                        choices=list(tune.BACKENDS),
+                        help="Run calculations locally or as cluster jobs.")
+    parser.add_argument("--backendOptions", type=str, default="",
+                        metavar="str",
+                        help="Extra job script directives for --backend.")
+    parser.add_argument("--metrics", type=str, default="", metavar="file",
+                        help="Record job performance as .jsonl or .csv. " +
+                        "Respects --dir!")
+    parser.add_argument("--scratchDir", type=str, default="", metavar="dir",
+                        help="Fast local path for Qchem scratch, pruned to " +
+                        "restart files.")
+    parser.add_argument("--scratchQuota", type=float, default=0,
+                        metavar="GB",
+                        help="Hold back jobs while scratch exceeds this.")
+    parser.add_argument("--compressScratch", action="store_true",
+                        default=False,
+                        help="Compress the restart files kept in scratch.")
+    parser.add_argument("--archive", type=str, default="", metavar="file",
+                        help="Add parsed results to a compact table. " +
+                        "Respects --dir!")
+    parser.add_argument("--compressOutputs", type=str, default=None,
+                        choices=["gzip", "zstd"],
+                        help="Compress output files once in --archive.")
+    parser.add_argument("--omegaStar", action="store_true", default=False,
+                        help="Print omega* of all molecules in --archive.")
+    parser.add_argument("--serve", action="store_true", default=False,
+                        help="Run a tuning service on --numCores for " +
+                        "clients. Respects --dir!")
+    parser.add_argument("--server", type=str, default="", metavar="url",
+                        help="Submit --omega/--omegaRange to a service.")
+    parser.add_argument("--port", type=int, default=8765, metavar="int",
+                        help="Port of the local service for --serve.")
+    parser.add_argument("--history", type=str, default="", metavar="file",
+                        help="omega* of tuned molecules for predicting " +
+                        "starting omegas. Default: $RSHTUNE_HISTORY or " +
+                        "~/.RSHtune_history.json")
+    parser.add_argument("--noPredict", action="store_true", default=False,
+                        help="Neither predict omega from nor record " +
+                        "omega* in --history.")
     parser.add_argument("--dry", action="store_true", default=False,
                         help="Analyze files present in directory.")
+    parser.add_argument("--interpolate", action="store_true", default=False,
+                        help="Estimate omega* between finished omegas.")
+    parser.add_argument("--numProcs", type=int, default=0, metavar="int",
+                        help="Processes for parsing with --dry. Default: all")
 
     args = parser.parse_args()
 
+    if not args.inputFile and not args.batch and not args.archive and \
+            not args.serve:
+        parser.error("one of --inputFile, --batch or --archive is required")
+    if (args.compressOutputs or args.omegaStar) and not args.archive:
+        parser.error("--compressOutputs and --omegaStar need --archive")
+
+    cache = None
+    if args.cache:
+        cache = tune.QchemCache(os.path.join(args.dir, args.cache),
+                                loggerLevel="WARNING")
+        if args.clearCache:
+            cache.clear()
+        if args.cacheMaxAge is not None:
+            cache.evict(maxAge=args.cacheMaxAge)
+
+    journal = None
+    if args.journal:
+        journal = tune.QchemJournal(os.path.join(args.dir, args.journal),
+                                    loggerLevel="WARNING")
+
+    monitor = None
+    if args.monitor:
+        monitor = {"window": args.stallCycles, "ratio": args.stallRatio,
+                   "oscillation": args.oscillation}
+    retries = list(tune.RETRIES[:args.retries])
+
+    backend = None
+    if args.backend != "local":
+        backend = tune.BACKENDS[args.backend](
+            options=shlex.split(args.backendOptions), dir=args.dir,
+            loggerLevel="WARNING")
+
+    metrics = None
+    if args.metrics:
+        metrics = tune.QchemMetrics(os.path.join(args.dir, args.metrics),
+                                    loggerLevel="WARNING")
+
+    scratch = None
+    if args.scratchDir or args.scratchQuota or args.compressScratch:
+        scratch = tune.QchemScratch(args.scratchDir,
+                                    compress=args.compressScratch,
+                                    quota=args.scratchQuota,
+                                    loggerLevel="WARNING")
+
+    if args.serve:
+        service = tune.QchemService(root=args.dir,
+                                    ncores=args.numCores if args.numCores
+                                    else args.numThreads,
+                                    port=args.port,
+                                    minThreads=args.minThreads,
+                                    warmStart=args.warmStart, cache=cache,
+                                    journal=journal, inline=args.inline,
+                                    monitor=monitor, retries=retries,
+                                    backend=backend, metrics=metrics,
+                                    scratch=scratch, loggerLevel="INFO")
+        service.serve()
+        sys.exit()
+
+    if args.server:
+        if not (args.omega or args.omegaRange):
+            sys.exit("Choose --omega or --omegaRange for --server")
+        serverTuning(args.server, args.inputFile,
+                     [args.omega] if args.omega else args.omegaRange,
+                     args.dir, args.multiplicities, args.objective)
+        sys.exit()
+
+    # Only scans and optimizations predict omega* or record it
+    predictor = None
+    if not args.noPredict and (args.batch or args.optimize or
+                               args.omegaRange is not None):
+        predictor = tune.QchemPredictor(args.history, loggerLevel="WARNING")
+
+    if args.batch:
+        _cores = args.numCores if args.numCores else args.numThreads
+        print(f"# Batch tuning of <{args.batch}> on {_cores} cores.")
+        batch = batchTuning(args.batch, _cores, args.dir, args.minThreads,
+                            cache, args.warmStart, journal, args.inline,
+                            monitor, retries, backend, metrics, scratch,
+                            args.objective)
+        if predictor is not None:
+            for _name, _table in batch.results.items():
+                tuning_run = next((t for (n, _), t
+                                   in batch.tuningRuns.items()
+                                   if n == _name), None)
+                if tuning_run is not None and tuning_run.objective == "OT":
+                    predictor.recordScan(tuning_run.inputFile, _table)
+
     if args.dry:
         print(f"# Printing completed tuning runs in directory <{args.dir}>")
-        dryRun(args.inputFile, args.dir, args.multiplicities)
+        dryRun(args.dir, cache, args.numProcs, journal, args.multiplicities,
+               args.objective)
 
     if args.omega and args.omegaRange:
         sys.exit("Choose either --omega or --omegaRange")
 
-    if args.omega:
+    _step = args.omegaStep if args.omegaStep else 0.05
+    if predictor is not None and args.inputFile and \
+            ((args.optimize and not args.omega) or args.omegaRange == []):
+        prediction = predictor.predict(os.path.join(args.dir,
+                                                    args.inputFile))
+        if prediction is not None:
+            _low, _high = prediction[1]
+            print(f"# Predicted omega*={prediction[0]:.3f} in " +
+                  f"[{_low:.3f}, {_high:.3f}] from <{predictor.historyFile}>.")
+            if args.optimize and not args.omega:
+                args.omega = prediction[0]
+                if not args.omegaStep:
+                    _step = max(0.01, round((_high - _low) / 2, 3))
+            elif args.omegaRange == []:
+                args.omegaRange = sorted({round(_low + j * (_high - _low) /
+                                                4, 3) for j in range(5)})
+    if args.omegaRange == []:
+        sys.exit("Give values for --omegaRange, no omega* to predict from")
+
+    if args.optimize and args.tuneAlpha:
+        _guess = args.omega if args.omega else 0.3
+        _cores = args.numCores if args.numCores else args.numThreads
+        print(f"# Optimizing alpha and omega starting from omega={_guess} " +
+              f"on {_cores} cores.")
+        optimizeTuning2D(args.inputFile, _cores, args.alpha, _guess,
+                         args.dir, args.multiplicities, args.minThreads,
+                         (args.alphaTol, args.omegaTol),
+                         (args.alphaStep, _step), cache,
+                         args.warmStart, journal, args.inline, monitor,
+                         retries, backend, metrics, scratch, args.objective)
+    elif args.optimize:
+        _guess = args.omega if args.omega else 0.3
+        print(f"# Optimizing omega starting from omega={_guess}.")
+        table = optimizeTuning(args.inputFile, args.numThreads, _guess,
+                               args.dir, args.multiplicities,
+                               args.concurrent, args.omegaTol, _step, cache,
+                               args.warmStart, journal, args.inline, monitor,
+                               retries, backend, metrics, scratch,
+                               args.objective)
+        if predictor is not None and args.objective == "OT":
+            predictor.recordScan(os.path.join(args.dir, args.inputFile),
+                                 table)
+    elif args.omega:
         print(f"# Single point tuning claculation at omega={args.omega}.")
         singlePoint(args.inputFile, args.numThreads, args.omega, args.dir,
-                    args.multiplicities)
+                    args.multiplicities, args.concurrent, cache, journal,
+                    args.inline, monitor, retries, backend,
+                    metrics, scratch, args.objective)
 
-    if args.omegaRange:
+    if args.omegaRange and args.numCores:
+        print(f"# Tuning calculations over range omega={args.omegaRange} " +
+              f"on {args.numCores} cores.")
+        table = scheduledTuning(args.inputFile, args.numCores,
+                                args.omegaRange, args.dir,
+                                args.multiplicities, args.minThreads, cache,
+                                args.warmStart, journal, args.inline,
+                                monitor, retries, backend, metrics, scratch,
+                                args.objective)
+    elif args.omegaRange:
         print(f"# Tuning calculations over range omega={args.omegaRange}.")
-        rangeTuning(args.inputFile, args.numThreads, args.omegaRange, args.dir,
-                    args.multiplicities)
+        table = rangeTuning(args.inputFile, args.numThreads, args.omegaRange,
+                            args.dir, args.multiplicities, args.concurrent,
+                            cache, args.warmStart, journal, args.inline,
+                            monitor, retries, backend, metrics, scratch,
+                            args.objective)
+    if args.omegaRange and predictor is not None and args.objective == "OT":
+        predictor.recordScan(os.path.join(args.dir, args.inputFile), table)
+
+    if metrics is not None and metrics.records:
+        printMetrics(metrics)
+
+    if args.interpolate:
+        interpolateTuning(args.dir, cache, args.numProcs, journal,
+                          args.multiplicities, args.objective)
+
+    if args.archive:
+        archive = tune.QchemArchive(os.path.join(args.dir, args.archive),
+                                    loggerLevel="WARNING")
+        if args.batch:
+            batch = tune.QchemBatch(manifest=args.batch, ncores=1,
+                                    root=args.dir, loggerLevel="WARNING")
+            _dirs = {m["name"]: os.path.join(batch.root, m["name"])
+                     for m in batch.molecules}
+            _multi = {m["name"]: m.get("multiplicities", [])
+                      for m in batch.molecules}
+        else:
+            _dirs = {os.path.basename(os.path.abspath(args.dir)): args.dir}
+            _multi = {_name: args.multiplicities for _name in _dirs}
+        archiveResults(archive, _dirs, args.numProcs, args.compressOutputs,
+                       _multi)
+        if args.omegaStar:
+            printOptimalOmega(archive, args.objective)
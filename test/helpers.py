@@ -0,0 +1,39 @@
+"""
+RSHtune Testing - Helpers.
+
+Common fixture of the tests that run bench/fakeqchem. Importing this
+module puts the repository, and so RSHtune, on sys.path.
+Dependencies: os, sys, shutil, tempfile, unittest
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+BENCH = os.path.join(os.path.dirname(TEST), "bench")
+sys.path.insert(0, os.path.dirname(TEST))
+
+
+class FakeQchemTestCase(unittest.TestCase):
+    """Tests in a temporary copy of the test input, fake qchem on PATH."""
+
+    def setUp(self) -> None:
+        """Copy the test input to a temporary directory."""
+        self.dir = tempfile.mkdtemp()
+        for fname in ("RSH.in", "water.mol"):
+            shutil.copy(os.path.join(TEST, fname), self.dir)
+        self.cwd = os.getcwd()
+        self.environ = dict(os.environ)
+        os.environ["PATH"] = BENCH + os.pathsep + os.environ["PATH"]
+        os.environ["QCSCRATCH"] = os.path.join(self.dir, "scratch")
+        os.environ["RSHTUNE_HISTORY"] = os.path.join(self.dir,
+                                                     "history.json")
+
+    def tearDown(self) -> None:
+        """Restore the environment and remove the temporary directory."""
+        os.chdir(self.cwd)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.dir)
@@ -0,0 +1,120 @@
+"""
+RSHtune Testing - Analysis.
+
+Read-only analysis of scanned directories, with a journal or with other
+multiplicities and objectives.
+Dependencies: os, shutil, tempfile, unittest
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+from RSHtune.tuning import optimalTuningError
+
+
+class JournalAnalysisTest(FakeQchemTestCase):
+    """--dry with --dir and --journal, run from another directory."""
+
+    def setUp(self) -> None:
+        """Scan two omegas with the fake qchem, journaled."""
+        super().setUp()
+        self.other = tempfile.mkdtemp()
+        self.journalFile = os.path.join(self.dir, "j.json")
+        journal = tune.QchemJournal(self.journalFile, loggerLevel="WARNING")
+        for _o in (0.26, 0.28):
+            tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                             omega=_o, journal=journal,
+                             loggerLevel="WARNING").runCalculations()
+
+    def tearDown(self) -> None:
+        """Remove the temporary directories."""
+        super().tearDown()
+        shutil.rmtree(self.other)
+
+    def testKeys(self) -> None:
+        """Jobs are recorded relative to the journal."""
+        journal = tune.QchemJournal(self.journalFile, loggerLevel="WARNING")
+        self.assertIn("w280_neutral", journal.jobs)
+        os.chdir(self.other)
+        self.assertEqual(journal.state(os.path.join(self.dir,
+                                                    "w280_neutral")), "done")
+
+    def testRunningSkipped(self) -> None:
+        """A job the journal records as running is not tabulated."""
+        journal = tune.QchemJournal(self.journalFile, loggerLevel="WARNING")
+        journal.mark(os.path.join(self.dir, "w280_neutral"), "running")
+        os.chdir(self.other)
+        analysis = tune.QchemAnalysis(dir=self.dir, nprocs=1,
+                                      journal=tune.QchemJournal(
+                                          self.journalFile,
+                                          loggerLevel="WARNING"),
+                                      loggerLevel="WARNING")
+        _table = analysis.table()
+        self.assertIsNone(_table[280])
+        self.assertIsNotNone(_table[260])
+
+    def testCacheUntouched(self) -> None:
+        """Analysis reads the cache without writing to it."""
+        cache = tune.QchemCache(os.path.join(self.dir, "RSHtune.db"),
+                                loggerLevel="WARNING")
+        _key = cache.key(os.path.join(self.dir, "w260_neutral.in"))
+        cache.put(*_key, {"SCFenergy": -76.0, "HOMO": -0.5, "LUMO": 0.1})
+        cache.db.execute("UPDATE results SET accessed = 0")
+        cache.db.commit()
+        analysis = tune.QchemAnalysis(dir=self.dir, nprocs=1, cache=cache,
+                                      loggerLevel="WARNING")
+        self.assertIn("neutral", analysis.cachedResults(260))
+        analysis.table()
+        self.assertFalse(cache.db.in_transaction)
+        _accessed = cache.db.execute("SELECT accessed FROM results")
+        self.assertEqual(_accessed.fetchone()[0], 0)
+
+
+class MultiplicityAnalysisTest(FakeQchemTestCase):
+    """--dry and --interpolate of a scan with other multiplicities."""
+
+    def setUp(self) -> None:
+        """Scan four omegas with a quartet anion."""
+        super().setUp()
+        for _o in (0.25, 0.26, 0.27, 0.28):
+            tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                             omega=_o, anionSpMlt=4,
+                             loggerLevel="WARNING").runCalculations()
+
+    def testMultiplicities(self) -> None:
+        """Outputs are found under the names of their multiplicities."""
+        _default = tune.QchemAnalysis(dir=self.dir, nprocs=1,
+                                      loggerLevel="WARNING")
+        self.assertEqual(_default.table(), {})
+        analysis = tune.QchemAnalysis(dir=self.dir, nprocs=1,
+                                      multiplicities=[1, 4, 2],
+                                      loggerLevel="WARNING")
+        self.assertEqual(sorted(analysis.table()), [250, 260, 270, 280])
+        interpolation = tune.QchemInterpolation(dir=self.dir, nprocs=1,
+                                                multiplicities=[0, 4, 0],
+                                                loggerLevel="WARNING")
+        self.assertEqual(interpolation.optimum()["points"], 4)
+
+    def testObjective(self) -> None:
+        """J of the IP objective only needs the neutral and the cation."""
+        for fname in os.listdir(self.dir):
+            if "anion" in fname:
+                os.remove(os.path.join(self.dir, fname))
+        analysis = tune.QchemAnalysis(dir=self.dir, nprocs=1,
+                                      objective="IP", loggerLevel="WARNING")
+        _data = analysis.parse()[270]
+        self.assertEqual(set(_data), {"neutral", "cation"})
+        self.assertAlmostEqual(analysis.table()[270],
+                               optimalTuningError(_data, "IP")["JOT"])
+        _optimum = tune.QchemInterpolation(dir=self.dir, nprocs=1,
+                                           objective="IP",
+                                           loggerLevel="WARNING").optimum()
+        self.assertIn("IP", _optimum)
+        self.assertNotIn("EA", _optimum)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+RSHtune Testing - Archive.
+
+Archiving and compressing the outputs of a scan with the fake qchem.
+Dependencies: os, shutil, unittest
+"""
+import os
+import shutil
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+
+
+class ArchiveTest(FakeQchemTestCase):
+    """Rows follow the output files they were read from."""
+
+    def setUp(self) -> None:
+        """Scan two omegas with the fake qchem."""
+        super().setUp()
+        for _o in (0.26, 0.28):
+            tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                             omega=_o, loggerLevel="WARNING"
+                             ).runCalculations()
+        self.fname = os.path.join(self.dir, "RSHtune.rsha")
+        self.archive = tune.QchemArchive(self.fname, loggerLevel="WARNING")
+        self.assertEqual(self.archive.add("water", self.dir, nprocs=1), 6)
+
+    def rewrite(self, jname: str) -> None:
+        """Replace an output with one of another omega and size."""
+        _output = os.path.join(self.dir, f"{jname}.out")
+        shutil.copyfile(os.path.join(self.dir, "w260_neutral.out"), _output)
+        with open(_output, "a") as f:
+            f.write("\n")
+
+    def testChanged(self) -> None:
+        """Only outputs that changed since they were archived are parsed."""
+        self.assertEqual(self.archive.add("water", self.dir, nprocs=1), 0)
+        _energy = self.archive.rows[(0, -1, 280, 0)][0]
+        self.rewrite("w280_neutral")
+        self.assertEqual(self.archive.add("water", self.dir, nprocs=1), 1)
+        self.assertNotEqual(self.archive.rows[(0, -1, 280, 0)][0], _energy)
+        self.archive.write()
+        self.assertEqual(tune.QchemArchive(self.fname,
+                                           loggerLevel="WARNING").rows,
+                         self.archive.rows)
+
+    def testCompress(self) -> None:
+        """Outputs changed since they were archived stay uncompressed."""
+        self.rewrite("w280_cation")
+        self.assertEqual(self.archive.compress("water", self.dir), 5)
+        self.assertTrue(os.path.isfile(os.path.join(self.dir,
+                                                    "w280_cation.out")))
+        self.assertEqual(self.archive.add("water", self.dir, nprocs=1), 1)
+        self.assertEqual(self.archive.compress("water", self.dir), 1)
+        self.assertEqual(self.archive.add("water", self.dir, nprocs=1), 0)
+        self.assertEqual(len(self.archive.rows), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+RSHtune Testing - Backend.
+
+Job arrays run through the fake sbatch/squeue and qsub/qstat of bench/.
+Dependencies: os, unittest
+"""
+import os
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+
+
+class SlurmArrayTest(FakeQchemTestCase):
+    """A triplet submitted as one array and followed by ArrayJob.poll."""
+
+    backend = tune.SlurmBackend
+
+    def setUp(self) -> None:
+        """Copy the test input to a temporary directory."""
+        super().setUp()
+        os.environ["FAKEBATCH_DIR"] = os.path.join(self.dir, "batch")
+
+    def tune(self, grace: float) -> dict:
+        """Run the triplet of one omega, return the exit codes."""
+        backend = self.backend(dir=self.dir, interval=0.1, grace=grace,
+                               loggerLevel="CRITICAL")
+        tuning_run = tune.QchemTuning(fname=os.path.join(self.dir,
+                                                         "RSH.in"),
+                                      omega=0.27, nthreads=3,
+                                      backend=backend,
+                                      loggerLevel="CRITICAL")
+        tuning_run.runCalculations(concurrent=True)
+        self.assertEqual(backend.arrays, 1)
+        self.tuningRun = tuning_run
+        return {c.process.returncode for c in tuning_run.calcs.values()}
+
+    def testArray(self) -> None:
+        """All tasks of the array finish and are parsed."""
+        self.assertEqual(self.tune(grace=5.0), {0})
+        self.tuningRun.parseOutput()
+        self.tuningRun.calculateOptimalTuning()
+        self.assertLess(self.tuningRun.data["tuning"]["JOT"], 1e-4)
+
+    def testGrace(self) -> None:
+        """An exit code written after the task left the queue is used."""
+        os.environ["FAKEBATCH_LAG"] = "0.5"
+        self.assertEqual(self.tune(grace=10.0), {0})
+
+    def testLost(self) -> None:
+        """A task that leaves the queue without an exit code failed."""
+        os.environ["FAKEBATCH_LOST"] = "1"
+        self.assertEqual(self.tune(grace=0.3), {-1})
+
+
+class PbsArrayTest(SlurmArrayTest):
+    """The same with qsub and qstat."""
+
+    backend = tune.PbsBackend
+
+
+if __name__ == "__main__":
+    unittest.main()
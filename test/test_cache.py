@@ -0,0 +1,110 @@
+"""
+RSHtune Testing - Cache.
+
+Keys, eviction and invalidation of the result cache, and tuning runs
+served from it.
+Dependencies: os, time, shutil, unittest
+"""
+import os
+import time
+import shutil
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+
+RESULT = {"SCFenergy": -76.0, "HOMO": -0.3, "LUMO": 0.1, "wallTime": 1.0}
+
+
+class CacheTest(FakeQchemTestCase):
+    """QchemCache on the inputs of a tuning run."""
+
+    def setUp(self) -> None:
+        """Write the inputs of one omega and open a cache."""
+        super().setUp()
+        self.tuning = self.inputs(self.dir, 0.27)
+        self.cache = tune.QchemCache(os.path.join(self.dir, "RSHtune.db"),
+                                     loggerLevel="WARNING")
+
+    def inputs(self, dir: str, omega: float):
+        """Write the geometries and inputs of a tuning run in dir."""
+        tuning = tune.QchemTuning(fname=os.path.join(dir, "RSH.in"),
+                                  omega=omega, loggerLevel="WARNING")
+        tuning.createGeometries()
+        tuning.createInputFiles(omega)
+        return tuning
+
+    def tuneCached(self, dir: str) -> dict:
+        """Run and evaluate a cached tuning run in dir."""
+        tuning = tune.QchemTuning(fname=os.path.join(dir, "RSH.in"),
+                                  omega=0.27, cache=self.cache,
+                                  loggerLevel="WARNING")
+        tuning.runCalculations()
+        tuning.parseOutput()
+        tuning.calculateOptimalTuning()
+        return tuning.data["tuning"]
+
+    def testKey(self) -> None:
+        """Keys depend on the input and geometry, not on the directory."""
+        _files = self.tuning.jobFiles()
+        _keys = {s: self.cache.key(f) for s, f in _files.items()}
+        self.assertEqual(_keys["anion"][1:], (270, -1, 2))
+        self.assertEqual(len({k[0] for k in _keys.values()}), 3)
+        self.assertEqual(self.cache.key(_files["neutral"]), _keys["neutral"])
+        _other = os.path.join(self.dir, "other")
+        os.makedirs(_other)
+        for fname in ("RSH.in", "water.mol"):
+            shutil.copy(os.path.join(self.dir, fname), _other)
+        _moved = self.inputs(_other, 0.27).jobFiles()
+        self.assertEqual(self.cache.key(_moved["neutral"]), _keys["neutral"])
+        _shifted = self.inputs(_other, 0.28).jobFiles()
+        self.assertNotEqual(self.cache.key(_shifted["neutral"])[0],
+                            _keys["neutral"][0])
+
+    def testInvalidate(self) -> None:
+        """Results are removed by key or by omega."""
+        for fname in self.tuning.jobFiles().values():
+            self.cache.put(*self.cache.key(fname), RESULT)
+        _key = self.cache.key(self.tuning.jobFiles()["anion"])[0]
+        self.assertEqual(self.cache.get(_key), RESULT)
+        self.assertEqual(self.cache.invalidate(key=_key), 1)
+        self.assertIsNone(self.cache.get(_key))
+        self.assertEqual(self.cache.invalidate(omega=260), 0)
+        self.assertEqual(self.cache.invalidate(omega=270), 2)
+        self.assertEqual(self.cache.invalidate(), 0)
+        self.assertEqual(len(self.cache), 0)
+
+    def testEvict(self) -> None:
+        """The least recently used results are evicted first."""
+        for j in range(5):
+            self.cache.put(f"k{j}", 270, 0, 1, RESULT)
+            self.cache.db.execute("UPDATE results SET accessed = ? " +
+                                  "WHERE key = ?", (j, f"k{j}"))
+        self.cache.db.commit()
+        self.cache.get("k0")
+        self.assertEqual(self.cache.evict(maxEntries=3), 2)
+        self.assertIsNotNone(self.cache.get("k0", touch=False))
+        self.assertIsNone(self.cache.get("k1", touch=False))
+        self.cache.put("k5", 270, 0, 1, RESULT)
+        self.assertEqual(self.cache.evict(maxAge=1), 2)
+        self.assertEqual(len(self.cache), 2)
+        self.assertGreater(self.cache.db.execute(
+            "SELECT MIN(accessed) FROM results").fetchone()[0],
+            time.time() - 86400)
+
+    def testCachedRun(self) -> None:
+        """A second tuning run is served from the cache without Qchem."""
+        _first = self.tuneCached(self.dir)
+        self.assertEqual(len(self.cache), 3)
+        _other = os.path.join(self.dir, "other")
+        os.makedirs(_other)
+        for fname in ("RSH.in", "water.mol"):
+            shutil.copy(os.path.join(self.dir, fname), _other)
+        os.environ["PATH"] = os.environ["PATH"].split(os.pathsep, 1)[1]
+        self.assertEqual(self.tuneCached(_other), _first)
+        self.assertFalse(os.path.exists(
+            os.path.join(_other, "w270_neutral.out")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+RSHtune Testing - Calculation.
+
+Escalating retries of calculations that fail to converge, against
+bench/fakeqchem.
+Dependencies: os, unittest
+"""
+import os
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+
+
+class RetryTest(FakeQchemTestCase):
+    """An anion that only converges with a level shift."""
+
+    def setUp(self) -> None:
+        """Write the inputs of one omega, failing the anion."""
+        super().setUp()
+        os.environ["FAKEQCHEM_FAIL"] = "anion"
+        os.environ["FAKEQCHEM_CURE"] = "level_shift"
+        tuning = tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                                  omega=0.27, loggerLevel="WARNING")
+        tuning.createGeometries()
+        tuning.createInputFiles(0.27)
+        self.jname = os.path.join(self.dir, "w270_anion")
+
+    def rem(self) -> dict:
+        """Return the $rem of the job's current input file."""
+        return dict(tune.QchemInput(f"{self.jname}.in",
+                                    loggerLevel="WARNING").input["rem"])
+
+    def testEscalation(self) -> None:
+        """Overrides are tried in order, each on the original $rem."""
+        calc = tune.QchemCalculation(f"{self.jname}.in",
+                                     retries=tune.RETRIES,
+                                     loggerLevel="WARNING")
+        calc.submit()
+        self.assertTrue(calc.converged())
+        self.assertEqual(calc.retried, 3)
+        self.assertEqual([a["rem"] for a in calc.attempts],
+                         [{}, tune.RETRIES[0], tune.RETRIES[1]])
+        self.assertEqual(self.rem()["scf_algorithm"], "diis")
+        self.assertEqual(self.rem()["lshift"], "300")
+        self.assertEqual(self.rem()["omega"], "270")
+        self.assertNotIn("scf_guess", self.rem())
+        for j in (1, 2, 3):
+            _output = f"{self.jname}.fail{j}.out"
+            self.assertEqual(calc.attempts[j-1]["output"], _output)
+            self.assertFalse(tune.QchemOutput(
+                _output, loggerLevel="WARNING").data["converged"])
+        self.assertFalse(os.path.exists(f"{self.jname}.fail4.out"))
+
+    def testExhausted(self) -> None:
+        """Without a working override the last failed output is kept."""
+        calc = tune.QchemCalculation(f"{self.jname}.in",
+                                     retries=tune.RETRIES[:2],
+                                     loggerLevel="WARNING")
+        calc.submit()
+        self.assertFalse(calc.converged())
+        self.assertEqual(len(calc.attempts), 2)
+        self.assertEqual(self.rem()["scf_algorithm"], "gdm")
+        self.assertTrue(tune.QchemOutput(
+            f"{self.jname}.out", loggerLevel="WARNING").data["failed"])
+        self.assertFalse(os.path.exists(f"{self.jname}.fail3.out"))
+
+    def testNoRetries(self) -> None:
+        """Converged jobs and jobs without retries run once."""
+        calc = tune.QchemCalculation(f"{self.jname}.in",
+                                     loggerLevel="WARNING")
+        calc.submit()
+        self.assertFalse(calc.converged())
+        self.assertEqual(calc.attempts, [])
+        calc = tune.QchemCalculation(
+            os.path.join(self.dir, "w270_neutral.in"), retries=tune.RETRIES,
+            loggerLevel="WARNING")
+        calc.submit()
+        self.assertTrue(calc.converged())
+        self.assertEqual(calc.retried, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+RSHtune Testing - Interpolate.
+
+Natural cubic splines, leave-one-out uncertainties and interpolated
+omega* of scans with the fake qchem.
+Dependencies: os, math, unittest
+"""
+import os
+import math
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+from RSHtune.interpolate import naturalSpline, splineValue
+
+
+class SplineTest(unittest.TestCase):
+    """naturalSpline and splineValue on analytic data."""
+
+    def testKnots(self) -> None:
+        """The spline passes through its knots, also unevenly spaced."""
+        _x = [0.1, 0.15, 0.25, 0.3, 0.45]
+        _y = [math.sin(10 * x) for x in _x]
+        _spline = naturalSpline(_x, _y)
+        self.assertEqual(len(_spline), 4)
+        for x, y in zip(_x, _y):
+            self.assertAlmostEqual(splineValue(_spline, x), y, places=12)
+
+    def testLinear(self) -> None:
+        """Linear data is reproduced exactly, also beyond the knots."""
+        _spline = naturalSpline([1, 2, 4, 5], [3, 5, 9, 11])
+        for x in (0.0, 1.5, 3.0, 4.5, 6.0):
+            self.assertAlmostEqual(splineValue(_spline, x), 2 * x + 1)
+
+    def testNatural(self) -> None:
+        """The second derivative vanishes at both ends."""
+        _x = [0.0, 1.0, 2.0, 3.0]
+        _spline = naturalSpline(_x, [0.0, 1.0, 0.0, 2.0])
+        self.assertEqual(_spline[0][3], 0.0)
+        _x0, _a, _b, _c, _d = _spline[-1]
+        self.assertAlmostEqual(2 * _c + 6 * _d * (_x[-1] - _x0), 0.0)
+
+    def testSmooth(self) -> None:
+        """A smooth function is approximated, best away from the ends."""
+        _x = [j / 10 for j in range(11)]
+        _spline = naturalSpline(_x, [math.exp(x) for x in _x])
+        for x in (0.35, 0.55):
+            self.assertAlmostEqual(splineValue(_spline, x), math.exp(x),
+                                   places=4)
+        self.assertAlmostEqual(splineValue(_spline, 0.95), math.exp(0.95),
+                               delta=0.002)
+
+
+class InterpolationTest(FakeQchemTestCase):
+    """omega* and its leave-one-out uncertainty."""
+
+    def interpolation(self, omegas: list[float]):
+        """Return the interpolation of analytic components at omegas.
+
+        The IP and EA errors are linear in omega and vanish at 0.27.
+        """
+        interpolation = tune.QchemInterpolation(dir=self.dir, nprocs=1,
+                                                loggerLevel="WARNING")
+        interpolation.columns = {
+            "omega": list(omegas),
+            "neutral": [-76.0] * len(omegas),
+            "anion": [-76.1 + 0.4 * (o - 0.27) for o in omegas],
+            "cation": [-75.7 + 0.5 * (o - 0.27) for o in omegas],
+            "HOMO": [-0.3 - o + 0.27 for o in omegas],
+            "LUMO": [-0.1 + 0.2 * (o - 0.27) for o in omegas]}
+        return interpolation
+
+    def testOptimum(self) -> None:
+        """Exact components give omega* and no spread between fits."""
+        _optimum = self.interpolation([0.20, 0.24, 0.28, 0.32]).optimum()
+        self.assertAlmostEqual(_optimum["omega"], 0.27, places=5)
+        self.assertAlmostEqual(_optimum["JOT"], 0.0, places=12)
+        self.assertAlmostEqual(_optimum["IP"], 0.3, places=5)
+        self.assertAlmostEqual(_optimum["EA"], 0.1, places=5)
+        self.assertAlmostEqual(_optimum["error"], 0.0, places=5)
+        self.assertFalse(_optimum["edge"])
+        self.assertEqual(_optimum["points"], 4)
+
+    def testLeaveOneOut(self) -> None:
+        """The error is the largest shift when interior points are left out."""
+        interpolation = self.interpolation([0.20, 0.24, 0.28, 0.32, 0.36])
+        interpolation.columns["HOMO"][2] += 0.01
+        _optimum = interpolation.optimum()
+        _shifts = [abs(interpolation.minimize(
+            interpolation.fit(interpolation.columns, skip=j), 0.20, 0.36)[0] -
+            _optimum["omega"]) for j in (1, 2, 3)]
+        self.assertGreater(_optimum["error"], 0.001)
+        self.assertAlmostEqual(_optimum["error"], max(_shifts))
+        self.assertEqual(max(range(3), key=_shifts.__getitem__), 1)
+
+    def testPoints(self) -> None:
+        """Three points have no uncertainty, fewer are refused."""
+        self.assertIsNone(
+            self.interpolation([0.20, 0.26, 0.32]).optimum()["error"])
+        self.assertRaises(ValueError,
+                          self.interpolation([0.20, 0.32]).optimum)
+
+    def testEdge(self) -> None:
+        """A minimum beyond the scanned range is flagged."""
+        _optimum = self.interpolation([0.30, 0.32, 0.34, 0.36]).optimum()
+        self.assertTrue(_optimum["edge"])
+        self.assertAlmostEqual(_optimum["omega"], 0.30, places=3)
+
+    def testScan(self) -> None:
+        """omega* of a scan with the fake qchem lies between its points."""
+        for _o in (0.24, 0.26, 0.29, 0.31):
+            tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                             omega=_o, loggerLevel="WARNING"
+                             ).runCalculations()
+        _optimum = tune.QchemInterpolation(dir=self.dir, nprocs=1,
+                                           loggerLevel="WARNING").optimum()
+        self.assertEqual(_optimum["points"], 4)
+        self.assertAlmostEqual(_optimum["omega"], 0.27, delta=0.002)
+        self.assertLess(_optimum["error"], 0.005)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+RSHtune Testing - Monitor.
+
+Detection of stalled and oscillating SCF runs in a growing output.
+Dependencies: os, sys, shutil, tempfile, unittest
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST))
+import RSHtune as tune  # noqa: E402
+
+HEADER = "  Cycle       Energy         DIIS error\n" + \
+    " " + 39 * "-" + "\n"
+
+
+def cycles(errors: list[float], first: int = 1) -> str:
+    """Return SCF cycle lines with the given errors."""
+    return "".join(f" {j:>5d}    -76.0000000000      {e:.2e}\n"
+                   for j, e in enumerate(errors, first))
+
+
+class MonitorTest(unittest.TestCase):
+    """QchemMonitor following an output written cycle by cycle."""
+
+    def setUp(self) -> None:
+        """Create a temporary directory and a monitor with a short window."""
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, "w270_anion.out")
+        self.monitor = tune.QchemMonitor(self.fname, window=10, ratio=0.5,
+                                         oscillation=0.4,
+                                         loggerLevel="WARNING")
+
+    def tearDown(self) -> None:
+        """Stop monitoring and remove the temporary directory."""
+        self.monitor.close()
+        shutil.rmtree(self.dir)
+
+    def append(self, text: str) -> dict:
+        """Append text to the output and update the monitor."""
+        with open(self.fname, "a") as f:
+            f.write(text)
+        return self.monitor.update()
+
+    def testMissing(self) -> None:
+        """Nothing is reported before Qchem creates the output."""
+        self.assertIsNone(self.monitor.update())
+
+    def testConverging(self) -> None:
+        """A steadily converging SCF is left alone."""
+        self.append(HEADER)
+        for j in range(1, 41):
+            self.assertIsNone(self.append(cycles([10**(-j / 5)], j)))
+        self.assertEqual(self.monitor.output.data["SCFcycles"], 40)
+
+    def testStalled(self) -> None:
+        """An SCF stuck at one error is aborted after the window."""
+        self.append(HEADER + cycles([1e-2, 1e-3]))
+        for j in range(3, 12):
+            self.assertIsNone(self.append(cycles([1e-3 * (1 - j / 100)], j)))
+        _failure = self.append(cycles([1e-3], 12))
+        self.assertEqual(_failure["reason"], "stalled")
+        self.assertEqual(_failure["cycle"], 12)
+        self.assertAlmostEqual(_failure["best"], 0.89e-3)
+        self.assertEqual(_failure["window"], 10)
+        # Reported once per new cycle only
+        self.assertIsNone(self.monitor.update())
+
+    def testOscillating(self) -> None:
+        """An SCF jumping up and down is reported as oscillating."""
+        _errors = [1e-2, 1e-3] + [1e-3 * (1 + j % 2) for j in range(10)]
+        _failure = self.append(HEADER + cycles(_errors))
+        self.assertEqual(_failure["reason"], "oscillating")
+        self.assertEqual(_failure["error"], 2e-3)
+
+    def testPartialLine(self) -> None:
+        """A cycle line is only read once it is complete."""
+        _line = cycles([1e-3], 12)
+        self.append(HEADER + cycles([1e-2] + [1e-3] * 10))
+        self.assertIsNone(self.append(_line[:20]))
+        self.assertEqual(self.monitor.output.data["SCFcycles"], 11)
+        self.assertEqual(self.append(_line[20:])["cycle"], 12)
+
+    def testTruncated(self) -> None:
+        """A rewritten output, as on a retry, is read from the start."""
+        self.append(HEADER + cycles([1e-2] * 8))
+        with open(self.fname, "w") as f:
+            f.write(HEADER + cycles([1e-1]))
+        self.assertIsNone(self.monitor.update())
+        self.assertEqual(self.monitor.output.data["SCFerrors"], [1e-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
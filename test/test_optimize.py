@@ -0,0 +1,103 @@
+"""
+RSHtune Testing - Optimize.
+
+Searches for the optimal omega, and alpha, against bench/fakeqchem.
+Dependencies: os, unittest
+"""
+import os
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+from RSHtune.optimize import (bracketMinimum, lineSearch,
+                              parabolicStep)
+
+
+class Counter():
+    """A function of one integer recording where it was evaluated."""
+
+    def __init__(self, f) -> None:
+        """Wrap f."""
+        self.f = f
+        self.calls = []
+
+    def __call__(self, x: int) -> float:
+        """Return f(x)."""
+        self.calls.append(x)
+        return self.f(x)
+
+
+class LineSearchTest(unittest.TestCase):
+    """Bracketing and parabolic/golden refinement on analytic functions."""
+
+    def testBracket(self) -> None:
+        """The middle point lies below both ends, in either direction."""
+        for x, step in ((100, 20), (500, 20), (100, -20)):
+            f = Counter(lambda v: (v - 270)**2)
+            a, b, c = bracketMinimum(f, x, step)
+            self.assertLess(a, 270)
+            self.assertGreater(c, 270)
+            self.assertLessEqual(f(b), min(f(a), f(c)))
+
+    def testBound(self) -> None:
+        """A minimum beyond the bound is reported at the bound."""
+        f = Counter(lambda v: v)
+        self.assertEqual(bracketMinimum(f, 30, 20)[1], 1)
+        self.assertEqual(lineSearch(f, 30, 20, 1), 1)
+        f = Counter(lambda v: -v)
+        self.assertEqual(lineSearch(f, 900, 50, 1, upper=1000), 1000)
+
+    def testParabolicStep(self) -> None:
+        """The vertex of an exact parabola is hit in one step."""
+        _values = {v: (v - 273)**2 for v in (200, 250, 350)}
+        self.assertEqual(parabolicStep(200, 250, 350, _values), 273)
+        _values[273] = 0
+        self.assertIsNone(parabolicStep(200, 250, 350, _values))
+
+    def testQuadratic(self) -> None:
+        """Parabolic steps find a smooth minimum in few evaluations."""
+        f = Counter(lambda v: (v - 273)**2 + 0.001 * (v - 273)**3)
+        self.assertEqual(lineSearch(f, 250, 50, 1), 273)
+        self.assertEqual(len(f.calls), len(set(f.calls)))
+        self.assertLessEqual(len(f.calls), 12)
+
+    def testGolden(self) -> None:
+        """Golden-section steps converge where parabolas do not help."""
+        f = Counter(lambda v: abs(v - 313))
+        self.assertLessEqual(abs(lineSearch(f, 100, 20, 2) - 313), 2)
+        self.assertEqual(len(f.calls), len(set(f.calls)))
+        self.assertLessEqual(len(f.calls), 25)
+
+
+class OptimizerTest(FakeQchemTestCase):
+    """Minimizing J_OT over omega."""
+
+    def testMinimize(self) -> None:
+        """The fake qchem's optimal omega is found from either side."""
+        for _guess in (0.20, 0.35):
+            _optimizer = tune.QchemOptimizer(
+                os.path.join(self.dir, "RSH.in"), loggerLevel="WARNING")
+            self.assertAlmostEqual(_optimizer.minimize(_guess), 0.27,
+                                   delta=0.001)
+            self.assertLessEqual(len(_optimizer.points), 12)
+
+
+class Optimizer2DTest(FakeQchemTestCase):
+    """Minimizing J_OT over alpha and omega."""
+
+    def testEvaluations(self) -> None:
+        """The diagonal valley is followed in few tuning calculations."""
+        _optimizer = tune.QchemOptimizer2D(
+            os.path.join(self.dir, "RSH.in"), ncores=3, warmStart=True,
+            maxEvaluations=30, loggerLevel="WARNING")
+        _alpha, _omega = _optimizer.minimize(0.20, 0.25)
+        self.assertAlmostEqual(_alpha, 0.20, delta=0.01)
+        self.assertAlmostEqual(_omega, 0.27, delta=0.002)
+        self.assertLessEqual(len(_optimizer.points), 25)
+        # Warm-start guesses were kept across all evaluated points
+        self.assertGreater(max(len(f) for f in
+                               _optimizer.scheduler.finished.values()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+RSHtune Testing - Output.
+
+Parsing of plain, truncated, failed and compressed Qchem outputs.
+Dependencies: os, sys, gzip, shutil, tempfile, unittest, zstandard (optional)
+"""
+import os
+import sys
+import gzip
+import shutil
+import tempfile
+import unittest
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST))
+import RSHtune as tune  # noqa: E402
+from RSHtune.output import findOutput  # noqa: E402
+
+# An unrestricted run whose beta frontier orbitals differ from alpha
+OUTPUT = """\
+  Cycle       Energy         DIIS error
+ ---------------------------------------
+     1    -75.9000000000      1.00e-02
+     2    -76.0000000000      1.00e-05
+     3    -76.0100000000      1.00e-09  00000 Convergence criterion met
+ ---------------------------------------
+ SCF time:   CPU 3.21s  wall 1.10s
+ SCF   energy in the final basis set = -76.0100000000
+
+ --------------------------------------------------------------
+                    Orbital Energies (a.u.)
+ --------------------------------------------------------------
+
+ Alpha MOs
+ -- Occupied --
+ -19.0000  -1.0000  -0.4000
+ -- Virtual --
+   0.1000   0.3000
+
+ Beta MOs
+ -- Occupied --
+ -19.0000  -1.0000  -0.3000
+ -- Virtual --
+   0.0500   0.3000
+
+ --------------------------------------------------------------
+
+ Total job time:  2.50s(wall), 7.75s(cpu)
+        *  Thank you very much for using Q-Chem.  Have a nice day.  *
+"""
+
+
+class OutputTest(unittest.TestCase):
+    """QchemOutput on synthetic output files."""
+
+    def setUp(self) -> None:
+        """Create a temporary directory."""
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, "w270_anion.out")
+
+    def tearDown(self) -> None:
+        """Remove the temporary directory."""
+        shutil.rmtree(self.dir)
+
+    def write(self, text: str, fname: str = "") -> str:
+        """Write an output file, compressed after its extension."""
+        fname = fname or self.fname
+        if fname.endswith(".gz"):
+            with gzip.open(fname, "wt") as f:
+                f.write(text)
+        elif fname.endswith(".zst"):
+            with zstandard.open(fname, "wt") as f:
+                f.write(text)
+        else:
+            with open(fname, "w") as f:
+                f.write(text)
+        return fname
+
+    def testSpins(self) -> None:
+        """Frontier orbitals are kept per spin and combined."""
+        _data = tune.QchemOutput(self.write(OUTPUT),
+                                 loggerLevel="WARNING").data
+        self.assertEqual(_data["alpha"], {"HOMO": -0.4, "LUMO": 0.1})
+        self.assertEqual(_data["beta"], {"HOMO": -0.3, "LUMO": 0.05})
+        self.assertEqual((_data["HOMO"], _data["LUMO"]), (-0.3, 0.05))
+        self.assertEqual(_data["SCFenergy"], -76.01)
+        self.assertEqual(_data["SCFcycles"], 3)
+        self.assertEqual(_data["SCFerrors"], [1e-2, 1e-5, 1e-9])
+        self.assertTrue(_data["converged"] and _data["finished"])
+
+    def testTimings(self) -> None:
+        """Both styles of Qchem timing lines are read."""
+        _data = tune.QchemOutput(self.write(OUTPUT),
+                                 loggerLevel="WARNING").data
+        self.assertEqual(_data["SCFtime"], {"wall": 1.10, "cpu": 3.21})
+        self.assertEqual(_data["jobTime"], {"wall": 2.50, "cpu": 7.75})
+
+    def testTruncated(self) -> None:
+        """An output cut off in the orbitals has no results."""
+        _output = tune.QchemOutput(
+            self.write(OUTPUT[:OUTPUT.index(" Beta MOs")]),
+            loggerLevel="WARNING")
+        self.assertTrue(_output.data["converged"])
+        self.assertFalse(_output.data["finished"])
+        self.assertIsNone(_output.data["beta"]["HOMO"])
+        self.assertEqual(_output.data["jobTime"],
+                         {"wall": None, "cpu": None})
+        _output = tune.QchemOutput(self.write(OUTPUT[:200]),
+                                   loggerLevel="WARNING")
+        self.assertFalse(_output.data["converged"])
+        self.assertRaises(ValueError, _output.results)
+
+    def testFailed(self) -> None:
+        """An SCF failure is recorded and has no results."""
+        _text = OUTPUT[:OUTPUT.index("     3 ")] + \
+            " ---------------------------------------\n" + \
+            " SCF failed to converge\n"
+        _output = tune.QchemOutput(self.write(_text), loggerLevel="WARNING")
+        self.assertTrue(_output.data["failed"])
+        self.assertFalse(_output.data["converged"])
+        self.assertEqual(_output.data["SCFcycles"], 2)
+        self.assertRaises(ValueError, _output.results)
+
+    def testFeed(self) -> None:
+        """Feeding lines one by one gives the same data as reading."""
+        _output = tune.QchemOutput(loggerLevel="WARNING")
+        for line in OUTPUT.splitlines(keepends=True):
+            _output.feed(line)
+        self.assertEqual(_output.data,
+                         tune.QchemOutput(self.write(OUTPUT),
+                                          loggerLevel="WARNING").data)
+
+    def testGzip(self) -> None:
+        """gzip compressed outputs are read and found."""
+        _fname = self.write(OUTPUT, self.fname + ".gz")
+        self.assertEqual(findOutput(self.fname[:-4]), _fname)
+        self.assertEqual(tune.QchemOutput(_fname, loggerLevel="WARNING"
+                                          ).results()["LUMO"], 0.05)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def testZstd(self) -> None:
+        """zstd compressed outputs are read and found."""
+        _fname = self.write(OUTPUT, self.fname + ".zst")
+        self.assertEqual(findOutput(self.fname[:-4]), _fname)
+        self.assertEqual(tune.QchemOutput(_fname, loggerLevel="WARNING"
+                                          ).results()["LUMO"], 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+"""
+RSHtune Testing - Predict.
+
+Geometries from Z-matrices, molecular descriptors and the omega* fit of
+QchemPredictor.
+Dependencies: os, sys, math, shutil, tempfile, unittest
+"""
+import os
+import sys
+import math
+import shutil
+import tempfile
+import unittest
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST))
+import RSHtune as tune  # noqa: E402
+from RSHtune.predict import (cartesian, features,  # noqa: E402
+                             moleculeDescriptors)
+
+# Ethylene in Cartesian coordinates
+ETHYLENE = [["0", "1"],
+            ["C", "0.000", "0.000", "0.667"],
+            ["C", "0.000", "0.000", "-0.667"],
+            ["H", "0.000", "0.923", "1.238"],
+            ["H", "0.000", "-0.923", "1.238"],
+            ["H", "0.000", "0.923", "-1.238"],
+            ["H", "0.000", "-0.923", "-1.238"]]
+
+
+def readMolecule(fname: str) -> list[list[str]]:
+    """Return the lines of a geometry file split into items."""
+    with open(fname, "r") as f:
+        return [ln.split() for ln in f
+                if ln.strip() != "" and ln.strip()[0] != "$"]
+
+
+def angle(a: tuple, b: tuple, c: tuple) -> float:
+    """Return the angle a-b-c in degrees."""
+    _u = [x - y for x, y in zip(a, b)]
+    _v = [x - y for x, y in zip(c, b)]
+    return math.degrees(math.acos(sum(x * y for x, y in zip(_u, _v)) /
+                                  math.hypot(*_u) / math.hypot(*_v)))
+
+
+def dihedral(a: tuple, b: tuple, c: tuple, d: tuple) -> float:
+    """Return the dihedral angle a-b-c-d in degrees."""
+    _b0 = [x - y for x, y in zip(a, b)]
+    _b1 = [x - y for x, y in zip(c, b)]
+    _b2 = [x - y for x, y in zip(d, c)]
+    _n = math.hypot(*_b1)
+    _b1 = [x / _n for x in _b1]
+    _v = [x - sum(p * q for p, q in zip(_b0, _b1)) * y
+          for x, y in zip(_b0, _b1)]
+    _w = [x - sum(p * q for p, q in zip(_b2, _b1)) * y
+          for x, y in zip(_b2, _b1)]
+    _cross = [_b1[1] * _v[2] - _b1[2] * _v[1], _b1[2] * _v[0] -
+              _b1[0] * _v[2], _b1[0] * _v[1] - _b1[1] * _v[0]]
+    return math.degrees(math.atan2(sum(x * y for x, y in zip(_cross, _w)),
+                                   sum(x * y for x, y in zip(_v, _w))))
+
+
+class GeometryTest(unittest.TestCase):
+    """Z-matrix conversion and descriptors."""
+
+    def testZmatrix(self) -> None:
+        """Distances, angles and dihedrals of the Z-matrix are kept."""
+        _lines = readMolecule(os.path.join(TEST, "water.mol"))[1:]
+        _xyz = cartesian(_lines)
+        self.assertEqual(len(_xyz), 15)
+        for j, ln in enumerate(_lines[1:], 1):
+            _a = int(ln[1]) - 1
+            self.assertAlmostEqual(math.dist(_xyz[j], _xyz[_a]),
+                                   float(ln[2]), places=6)
+            if j > 1:
+                _b = int(ln[3]) - 1
+                self.assertAlmostEqual(angle(_xyz[j], _xyz[_a], _xyz[_b]),
+                                       float(ln[4]), places=6)
+            if j > 2:
+                _c = int(ln[5]) - 1
+                self.assertAlmostEqual(dihedral(_xyz[j], _xyz[_a], _xyz[_b],
+                                                _xyz[_c]),
+                                       float(ln[6]), places=6)
+
+    def testVariables(self) -> None:
+        """Z-matrix variables, also negated, are substituted."""
+        _lines = [["0", "1"], ["O"], ["H", "1", "r"],
+                  ["H", "1", "r", "2", "a"],
+                  ["H", "1", "1.0", "2", "a", "3", "-d"],
+                  ["r", "0.96"], ["a", "104.5"], ["d", "120.0"]]
+        _descriptors = moleculeDescriptors(_lines)
+        self.assertEqual(_descriptors["atoms"], 4)
+        self.assertEqual(_descriptors["electrons"], 11)
+        self.assertGreater(_descriptors["size"], 1.5)
+
+    def testDescriptors(self) -> None:
+        """Cartesian input is used as is, double bonds are conjugated."""
+        _descriptors = moleculeDescriptors(ETHYLENE)
+        self.assertEqual((_descriptors["electrons"], _descriptors["atoms"],
+                          _descriptors["heavyAtoms"],
+                          _descriptors["conjugation"]), (16, 6, 2, 2))
+        self.assertAlmostEqual(_descriptors["size"],
+                               math.hypot(1.846, 2.476), places=6)
+        _water = moleculeDescriptors(
+            readMolecule(os.path.join(TEST, "water.mol")))
+        self.assertEqual((_water["electrons"], _water["heavyAtoms"],
+                          _water["conjugation"]), (50, 5, 0))
+
+    def testUnreadable(self) -> None:
+        """A geometry that cannot be converted has no size."""
+        _descriptors = moleculeDescriptors([["1", "2"], ["C"],
+                                            ["C", "1", "x"]])
+        self.assertEqual(_descriptors["electrons"], 11)
+        self.assertEqual(_descriptors["size"], 0.0)
+
+
+class PredictorTest(unittest.TestCase):
+    """Predictions from a history of tuned molecules."""
+
+    def setUp(self) -> None:
+        """Copy the test input and start an empty history."""
+        self.dir = tempfile.mkdtemp()
+        for fname in ("RSH.in", "water.mol"):
+            shutil.copy(os.path.join(TEST, fname), self.dir)
+        self.fname = os.path.join(self.dir, "RSH.in")
+        self.history = os.path.join(self.dir, "history.json")
+        self.predictor = tune.QchemPredictor(self.history,
+                                             loggerLevel="WARNING")
+
+    def tearDown(self) -> None:
+        """Remove the temporary directory."""
+        shutil.rmtree(self.dir)
+
+    def model(self, descriptors: dict) -> float:
+        """Return omega* of a molecule by an exact power law."""
+        return math.exp(sum(b * x for b, x in
+                            zip((0.5, -0.4, -0.1, -0.2),
+                                features(descriptors))))
+
+    def fill(self, count: int, basis: str = "cc-pvtz") -> None:
+        """Store molecules of varying descriptors following the model."""
+        for j in range(count):
+            _descriptors = {"electrons": 10 + 15 * j, "atoms": 3 + j,
+                            "heavyAtoms": 1 + j, "size": 1.0 + 0.7 * j,
+                            "conjugation": (3 * j) % 7, "basis": basis}
+            self.predictor.molecules[f"m{j}|{basis}"] = {
+                **_descriptors, "omega": self.model(_descriptors),
+                "updated": 0.0}
+
+    def testEmpty(self) -> None:
+        """Without tuned molecules there is no prediction."""
+        self.assertIsNone(self.predictor.predict(self.fname))
+
+    def testFit(self) -> None:
+        """With enough molecules the power law is recovered."""
+        self.fill(8)
+        _omega, (_low, _high) = self.predictor.predict(self.fname)
+        _exact = self.model(self.predictor.descriptors(self.fname))
+        self.assertAlmostEqual(_omega, _exact, delta=0.02 * _exact)
+        self.assertLess(_low, _omega)
+        self.assertGreater(_high, _omega)
+        self.assertGreaterEqual(_high - _low, 0.02)
+
+    def testBasis(self) -> None:
+        """Molecules tuned with another basis are only used if needed."""
+        self.fill(8)
+        self.fill(6, basis="sto-3g")
+        for m in self.predictor.molecules.values():
+            if m["basis"] == "sto-3g":
+                m["omega"] = 0.9
+        _omega = self.predictor.predict(self.fname)[0]
+        self.assertLess(_omega, 0.8)
+        for k in [k for k in self.predictor.molecules if "sto" not in k]:
+            del self.predictor.molecules[k]
+        self.assertAlmostEqual(self.predictor.predict(self.fname)[0], 0.9,
+                               places=3)
+
+    def testNearest(self) -> None:
+        """With few molecules the nearest ones dominate."""
+        self.predictor.record(self.fname, 0.3)
+        _other = os.path.join(self.dir, "other")
+        os.makedirs(_other)
+        for fname in ("RSH.in", "water.mol"):
+            shutil.copy(os.path.join(self.dir, fname), _other)
+        _omega, _bracket = self.predictor.predict(
+            os.path.join(_other, "RSH.in"))
+        self.assertEqual(_omega, 0.3)
+        self.fill(2)
+        self.assertAlmostEqual(self.predictor.predict(
+            os.path.join(_other, "RSH.in"))[0], 0.3, delta=0.01)
+        # A molecule is never predicted from itself
+        self.assertNotEqual(self.predictor.predict(self.fname)[0], 0.3)
+
+    def testRecord(self) -> None:
+        """Scans store omega* only if bracketed, and persist."""
+        self.assertIsNone(self.predictor.recordScan(
+            self.fname, {0.25: 3e-4, 0.26: 2e-4, 0.27: 1e-4}))
+        self.assertIsNone(self.predictor.recordScan(
+            self.fname, {0.25: 3e-4, 0.26: None, 0.27: 1e-4}))
+        self.assertEqual(self.predictor.recordScan(
+            self.fname, {0.25: 3e-4, 0.26: 1e-4, 0.27: 2e-4}), 0.26)
+        _molecules = tune.QchemPredictor(self.history,
+                                         loggerLevel="WARNING").molecules
+        self.assertEqual(len(_molecules), 1)
+        self.assertEqual(list(_molecules.values())[0]["electrons"], 50)
+        self.assertEqual(list(_molecules.values())[0]["omega"], 0.26)
+
+
+if __name__ == "__main__":
+    unittest.main()
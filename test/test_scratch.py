@@ -0,0 +1,80 @@
+"""
+RSHtune Testing - Scratch.
+
+Quota accounting of the scratch directories managed by QchemScratch.
+Dependencies: os, sys, shutil, tempfile, unittest
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST))
+import RSHtune as tune  # noqa: E402
+
+MB = 1024**2
+
+
+def writeScratch(dir: str, sizes: dict) -> None:
+    """Create a scratch directory with files of the given sizes in MB."""
+    os.makedirs(dir, exist_ok=True)
+    for fname, size in sizes.items():
+        with open(os.path.join(dir, fname), "wb") as f:
+            f.write(b"\0" * int(size * MB))
+
+
+class QuotaTest(unittest.TestCase):
+    """A 3 MB quota on a scratch root shared with other directories."""
+
+    def setUp(self) -> None:
+        """Create a scratch root holding a foreign 10 MB directory."""
+        self.dir = tempfile.mkdtemp()
+        writeScratch(os.path.join(self.dir, "other"), {"big": 10})
+        self.scratch = tune.QchemScratch(self.dir, quota=3 / 1024,
+                                         interval=0.0,
+                                         loggerLevel="WARNING")
+
+    def tearDown(self) -> None:
+        """Remove the scratch root."""
+        shutil.rmtree(self.dir)
+
+    def testOwnScratch(self) -> None:
+        """Only scratch of tracked jobs counts against the quota."""
+        self.assertEqual(self.scratch.usage(), 0)
+        self.assertFalse(self.scratch.full())
+        self.scratch.track("w250_neutral")
+        writeScratch(self.scratch.path("w250_neutral"),
+                     {"53.0": 1, "58.0": 1, "99.0": 2})
+        self.assertEqual(self.scratch.usage(), 4 * MB)
+        self.assertTrue(self.scratch.full())
+        self.scratch.prune("w250_neutral")
+        self.assertEqual(self.scratch.usage(), 2 * MB)
+        self.assertFalse(self.scratch.full())
+
+    def testEviction(self) -> None:
+        """Pruned scratch is evicted oldest first."""
+        for _sname in ("w250_neutral", "w260_neutral", "w270_neutral"):
+            self.scratch.track(_sname)
+            writeScratch(self.scratch.path(_sname), {"53.0": 0.5, "58.0": 0.5})
+            self.scratch.prune(_sname)
+        self.assertFalse(self.scratch.full())
+        self.assertEqual(list(self.scratch.retained), ["w260_neutral",
+                                                       "w270_neutral"])
+        self.assertFalse(os.path.isdir(self.scratch.path("w250_neutral")))
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, "other")))
+
+    def testThrottled(self) -> None:
+        """Running scratch is measured once per interval."""
+        self.scratch.interval = 60.0
+        self.scratch.track("w250_neutral")
+        self.assertEqual(self.scratch.usage(), 0)
+        writeScratch(self.scratch.path("w250_neutral"), {"99.0": 1})
+        self.assertEqual(self.scratch.usage(), 0)
+        self.scratch.prune("w250_neutral", converged=False)
+        self.assertEqual(self.scratch.usage(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
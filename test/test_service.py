@@ -0,0 +1,56 @@
+"""
+RSHtune Testing - Service.
+
+Validation of tuning requests before they reach the shared queue.
+Dependencies: os, sys, shutil, tempfile, unittest
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+TEST = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST))
+import RSHtune as tune  # noqa: E402
+
+
+class SubmitTest(unittest.TestCase):
+    """Malformed requests are rejected by submit."""
+
+    def setUp(self) -> None:
+        """Start a service on a free port in a temporary root."""
+        self.dir = tempfile.mkdtemp()
+        self.service = tune.QchemService(root=self.dir, port=0,
+                                         loggerLevel="WARNING")
+        with open(os.path.join(TEST, "RSH.in"), "r") as f:
+            self.input = f.read()
+        with open(os.path.join(TEST, "water.mol"), "r") as f:
+            self.geometry = f.read()
+
+    def tearDown(self) -> None:
+        """Close the server and remove the temporary root."""
+        self.service.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def testRejected(self) -> None:
+        """Unparsable inputs and empty omega lists raise ValueError."""
+        for _input, _omega in (("not an input\n", [0.2]),
+                               ("$rem\nmethod lrc-wpbe\n$end\n", [0.2]),
+                               (self.input, [])):
+            with self.assertRaises(ValueError):
+                self.service.submit({"input": _input,
+                                     "geometry": self.geometry,
+                                     "omega": _omega})
+        self.assertEqual(self.service.requests, {})
+
+    def testAccepted(self) -> None:
+        """A valid request is queued."""
+        self.assertEqual(self.service.submit({"input": self.input,
+                                              "geometry": self.geometry,
+                                              "omega": [0.2, 0.25]}), 1)
+        self.assertEqual(self.service.requests[1]["omega"], [0.2, 0.25])
+
+
+if __name__ == "__main__":
+    unittest.main()
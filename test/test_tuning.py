@@ -0,0 +1,104 @@
+"""
+RSHtune Testing - Tuning.
+
+Thread splitting, concurrent and shared tuning runs against
+bench/fakeqchem.
+Dependencies: os, unittest
+"""
+import os
+import unittest
+
+from helpers import FakeQchemTestCase
+import RSHtune as tune
+from RSHtune.tuning import splitThreads
+
+
+class SplitThreadsTest(unittest.TestCase):
+    """Splitting a thread budget between neutral, anion and cation."""
+
+    def testProportional(self) -> None:
+        """Open-shell states never get fewer threads than closed-shell."""
+        for n in range(3, 33):
+            _threads = splitThreads(n, [1, 2, 2])
+            self.assertEqual(sum(_threads), n)
+            self.assertLessEqual(_threads[0], min(_threads[1:]))
+        self.assertEqual(splitThreads(4, [1, 2, 2]), [1, 2, 1])
+
+    def testSmallBudget(self) -> None:
+        """Every job gets at least one thread."""
+        self.assertEqual(splitThreads(2, [1, 2, 2]), [1, 1, 1])
+        self.assertEqual(splitThreads(3, [1, 100, 1]), [1, 1, 1])
+        self.assertEqual(sum(splitThreads(4, [1, 10, 10])), 4)
+
+
+class ConcurrentTuningTest(FakeQchemTestCase):
+    """Tuning runs with the fake qchem of bench/ on PATH."""
+
+    def testConcurrent(self) -> None:
+        """All three states run at once on a split budget."""
+        tuning_run = tune.QchemTuning(fname=os.path.join(self.dir, "RSH.in"),
+                                      omega=0.27, nthreads=4,
+                                      loggerLevel="WARNING")
+        tuning_run.runCalculations(concurrent=True)
+        self.assertEqual({s: c.numThreads
+                          for s, c in tuning_run.calcs.items()},
+                         {"neutral": 1, "anion": 2, "cation": 1})
+        tuning_run.parseOutput()
+        tuning_run.calculateOptimalTuning()
+        self.assertLess(tuning_run.data["tuning"]["JOT"], 1e-4)
+
+    def testSharedMetrics(self) -> None:
+        """A neutral job shared by IP and EA runs is recorded once."""
+        metrics = tune.QchemMetrics(os.path.join(self.dir, "m.jsonl"),
+                                    loggerLevel="WARNING")
+        scheduler = tune.QchemScheduler(ncores=2, interval=0.1,
+                                        loggerLevel="WARNING")
+        tuningRuns = {}
+        for _objective in ("IP", "EA"):
+            tuningRuns[_objective] = tune.QchemTuning(
+                fname=os.path.join(self.dir, "RSH.in"), omega=0.27,
+                objective=_objective, metrics=metrics, loggerLevel="WARNING")
+            tuningRuns[_objective].scheduleCalculations(scheduler,
+                                                        series=_objective)
+        _jobs = []
+
+        def report(group: tuple, calcs: dict) -> None:
+            _jobs.append(sorted(os.path.basename(f) for f in scheduler.jobs))
+            tuningRuns[group[0]].collectTimings(calcs)
+
+        scheduler.run(callback=report)
+        self.assertEqual(sorted(r["state"] for r in metrics.records),
+                         ["anion", "cation", "neutral"])
+        # The neutral job is kept until both runs have reported
+        self.assertEqual(len(_jobs[0]), 2)
+        self.assertIn("w270_neutral.in", _jobs[0])
+        self.assertEqual(_jobs[1], [])
+        self.assertEqual(scheduler.jobs, {})
+        with open(os.path.join(self.dir, "m.jsonl"), "r") as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def testSharedInputs(self) -> None:
+        """Inputs of queued jobs and unchanged files are not rewritten."""
+        _fname = os.path.join(self.dir, "RSH.in")
+        scheduler = tune.QchemScheduler(ncores=1, loggerLevel="WARNING")
+        tune.QchemTuning(fname=_fname, omega=0.27, scheduler=scheduler,
+                         loggerLevel="WARNING"
+                         ).scheduleCalculations(scheduler, series="OT")
+        _neutral = os.path.join(self.dir, "w270_neutral.in")
+        with open(_neutral, "a") as f:
+            f.write("! queued\n")
+        _cation = os.path.join(self.dir, "w270_cation.in")
+        _stat = os.stat(_cation)
+        tune.QchemTuning(fname=_fname, omega=0.27, objective="IP",
+                         scheduler=scheduler, loggerLevel="WARNING")
+        with open(_neutral, "r") as f:
+            self.assertTrue(f.read().endswith("! queued\n"))
+        tune.QchemTuning(fname=_fname, omega=0.27, loggerLevel="WARNING")
+        self.assertEqual(os.stat(_cation).st_ino, _stat.st_ino)
+        self.assertEqual(os.stat(_cation).st_mtime_ns, _stat.st_mtime_ns)
+        with open(_neutral, "r") as f:
+            self.assertNotIn("! queued", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()